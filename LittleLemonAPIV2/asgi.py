@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "LittleLemonAPIV2.settings")
+# Route the menu and category reads to the native async views
+os.environ.setdefault("LITTLELEMON_ASYNC_VIEWS", "1")
 
 application = get_asgi_application()
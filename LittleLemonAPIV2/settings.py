@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total time covers the other middleware
+    "LittleLemonDRF.profiling.RequestProfilingMiddleware",
+    # Only with QUERY_BUDGET_WARNINGS on, see LittleLemonDRF/budgets.py
+    "LittleLemonDRF.budgets.QueryBudgetMiddleware",
+    # Only with REQUEST_CAPTURE_PATH set, see LittleLemonDRF/capture.py
+    "LittleLemonDRF.capture.RequestCaptureMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,6 +58,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "LittleLemonDRF.routers.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "LittleLemonAPIV2.urls"
@@ -83,9 +91,120 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file instead of the shared in-memory database, whose table locks
+        # fail right away instead of waiting for the busy timeout. The
+        # concurrent checkout tests rely on the waiting.
+        "TEST": {
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
+    }
+}
+
+# Database profile, picked with LITTLELEMON_DB_PROFILE. "production" tunes
+# SQLite for concurrent requests and keeps connections across requests.
+DB_PROFILE = os.environ.get('LITTLELEMON_DB_PROFILE', 'development')
+
+# PRAGMAs run on every new SQLite connection, see LittleLemonDRF/db.py
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = {
+        # Readers and the writer don't block each other
+        'journal_mode': 'wal',
+        # With WAL only checkpoints wait for the disk. A power loss can undo
+        # the last commits but can't corrupt the database.
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative means KiB: 64 MB of page cache per connection
+        'cache_size': -64 * 1024,
+        # Milliseconds a writer waits for the lock before "database is locked"
+        'busy_timeout': 5000,
+    }
+    DATABASES['default'].update({
+        # One connection per thread, reused for 10 minutes and checked before reuse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Read replicas, see LittleLemonDRF/routers.py. LITTLELEMON_REPLICA_DBS is a comma
+# separated list of SQLite files kept in sync with the primary by some external
+# replication; they become the aliases replica1, replica2, ...
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('LITTLELEMON_REPLICA_DBS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['LittleLemonDRF.routers.ReplicaRouter']
+
+# Seconds the reads of a client stay on the primary after it wrote
+REPLICA_STICKY_SECONDS = 5
+
+# Count the queries per database alias (api/db-stats, see LittleLemonDRF/db.py).
+# On with DEBUG, LITTLELEMON_QUERY_STATS=1 turns it on in production-like runs.
+QUERY_STATS = DEBUG or os.environ.get('LITTLELEMON_QUERY_STATS') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "littlelemon",
+        "OPTIONS": {
+            "MAX_ENTRIES": 5000,
+        },
     }
 }
 
+# Seconds a menu/category response stays in the cache. Writes invalidate it earlier.
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Size and lifetime (seconds) of the user -> group names cache of the manager checks
+ROLE_CACHE_SIZE = 1000
+ROLE_CACHE_TIMEOUT = 60
+
+# Size and lifetime (seconds) of the token -> user cache of CachingTokenAuthentication
+TOKEN_CACHE_SIZE = 1000
+TOKEN_CACHE_TIMEOUT = 60
+
+# Serve the menu and category reads with the async views of LittleLemonDRF.async_views.
+# asgi.py turns this on, under WSGI the sync views are used.
+ASYNC_READ_VIEWS = os.environ.get('LITTLELEMON_ASYNC_VIEWS') == '1'
+
+# Per request query count, SQL, serializer and render time in a Server-Timing
+# header, with per route percentiles over the last REQUEST_PROFILING_WINDOW
+# requests (see LittleLemonDRF/profiling.py). Off by default.
+REQUEST_PROFILING = os.environ.get('LITTLELEMON_PROFILING') == '1'
+REQUEST_PROFILING_WINDOW = 1000
+
+# Log a warning for every request that runs more queries than the budget of its
+# view (see LittleLemonDRF/budgets.py). On with DEBUG, LITTLELEMON_QUERY_BUDGETS=1
+# turns it on in production-like runs. The tests check the budgets themselves
+# (QueryBudgetTests) and turn it off.
+QUERY_BUDGET_WARNINGS = DEBUG or os.environ.get('LITTLELEMON_QUERY_BUDGETS') == '1'
+
+# Append a sanitized NDJSON record of every request to this file, for
+# `manage.py replay_requests` (see LittleLemonDRF/capture.py). Off when empty.
+REQUEST_CAPTURE_PATH = os.environ.get('LITTLELEMON_CAPTURE_PATH', '')
+# Records per write, and the most seconds a record stays buffered while requests come in
+REQUEST_CAPTURE_BATCH = 100
+REQUEST_CAPTURE_FLUSH_SECONDS = 5
+# Larger bodies aren't read, only their size is recorded
+REQUEST_CAPTURE_MAX_BODY = 64 * 1024
+# Query and body keys containing one of these have their values redacted
+REQUEST_CAPTURE_REDACT = ('password', 'token', 'secret', 'key', 'email', 'username', 'name',
+                          'phone', 'address', 'uid')
+
+# Table bookings (see LittleLemonDRF/bookings.py): slots of BOOKING_SLOT_MINUTES
+# from the opening to the closing time, each seating BOOKING_SLOT_CAPACITY guests
+BOOKING_OPENING_TIME = '11:00'
+BOOKING_CLOSING_TIME = '22:00'
+BOOKING_SLOT_MINUTES = 30
+BOOKING_SLOT_CAPACITY = 40
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,11 +253,19 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # DRF  Settings
 REST_FRAMEWORK = {
+    # orjson when it is installed, see LittleLemonDRF/renderers.py. The
+    # browsable API only in development: rendering it costs a template and a
+    # form per response.
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'LittleLemonDRF.renderers.FastJSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
         # 'rest_framework_xml.renderers.XMLRenderer',
     ],
+    'DEFAULT_PARSER_CLASSES': [
+        'LittleLemonDRF.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         # 'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
@@ -147,19 +274,29 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 2,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonDRF.authentication.CachingTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_THROTTLE_RATES': {
         'anon': '2/minute',
-        'user': '5/minute'
+        'user': '5/minute',
+        # Per view scopes, see LittleLemonDRF.throttling.throttle_scope
+        'menu_items': '5/minute',
+        'cart': '5/minute',
+        'throttle_check': '10/minute',
     },
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'LittleLemonDRF.throttling.AnonThrottle',
+        'LittleLemonDRF.throttling.UserThrottle',
+        'LittleLemonDRF.throttling.ScopedThrottle',
     ],
 }
 
+# Where the throttles keep their state: 'memory' (per process) or 'file'
+# (a SQLite file shared by all the worker processes on the host)
+THROTTLE_STORE = os.environ.get('LITTLELEMON_THROTTLE_STORE', 'memory')
+THROTTLE_STORE_PATH = BASE_DIR / 'throttle.sqlite3'
+
 DJOSER = {
     "USER_ID_FIELD": "username"
 }
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Rating, MenuItem, Category, Order, OrderItem, Cart, Booking
+from .models import Rating, MenuItem, Category, Order, OrderItem, Cart, Booking, BookingSlot
 # Register your models here.
 admin.site.register(Rating)
 admin.site.register(MenuItem)
@@ -8,3 +8,4 @@ admin.site.register(Category)
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(Booking)
+admin.site.register(BookingSlot)
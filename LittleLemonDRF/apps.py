@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LittlelemondrfConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "LittleLemonDRF"
+
+    def ready(self):
+        # Connecting the signal receivers and registering the checks
+        from . import db, routers, signals  # noqa: F401
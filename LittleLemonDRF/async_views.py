@@ -0,0 +1,201 @@
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import NotFound, Throttled, ValidationError
+
+from . import views
+from .authentication import aauthenticate_token
+from .cache import aget_cached_data, aget_versions, aset_cached_data, response_key, version_key
+from .conditional import (acategory_validators, amenu_item_validators, amenu_items_validators,
+                          make_validators, set_validators)
+from .models import Category, MenuItem
+from .pagination import InvalidCursor, apaginate_by_cursor, parse_ordering
+from .renderers import FastJSONRenderer
+from .routers import replica_reads
+from .search import fts_available
+from .serializers import CategorySerializer, FastMenuItemSerializer, MenuItemSerializer
+from .throttling import MemoryStore, get_store
+
+
+# >> Async read path for ASGI
+# Under ASGI a sync view runs in a worker thread through sync_to_async, and
+# every worker thread a request holds is one less for the others. These views
+# serve the hot reads on the event loop and only leave it for the queries of
+# the async ORM and the async cache API. They return the same bodies, ETags and X-Cache headers as the
+# sync views and share their response cache.
+#
+# Only token authenticated JSON GETs are served here. Everything else (writes,
+# session or anonymous clients, unknown tokens, the browsable API) is handed to
+# the sync view, so permissions and error responses stay in one place.
+# urls.py routes to these views when settings.ASYNC_READ_VIEWS is on, which
+# asgi.py does by default.
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), status=status,
+                        content_type='application/json')
+
+
+def wants_json(request):
+    # The sync views negotiate the renderer, the browsable API included
+    return 'format' not in request.GET and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+
+
+async def acheck_throttles(request, view_class):
+    """Run the throttles of the sync view, return the 429 response or None."""
+    if isinstance(get_store(), MemoryStore):
+        # The memory store does no I/O, the throttles can run on the event loop
+        return check_throttles(request, view_class)
+    # The file store is a SQLite query
+    return await sync_to_async(check_throttles)(request, view_class)
+
+
+def check_throttles(request, view_class):
+    # The throttles only look at request.user, request.META and view.throttle_scope
+    throttle_request = SimpleNamespace(user=request.user, META=request.META)
+    waits = [throttle.wait() for throttle in
+             (throttle_class() for throttle_class in view_class.throttle_classes)
+             if not throttle.allow_request(throttle_request, view_class)]
+    if not waits:
+        return None
+    error = Throttled(max((wait for wait in waits if wait is not None), default=None))
+    response = json_response({'detail': error.detail}, error.status_code)
+    if error.wait is not None:
+        response['Retry-After'] = '%d' % error.wait
+    return response
+
+
+def finalize(response, view_class):
+    # The headers APIView.finalize_response adds to every response
+    response['Allow'] = ', '.join(view_class().allowed_methods)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+async def serve(request, sync_view, kwargs, validators, dependencies, build):
+    """The async counterpart of ``conditional_response(cached_response(build))``.
+
+    ``build`` is a coroutine function returning ``(data, status, extra_dependencies)``.
+    """
+    if request.method != 'GET' or not wants_json(request):
+        return await sync_to_async(sync_view)(request, **kwargs)
+    auth = await aauthenticate_token(request)
+    if auth is None:
+        return await sync_to_async(sync_view)(request, **kwargs)
+    request.user, request.auth = auth
+
+    view_class = sync_view.cls
+    response = await acheck_throttles(request, view_class)
+    if response is not None:
+        return finalize(response, view_class)
+
+    result = await validators()
+    if result is None:
+        return finalize(await cached(request, dependencies, build), view_class)
+    etag, timestamp = make_validators(request, 'json', *result)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await cached(request, dependencies, build)
+    return finalize(set_validators(response, etag, timestamp), view_class)
+
+
+async def cached(request, dependencies, build):
+    key = response_key(request)
+    data = await aget_cached_data(key)
+    if data is not None:
+        response = json_response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    # Same order as cached_response: the versions are read before building
+    versions = await aget_versions(dependencies)
+    data, status_code, extra_dependencies = await build()
+    response = json_response(data, status_code)
+    if status_code == status.HTTP_200_OK:
+        versions.update(await aget_versions(extra_dependencies))
+        await aset_cached_data(key, versions, data)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def serialize_menu_items(rows):
+    # The rows come with their category, the serializer runs no query
+    return FastMenuItemSerializer(rows).data
+
+
+async def list_menu_items(params):
+    if params.get('search'):
+        # fts_available() looks at the schema on its first call, a sync query
+        await sync_to_async(fts_available)()
+    try:
+        items, ordering_fields = views.filter_menu_items(params)
+    except ValidationError as error:
+        # The body DRF's exception handler gives the sync view
+        return error.detail, error.status_code, []
+
+    ordering = params.get('ordering')
+    page = params.get('page', default=1)
+    perpage = params.get('perpage', default=2)
+
+    if 'cursor' in params:
+        try:
+            keys = parse_ordering(ordering, views.MENU_ITEM_ORDERING_FIELDS)
+            rows, next_cursor = await apaginate_by_cursor(
+                FastMenuItemSerializer.values(items), keys, params.get('cursor'), int(perpage))
+        except (InvalidCursor, ValueError) as error:
+            return {"message": str(error)}, status.HTTP_400_BAD_REQUEST, []
+        return {"next": next_cursor, "results": serialize_menu_items(rows)}, \
+            status.HTTP_200_OK, []
+
+    if ordering_fields:
+        items = items.order_by(*ordering_fields)
+
+    # >> The Paginator of the sync view, with its COUNT(*) done by the async ORM
+    paginator = Paginator(FastMenuItemSerializer.values(items), per_page=perpage)
+    paginator.count = await paginator.object_list.acount()
+    try:
+        rows = [row async for row in paginator.page(number=page).object_list.aiterator()]
+    except Exception:
+        rows = []
+    return serialize_menu_items(rows), status.HTTP_200_OK, []
+
+
+@replica_reads
+async def menu_items(request):
+    return await serve(
+        request, views.menu_items, {}, amenu_items_validators,
+        [version_key(MenuItem), version_key(Category)],
+        lambda: list_menu_items(request.GET))
+
+
+async def single_menu_item(request, id):
+    async def build():
+        try:
+            # The nested category and the rating are serialized too, so they are joined right away
+            item = await MenuItem.objects.select_related('category', 'rating_summary').aget(pk=id)
+        except MenuItem.DoesNotExist:
+            return {'detail': NotFound.default_detail}, status.HTTP_404_NOT_FOUND, []
+        serialized_item = MenuItemSerializer(item)
+        return serialized_item.data, status.HTTP_200_OK, [version_key(Category, item.category_id)]
+
+    return await serve(
+        request, views.single_menu_item, {'id': id},
+        lambda: amenu_item_validators(id), [version_key(MenuItem, id)], build)
+
+
+@replica_reads
+async def category_detail(request, pk):
+    async def build():
+        try:
+            category = await Category.objects.aget(pk=pk)
+        except Category.DoesNotExist:
+            return {'detail': NotFound.default_detail}, status.HTTP_404_NOT_FOUND, []
+        serialized_category = CategorySerializer(category)
+        return serialized_category.data, status.HTTP_200_OK, []
+
+    return await serve(
+        request, views.category_detail, {'pk': pk},
+        lambda: acategory_validators(pk), [version_key(Category, pk)], build)
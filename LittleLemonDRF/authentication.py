@@ -0,0 +1,133 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import aget_versions, bump_version, get_versions, version_key
+from .permissions import get_user_groups
+
+
+# >> Token lookup cache
+# TokenAuthentication runs a Token + User SELECT on every request. This class
+# keeps a bounded LRU of token key -> (user, token, group names) with a TTL in
+# each process. signals.py drops the entries of a user when one of their
+# tokens is deleted (djoser logout), when they are saved (e.g. deactivated) or
+# when their groups change.
+# The other processes learn about it from a version per user in the default
+# cache (and one for all the tokens), which every cache hit checks: with a
+# shared cache backend a revoked token stops working everywhere on the next
+# request. With the local-memory cache the other processes keep accepting it
+# for up to TOKEN_CACHE_TIMEOUT seconds.
+
+_lock = threading.Lock()
+_tokens = OrderedDict()
+
+
+def revocation_keys(user_id):
+    return [version_key(Token), version_key(User, user_id)]
+
+
+def invalidate_cached_tokens(user_ids=None):
+    """Drop every token of ``user_ids``, in all processes. No argument drops all the tokens."""
+    with _lock:
+        if user_ids is None:
+            _tokens.clear()
+        else:
+            for key in [key for key, entry in _tokens.items() if entry[1].pk in user_ids]:
+                del _tokens[key]
+    if user_ids is None:
+        bump_version(version_key(Token))
+    for user_id in user_ids or ():
+        bump_version(version_key(User, user_id))
+
+
+def _local_entry(key, now):
+    with _lock:
+        entry = _tokens.get(key)
+        if entry is None or entry[0] <= now:
+            return None
+        _tokens.move_to_end(key)
+    return entry
+
+
+def _cached_entry(key, now):
+    entry = _local_entry(key, now)
+    # Revoked by another process
+    if entry is None or get_versions(revocation_keys(entry[1].pk)) != entry[4]:
+        return None
+    return entry
+
+
+async def _acached_entry(key, now):
+    # The versions through the async cache API, off the event loop
+    entry = _local_entry(key, now)
+    if entry is None or await aget_versions(revocation_keys(entry[1].pk)) != entry[4]:
+        return None
+    return entry
+
+
+def _cache_entry(key, now, user, token, groups, versions):
+    entry = (now + getattr(settings, 'TOKEN_CACHE_TIMEOUT', 60), user, token, groups, versions)
+    with _lock:
+        _tokens[key] = entry
+        _tokens.move_to_end(key)
+        while len(_tokens) > getattr(settings, 'TOKEN_CACHE_SIZE', 1000):
+            _tokens.popitem(last=False)
+    return entry
+
+
+def _request_user(entry):
+    _, user, token, groups, _ = entry
+    # Every request gets its own copy, so nothing set on request.user
+    # leaks into other requests
+    user = copy.copy(user)
+    user._group_names = groups
+    return (user, token)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with the same checks and errors, backed by the token cache."""
+
+    def authenticate_credentials(self, key):
+        now = time.monotonic()
+        entry = _cached_entry(key, now)
+        if entry is None:
+            # Raises AuthenticationFailed for unknown tokens and inactive users,
+            # so only valid tokens are ever cached
+            user, token = super().authenticate_credentials(key)
+            entry = _cache_entry(key, now, user, token, get_user_groups(user),
+                                 get_versions(revocation_keys(user.pk)))
+        return _request_user(entry)
+
+
+async def aauthenticate_token(request):
+    """Async lookup of the ``Authorization: Token <key>`` header of a Django request.
+
+    Returns ``(user, token)``, or ``None`` when there is no valid token. The
+    async views hand those requests to the sync views, which produce the
+    usual DRF errors (and handle session authentication).
+    """
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(auth) != 2 or auth[0].lower() != CachingTokenAuthentication.keyword.lower():
+        return None
+    key = auth[1]
+
+    now = time.monotonic()
+    entry = await _acached_entry(key, now)
+    if entry is None:
+        model = CachingTokenAuthentication().get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            return None
+        if not token.user.is_active:
+            return None
+        groups = [name async for name in token.user.groups.values_list('name', flat=True)]
+        entry = _cache_entry(key, now, token.user, token, frozenset(groups),
+                             await aget_versions(revocation_keys(token.user.pk)))
+    return _request_user(entry)
@@ -0,0 +1,87 @@
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Booking, BookingSlot
+
+
+# >> Table bookings
+# A day is cut into slots of BOOKING_SLOT_MINUTES between the opening and the
+# closing time. BookingSlot keeps the seats taken in each slot, so:
+#   - availability reads at most one row per slot of the day through the
+#     (date, time) unique index, however many bookings there are
+#   - a booking takes its seats with a conditional UPDATE that only matches a
+#     slot with enough free seats, so concurrent bookings can't overbook it
+
+class SlotFull(Exception):
+    pass
+
+
+def slot_times():
+    """The start times of the slots of a day."""
+    step = datetime.timedelta(minutes=settings.BOOKING_SLOT_MINUTES)
+    # Any date will do, datetime.time doesn't support arithmetic
+    start = datetime.datetime.combine(
+        datetime.date.min, datetime.time.fromisoformat(settings.BOOKING_OPENING_TIME))
+    closing = datetime.datetime.combine(
+        datetime.date.min, datetime.time.fromisoformat(settings.BOOKING_CLOSING_TIME))
+    times = []
+    while start + step <= closing:
+        times.append(start.time())
+        start += step
+    return times
+
+
+def is_past(date, time):
+    return timezone.make_aware(datetime.datetime.combine(date, time)) <= timezone.now()
+
+
+def available_slots(date, guests):
+    """The slots of ``date`` that can still seat ``guests``, with their free seats."""
+    free = dict(BookingSlot.objects.filter(date=date)
+                .annotate(free=F('capacity') - F('booked')).values_list('time', 'free'))
+    slots = []
+    for time in slot_times():
+        # Slots without a row have no bookings yet
+        seats = free.get(time, settings.BOOKING_SLOT_CAPACITY)
+        if seats >= guests and not is_past(date, time):
+            slots.append({'time': time, 'available': seats})
+    return slots
+
+
+def take_seats(date, time, guests):
+    # >> Only a slot that still has ``guests`` free seats is updated
+    return BookingSlot.objects.filter(
+        date=date, time=time, booked__lte=F('capacity') - guests,
+    ).update(booked=F('booked') + guests)
+
+
+def create_slot(date, time, guests):
+    try:
+        with transaction.atomic():
+            BookingSlot.objects.create(
+                date=date, time=time, capacity=settings.BOOKING_SLOT_CAPACITY, booked=guests)
+        return True
+    except IntegrityError:
+        # Another booking created the slot since take_seats(), or the party is
+        # larger than the capacity (the check constraint)
+        return bool(take_seats(date, time, guests))
+
+
+def book(user, name, guests, date, time):
+    with transaction.atomic():
+        # The UPDATE comes first: on SQLite it takes the write lock, so concurrent
+        # bookings wait for each other (see orders.place_order)
+        if not take_seats(date, time, guests) and not create_slot(date, time, guests):
+            raise SlotFull(f'No table for {guests} guests left at {date} {time:%H:%M}')
+        slot_id = BookingSlot.objects.filter(date=date, time=time).values_list('id', flat=True).get()
+        return Booking.objects.create(user=user, name=name, no_of_guests=guests, slot_id=slot_id)
+
+
+def release_seats(booking):
+    if booking.slot_id is not None:
+        BookingSlot.objects.filter(pk=booking.slot_id).update(
+            booked=F('booked') - booking.no_of_guests)
@@ -0,0 +1,88 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .db import execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+
+# >> Query budgets
+# A view declares the most queries a request to it may run with query_budget().
+# Budgets don't grow with the data: a view that needs a query per row has an
+# N+1 to fix, not a budget to raise. They count every query of the request
+# (authentication, permissions, transactions and savepoints included) with
+# nothing cached.
+#   @query_budget(2)                every method
+#   @query_budget(GET=4, POST=7)    per method, HEAD counts as GET
+# QueryBudgetTests checks each endpoint against its budget at several dataset
+# sizes. With settings.QUERY_BUDGET_WARNINGS on, the middleware counts the
+# queries of every request and logs a warning when one goes over its budget.
+
+
+def query_budget(default=None, **methods):
+    """Set the query budget of a view (function or class). Goes above @api_view."""
+    def decorator(view):
+        view.query_budget = (default, {method.upper(): budget for method, budget in methods.items()})
+        return view
+    return decorator
+
+
+def get_query_budget(view_func, method):
+    """The budget of a resolved view for ``method``, None when it has none."""
+    budget = getattr(view_func, 'query_budget', None) or \
+        getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    if budget is None:
+        return None
+    default, methods = budget
+    return methods.get('GET' if method == 'HEAD' else method, default)
+
+
+class QueryCounter:
+    __slots__ = ('queries',)
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_WARNINGS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        with execute_wrapper(counter):
+            response = self.get_response(request)
+        self.check(request, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        with execute_wrapper(counter):
+            response = await self.get_response(request)
+        self.check(request, counter)
+        return response
+
+    def check(self, request, counter):
+        match = request.resolver_match
+        if match is None:
+            return
+        budget = get_query_budget(match.func, request.method)
+        if budget is not None and counter.queries > budget:
+            logger.warning('%s /%s ran %d queries, over its budget of %d',
+                           request.method, match.route, counter.queries, budget)
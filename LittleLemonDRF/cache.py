@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .models import MenuItem
+from .routers import reading_replica
+
+
+# >> Versioned read-through cache for the menu and category responses
+# Every model (and every single object) has a version counter in the cache.
+# A cached response remembers the versions it was built from and is only
+# served while all of them are unchanged. The post_save/post_delete signals in
+# signals.py bump the counters, so a write only invalidates the responses that
+# actually depend on the changed rows.
+#
+# The counters live in the default cache. With the local-memory backend they
+# are per process, which is fine for a single worker; several workers need a
+# shared backend so that a write in one worker is seen by the others.
+# Responses built from a read replica (routers.py) are served but not stored.
+
+KEY_PREFIX = 'littlelemon'
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def version_key(model, pk=None):
+    name = model._meta.model_name
+    if pk is None:
+        return f'{KEY_PREFIX}:version:{name}'
+    return f'{KEY_PREFIX}:version:{name}:{pk}'
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter was never read or has been evicted. Restarting from a
+        # time based value makes sure it can't match an old version again.
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_menu_items(menuitem_ids):
+    """Bump the list and the per item versions after a write that sends no signals."""
+    bump_version(version_key(MenuItem))
+    for pk in menuitem_ids:
+        bump_version(version_key(MenuItem, pk))
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, time.time_ns(), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def response_key(request):
+    # Query params are normalized so ?a=1&b=2 and ?b=2&a=1 share an entry.
+    # Plain Django requests (the async views) have no query_params, only GET
+    params = sorted(getattr(request, 'query_params', request.GET).lists())
+    raw = f'{request.get_host()}{request.path}?{params}'
+    return f'{KEY_PREFIX}:response:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def get_cached_data(key):
+    """The data stored under ``key`` if all of its dependencies are unchanged, else None."""
+    entry = cache.get(key)
+    if entry is not None and get_versions(list(entry['versions'])) == entry['versions']:
+        _count('hits')
+        return entry['data']
+    _count('misses')
+    return None
+
+
+def set_cached_data(key, versions, data):
+    if reading_replica():
+        # A lagging replica can return rows older than ``versions``: the entry
+        # would be served as fresh until the next write
+        return
+    cache.set(key, {'versions': versions, 'data': data},
+              getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+
+def cached_response(request, dependencies, build):
+    """Serve ``request`` from the cache or call ``build`` to create the response.
+
+    ``dependencies`` are the version keys the response is built from. ``build``
+    returns ``(response, extra_dependencies)`` for keys that are only known
+    once the rows have been loaded. Only successful responses are stored.
+    """
+    key = response_key(request)
+    data = get_cached_data(key)
+    if data is not None:
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    # The versions are read before building, so a write that happens meanwhile
+    # leaves behind an entry that is already stale
+    versions = get_versions(dependencies)
+    response, extra_dependencies = build()
+    if response.status_code == 200:
+        versions.update(get_versions(extra_dependencies))
+        set_cached_data(key, versions, response.data)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+# >> The same for the async views (async_views.py). The async cache API keeps
+# the network round trips of a shared backend off the event loop.
+async def aget_versions(keys):
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        await cache.aadd(key, time.time_ns(), None)
+    if missing:
+        versions.update(await cache.aget_many(missing))
+    return versions
+
+
+async def aget_cached_data(key):
+    entry = await cache.aget(key)
+    if entry is not None and await aget_versions(list(entry['versions'])) == entry['versions']:
+        _count('hits')
+        return entry['data']
+    _count('misses')
+    return None
+
+
+async def aset_cached_data(key, versions, data):
+    if reading_replica():
+        return
+    await cache.aset(key, {'versions': versions, 'data': data},
+                     getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
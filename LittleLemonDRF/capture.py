@@ -0,0 +1,184 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .budgets import QueryCounter
+from .db import execute_wrapper
+from .permissions import get_user_groups
+
+
+# >> Traffic capture
+# With settings.REQUEST_CAPTURE_PATH set, every routed request is appended to
+# that file as one NDJSON record, for `manage.py replay_requests`:
+#   {"at": 1700000000.123, "method": "POST", "path": "/api/cart/menu-items/",
+#    "route": "api/cart/menu-items/", "query": {}, "body": {"menuitem_id": 3,
+#    "quantity": 2}, "role": "customer", "status": 201, "ms": 12.4, "queries": 6}
+# Records are sanitized: no headers, no cookies, and the values of the keys in
+# REQUEST_CAPTURE_REDACT (passwords, tokens, emails, names...) are replaced
+# with REDACTED, in the query and in the body. The user is only kept as a
+# role. Bodies are only kept for JSON and form requests up to
+# REQUEST_CAPTURE_MAX_BODY bytes, other bodies are left to stream and only
+# their size is recorded.
+# Writes are batched: the records are buffered and appended
+# REQUEST_CAPTURE_BATCH at a time (or when the oldest one waited
+# REQUEST_CAPTURE_FLUSH_SECONDS), without fsync. Each batch is one write() to a
+# file opened in append mode, so the worker processes of a server can share the
+# file without interleaving their lines. What is still buffered is written when
+# the process exits.
+
+REDACTED = '<redacted>'
+
+ROLES = (('Manager', 'manager'), ('Delivery crew', 'delivery-crew'))
+
+
+def is_redacted(key):
+    key = str(key).lower()
+    return any(word in key for word in settings.REQUEST_CAPTURE_REDACT)
+
+
+def sanitize(value, key=''):
+    """``value`` with the values of the sensitive keys replaced by REDACTED."""
+    if isinstance(value, dict):
+        return {name: sanitize(item, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item, key) for item in value]
+    if is_redacted(key) and value is not None:
+        return REDACTED
+    return value
+
+
+def user_role(user):
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff:
+        return 'admin'
+    # CachingTokenAuthentication already loaded the groups of token users
+    groups = getattr(user, '_group_names', None)
+    if groups is None:
+        groups = get_user_groups(user)
+    return next((role for group, role in ROLES if group in groups), 'customer')
+
+
+def query_values(querydict):
+    return {key: values[0] if len(values) == 1 else values
+            for key, values in querydict.lists()}
+
+
+def content_length(request):
+    # An invalid header counts as no body, as it does for HttpRequest
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def request_body(request):
+    """The body of a JSON or form request, None for the others (or a bad one)."""
+    length = content_length(request)
+    if not length or length > settings.REQUEST_CAPTURE_MAX_BODY:
+        return None
+    if request.content_type == 'application/json':
+        # Read before the view, which can then still parse it
+        try:
+            return json.loads(request.body)
+        except ValueError:
+            return None
+    if request.content_type == 'application/x-www-form-urlencoded':
+        return query_values(request.POST)
+    return None
+
+
+class CaptureWriter:
+    def __init__(self, path, batch, flush_seconds):
+        self.path, self.batch, self.flush_seconds = path, batch, flush_seconds
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.lines = []
+        self.since = None
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        now = time.monotonic()
+        with self.lock:
+            if not self.lines:
+                self.since = now
+            self.lines.append(line)
+            if len(self.lines) < self.batch and now - self.since < self.flush_seconds:
+                return
+            lines, self.lines = self.lines, []
+        self.write(lines)
+
+    def flush(self):
+        with self.lock:
+            lines, self.lines = self.lines, []
+        if lines:
+            self.write(lines)
+
+    def write(self, lines):
+        data = ''.join(lines).encode()
+        with self.write_lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+
+class RequestCaptureMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_CAPTURE_PATH:
+            raise MiddlewareNotUsed
+        self.writer = CaptureWriter(settings.REQUEST_CAPTURE_PATH, settings.REQUEST_CAPTURE_BATCH,
+                                    settings.REQUEST_CAPTURE_FLUSH_SECONDS)
+        atexit.register(self.writer.flush)
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        body, counter, started = request_body(request), QueryCounter(), time.perf_counter()
+        with execute_wrapper(counter):
+            response = self.get_response(request)
+        self.record(request, response, body, counter, started)
+        return response
+
+    async def __acall__(self, request):
+        body, counter, started = request_body(request), QueryCounter(), time.perf_counter()
+        with execute_wrapper(counter):
+            response = await self.get_response(request)
+        self.record(request, response, body, counter, started)
+        return response
+
+    def record(self, request, response, body, counter, started):
+        # Streamed responses (the exports) are timed up to their first byte
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        if match is None:
+            return
+        record = {
+            'at': round(time.time() - elapsed, 3),
+            'method': request.method,
+            'path': request.path,
+            'route': match.route,
+            'query': sanitize(query_values(request.GET)),
+            'body': sanitize(body),
+            'role': user_role(getattr(request, 'user', None)),
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 3),
+            'queries': counter.queries,
+        }
+        if body is None and content_length(request):
+            record['content_type'] = request.content_type
+            record['body_bytes'] = content_length(request)
+        self.writer.append(record)
@@ -0,0 +1,150 @@
+import hashlib
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .models import MenuItem, MenuItemRating, Category, Rating
+from .routers import reading_replica
+
+
+# >> Conditional GET (ETag / Last-Modified)
+# The validators come from small aggregate queries over updated_at, so a client
+# that already has the current representation gets a 304 before any rows are
+# serialized. The ETag also covers the query params and the response format,
+# which makes it strong: equal ETags mean byte-identical bodies.
+#
+# List validators are taken over the whole table instead of the filtered rows:
+# an item that is edited out of a filter still changes the result. Deleting a
+# row lowers the count, so it changes the ETag, but it can't move
+# Last-Modified forward. Clients should prefer If-None-Match, which takes
+# precedence over If-Modified-Since when both are sent.
+# They come from the database and not from the cache versions of cache.py, so
+# every worker process sends the same ETag for the same rows.
+# The menu list sends no validators when it reads from a replica (routers.py):
+# its body can be a response cached from the primary, newer than the rows the
+# validators would be read from.
+# The detail validators are the updated_at of the row and of what it nests, in
+# one lookup by primary key.
+
+def conditional_response(request, validators, build):
+    """Answer a GET/HEAD with 304 when the client's copy is still current.
+
+    ``validators`` returns ``(state, last_modified)`` or ``None`` when the
+    resource doesn't exist. ``build`` creates the full response otherwise.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return build()
+
+    result = validators()
+    if result is None:
+        return build()
+
+    etag, timestamp = make_validators(request, request.accepted_renderer.format, *result)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    return set_validators(response, etag, timestamp)
+
+
+def make_validators(request, format, state, last_modified):
+    """Return the ``(etag, last_modified timestamp)`` of a response."""
+    # Plain Django requests (the async views) have no query_params, only GET
+    params = sorted(getattr(request, 'query_params', request.GET).lists())
+    raw = f'{request.path}?{params}|{format}|{state}'
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp
+
+
+def set_validators(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+class ConditionalGetMixin:
+    """Conditional GET for the generic views. Subclasses implement ``get_validators``."""
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        return conditional_response(
+            request, self.get_validators,
+            lambda: super(ConditionalGetMixin, self).get(request, *args, **kwargs))
+
+
+def menu_items_validators():
+    if reading_replica():
+        return None
+    # Separate aggregates let SQLite answer MAX() from the updated_at index,
+    # combined in one SELECT they would force a scan of the whole table.
+    # The payload nests the category and the rating aggregates, so their
+    # updated_at is part of the state.
+    state = {
+        'count': MenuItem.objects.count(),
+        'last': MenuItem.objects.aggregate(last=Max('updated_at'))['last'],
+        'category_last': Category.objects.aggregate(last=Max('updated_at'))['last'],
+        'rating_last': MenuItemRating.objects.aggregate(last=Max('updated_at'))['last'],
+    }
+    return state, _latest(state['last'], state['category_last'], state['rating_last'])
+
+
+def menu_item_validators(pk):
+    state = MenuItem.objects.filter(pk=pk).values(
+        'updated_at', 'category__updated_at', 'rating_summary__updated_at').first()
+    if state is None:
+        return None
+    return state, _latest(*state.values())
+
+
+def category_validators(pk):
+    last = Category.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if last is None:
+        return None
+    return last, last
+
+
+def ratings_validators():
+    state = {
+        'count': Rating.objects.count(),
+        'last': Rating.objects.aggregate(last=Max('updated_at'))['last'],
+    }
+    return state, state['last']
+
+
+# >> The same validators for the async views (async_views.py)
+async def amenu_items_validators():
+    if reading_replica():
+        return None
+    state = {
+        'count': await MenuItem.objects.acount(),
+        'last': (await MenuItem.objects.aaggregate(last=Max('updated_at')))['last'],
+        'category_last': (await Category.objects.aaggregate(last=Max('updated_at')))['last'],
+        'rating_last': (await MenuItemRating.objects.aaggregate(last=Max('updated_at')))['last'],
+    }
+    return state, _latest(state['last'], state['category_last'], state['rating_last'])
+
+
+async def amenu_item_validators(pk):
+    state = await MenuItem.objects.filter(pk=pk).values(
+        'updated_at', 'category__updated_at', 'rating_summary__updated_at').afirst()
+    if state is None:
+        return None
+    return state, _latest(*state.values())
+
+
+async def acategory_validators(pk):
+    last = await Category.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+    if last is None:
+        return None
+    return last, last
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
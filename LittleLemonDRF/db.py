@@ -0,0 +1,105 @@
+import contextvars
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# >> SQLite connection tuning
+# settings.SQLITE_PRAGMAS (the production database profile) are applied to every
+# new SQLite connection. With persistent connections (CONN_MAX_AGE) that is once
+# per thread and connection lifetime, not once per request.
+# journal_mode is stored in the database file, the other PRAGMAs are per connection.
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# >> Execute wrappers for the queries of the current request
+# What `with connection.execute_wrapper(wrapper)` does, for the middlewares
+# that count or time all the queries of a request. That only wraps the
+# connections of the calling thread: under ASGI a sync view runs in a
+# sync_to_async thread with connections of its own. So the wrappers are kept
+# in a contextvar, which asgiref copies into that thread, and every connection
+# runs the ones of the current context. Without any, that is one lookup per query.
+_wrappers = contextvars.ContextVar('execute_wrappers', default=())
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    token = _wrappers.set(_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
+
+
+def run_request_wrappers(execute, sql, params, many, context):
+    # The first wrapper is the outermost, as in connection.execute_wrappers
+    for wrapper in reversed(_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_request_wrappers(sender, connection, **kwargs):
+    # Like count_query below: once per wrapper, first in the list
+    if run_request_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, run_request_wrappers)
+
+
+# >> Queries per database alias, e.g. to see how many reads the replicas take
+# Only counted with settings.QUERY_STATS on (DEBUG, benchmarks). Each thread
+# counts into its own Counter, so queries don't contend for a lock; the
+# counters are only added up when the stats are read.
+_lock = threading.Lock()
+_local = threading.local()
+_counters = []
+
+
+def thread_counter():
+    counter = getattr(_local, 'counter', None)
+    if counter is None:
+        counter = _local.counter = Counter()
+        with _lock:
+            _counters.append(counter)
+    return counter
+
+
+def count_query(execute, sql, params, many, context):
+    thread_counter()[context['connection'].alias] += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # connection_created is sent on every reconnect of the same wrapper. First
+    # in the list, so the `with connection.execute_wrapper()` blocks still pop
+    # their own wrapper.
+    if settings.QUERY_STATS and count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+def query_stats():
+    total = Counter()
+    with _lock:
+        counters = list(_counters)
+    for counter in counters:
+        # dict() copies in one step while the owning thread keeps counting
+        total.update(dict(counter))
+    return dict(total)
+
+
+def reset_query_stats():
+    with _lock:
+        for counter in _counters:
+            counter.clear()
@@ -0,0 +1,68 @@
+import itertools
+
+from django.http import StreamingHttpResponse
+
+from .models import MenuItem
+from .orders import order_queryset
+from .renderers import FastJSONRenderer, NDJSONRenderer, render_line
+from .serializers import FastMenuItemSerializer, OrderSerializer
+
+
+# >> Streaming exports
+# A full dump through Paginator and Response builds the whole list in memory.
+# Here the rows are read with QuerySet.iterator(), serialized and encoded one
+# chunk at a time and handed to a StreamingHttpResponse, so the worker never
+# holds more than one chunk, however large the table is.
+
+CHUNK_SIZE = 2000
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def menu_item_chunks(chunk_size=CHUNK_SIZE):
+    """MenuItemSerializer output in chunks. The category and the rating come with the rows."""
+    rows = FastMenuItemSerializer.values(MenuItem.objects.order_by('id'))
+    for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+        yield FastMenuItemSerializer(chunk).data
+
+
+def order_chunks(chunk_size=CHUNK_SIZE):
+    """OrderSerializer output in chunks. The items are prefetched per chunk."""
+    orders = order_queryset().order_by('id')
+    for chunk in chunked(orders.iterator(chunk_size=chunk_size), chunk_size):
+        yield OrderSerializer(chunk, many=True).data
+
+
+def stream_json(chunks):
+    """Write the chunks as a single JSON array."""
+    renderer = FastJSONRenderer()
+    separator = b''
+    yield b'['
+    for chunk in chunks:
+        if chunk:
+            # Every chunk is rendered as an array, its brackets are dropped
+            yield separator + renderer.render(chunk)[1:-1]
+            separator = b','
+    yield b']'
+
+
+def stream_ndjson(chunks):
+    for chunk in chunks:
+        yield b''.join(render_line(row) for row in chunk)
+
+
+def export_response(request, chunks, filename):
+    """Stream ``chunks`` in the format DRF negotiated, JSON or NDJSON."""
+    if request.accepted_renderer.format == NDJSONRenderer.format:
+        response = StreamingHttpResponse(
+            stream_ndjson(chunks), content_type=NDJSONRenderer.media_type)
+        filename = f'{filename}.ndjson'
+    else:
+        response = StreamingHttpResponse(stream_json(chunks), content_type='application/json')
+        filename = f'{filename}.json'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,223 @@
+import codecs
+import csv
+import json
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_menu_items
+from .exports import chunked
+from .models import Category, MenuItem
+from .search import index_menu_items, rebuild_search_index
+from .serializers import MenuItemImportSerializer
+
+
+# >> Bulk menu import
+# Rows are read from the upload as they arrive and handled in batches. Each
+# batch costs a fixed number of queries, however many rows it has:
+#   1. the categories of the batch with in_bulk()
+#   2. the titles of the batch that are already on the menu
+#   3. bulk_create() for the new titles, 4. an upsert for the existing ones
+#   5. the new titles into the search index
+# A title that is already on the menu updates that item, and a later row with
+# the same title wins over an earlier one.
+
+IMPORT_BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+
+FORMATS = {
+    'text/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportLengthRequired(ImportFormatError):
+    pass
+
+
+def upload_rows(request):
+    """The rows of a raw CSV/JSON/NDJSON body, or of the "file" field of a multipart upload."""
+    if request.content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ImportFormatError('Upload the rows as the "file" field')
+        extension = upload.name.rsplit('.', 1)[-1].lower()
+        file_format = FORMATS.get(upload.content_type) or \
+            (extension if extension in FORMATS.values() else None)
+        chunks = upload.chunks(READ_SIZE)
+    else:
+        file_format = FORMATS.get(request.content_type)
+        stream = request.stream
+        if stream is None and not request.META.get('CONTENT_LENGTH'):
+            # A chunked body without a Content-Length is never handed to the
+            # view, it would look like an empty upload
+            raise ImportLengthRequired('Send the upload with a Content-Length header')
+        chunks = iter(lambda: stream.read(READ_SIZE), b'') if stream is not None else iter(())
+
+    if file_format is None:
+        raise ImportFormatError(
+            f'Expected one of {", ".join(FORMATS)} (or a .csv, .json or .ndjson file)')
+    text = decode(chunks)
+    if file_format == 'csv':
+        return csv.DictReader(iter_lines(text))
+    if file_format == 'ndjson':
+        return iter_ndjson(iter_lines(text))
+    return iter_json_array(text)
+
+
+def decode(chunks):
+    try:
+        yield from codecs.iterdecode(chunks, 'utf-8-sig')
+    except UnicodeDecodeError:
+        raise ImportFormatError('The upload is not UTF-8 text')
+
+
+def iter_lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield json.loads(line, parse_float=Decimal)
+            except ValueError:
+                raise ImportFormatError(f'Line {number} is not valid JSON')
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a JSON array without reading the whole array first."""
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buffer, expect = '', '['
+    for chunk in _with_end(chunks):
+        final = chunk is None
+        buffer = (buffer + (chunk or '')).lstrip()
+        while buffer:
+            if expect == '[':
+                if buffer[0] != '[':
+                    raise ImportFormatError('Expected a JSON array of rows')
+                buffer, expect = buffer[1:].lstrip(), 'first'
+            elif expect in ('first', 'value'):
+                if expect == 'first' and buffer[0] == ']':
+                    buffer, expect = buffer[1:].lstrip(), 'end'
+                    continue
+                try:
+                    value, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    if final:
+                        raise ImportFormatError('Invalid JSON')
+                    break
+                if not final and (end == len(buffer) or buffer[end] not in ' \t\r\n,]'):
+                    # Only a delimiter ends a number, 12. could go on as 12.5
+                    break
+                yield value
+                buffer, expect = buffer[end:].lstrip(), ','
+            elif expect == ',':
+                if buffer[0] == ']':
+                    expect = 'end'
+                elif buffer[0] != ',':
+                    raise ImportFormatError('Invalid JSON')
+                else:
+                    expect = 'value'
+                buffer = buffer[1:].lstrip()
+            else:
+                raise ImportFormatError('Unexpected data after the JSON array')
+    if expect != 'end':
+        raise ImportFormatError('Incomplete JSON array')
+
+
+def _with_end(chunks):
+    yield from chunks
+    yield None
+
+
+def import_menu_items(rows, partial=False, batch_size=IMPORT_BATCH_SIZE):
+    """Create or update a menu item for every row, return the counts and the row errors.
+
+    Without ``partial`` nothing is written when any row has an error.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    updated_ids = set()
+    with transaction.atomic():
+        if not connection.features.has_select_for_update:
+            # SQLite: like orders.place_order, writing first takes the write
+            # lock, so an import waits for the other writers instead of failing
+            # with "database is locked" when it upgrades from a read lock
+            MenuItem.objects.filter(pk=0).update(inventory=F('inventory'))
+        for batch in chunked(enumerate(rows), batch_size):
+            import_batch(batch, result, updated_ids)
+        result['errors'].sort(key=lambda error: error['index'])
+
+        if result['errors'] and not partial:
+            transaction.set_rollback(True)
+            result['created'] = result['updated'] = 0
+            return result
+
+        # bulk_create() sends no signals, so the cached menu responses are
+        # invalidated here
+        transaction.on_commit(lambda: invalidate_menu_items(updated_ids))
+    return result
+
+
+def import_batch(batch, result, updated_ids):
+    errors = result['errors']
+    valid = []
+    for index, data in batch:
+        row = MenuItemImportSerializer(data=data)
+        if row.is_valid():
+            valid.append((index, row.validated_data))
+        else:
+            errors.append({"index": index, **row.errors})
+
+    # >> One query for the categories and one for the titles of the whole batch
+    categories = Category.objects.only('id').in_bulk(
+        {data['category_id'] for _, data in valid})
+    existing = dict(MenuItem.objects.filter(
+        title__in={data['title'] for _, data in valid}).values_list('title', 'id'))
+
+    # The upsert doesn't fill in auto_now fields
+    now = timezone.now()
+    new, changed = {}, {}
+    for index, data in valid:
+        category_id = data['category_id']
+        if category_id not in categories:
+            errors.append({"index": index,
+                           "category_id": [f"Category {category_id} does not exist."]})
+            continue
+        item = MenuItem(title=data['title'], price=data['price'], inventory=data['inventory'],
+                        category_id=category_id, updated_at=now)
+        if item.title in existing:
+            item.pk = existing[item.title]
+            changed[item.title] = item
+        else:
+            new[item.title] = item
+
+    created = MenuItem.objects.bulk_create(new.values())
+    # bulk_update() builds a CASE WHEN per field and row, an upsert on the primary
+    # key updates the same rows in plain INSERT ... ON CONFLICT statements
+    MenuItem.objects.bulk_create(
+        changed.values(), update_conflicts=True, unique_fields=['id'],
+        update_fields=['price', 'inventory', 'category', 'updated_at'])
+
+    # Updates keep their title, only the new rows go into the search index
+    if all(item.pk is not None for item in created):
+        index_menu_items(item.pk for item in created)
+    else:
+        # Backends that can't return the ids of bulk inserted rows
+        rebuild_search_index()
+    result['created'] += len(new)
+    result['updated'] += len(changed)
+    updated_ids.update(item.pk for item in changed.values())
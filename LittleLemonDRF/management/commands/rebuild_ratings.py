@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonDRF.ratings import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = ("Recompute the rating aggregates of every menu item from the ratings. "
+            "Needed after ratings were written without signals (bulk_create, update, raw SQL).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        rebuilt = rebuild_summaries(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the rating aggregates of {rebuilt} menu items'))
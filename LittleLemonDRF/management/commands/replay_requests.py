@@ -0,0 +1,196 @@
+import http.client
+import itertools
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from LittleLemonDRF.capture import REDACTED, ROLES
+from LittleLemonDRF.profiling import percentile
+
+REPLAY_PASSWORD = 'Replay-lemon-2023'
+
+
+def load_records(path, limit=None):
+    with open(path) as capture:
+        records = [json.loads(line) for line in capture if line.strip()]
+    records.sort(key=lambda record: record['at'])
+    return records[:limit] if limit else records
+
+
+def role_tokens():
+    """A user and token per role, replay-<role>, created the first time."""
+    tokens = {}
+    groups = dict((role, group) for group, role in ROLES)
+    for role in ('customer', 'admin', *groups):
+        user, created = User.objects.get_or_create(
+            username=f'replay-{role}', defaults={'is_staff': role == 'admin'})
+        if created:
+            user.set_password(REPLAY_PASSWORD)
+            user.save(update_fields=['password'])
+        if role in groups:
+            Group.objects.get_or_create(name=groups[role])[0].user_set.add(user)
+        tokens[role] = Token.objects.get_or_create(user=user)[0].key
+    return tokens
+
+
+def fill_redacted(value, key, counter):
+    """The body with the redacted values replaced by fresh ones."""
+    if isinstance(value, dict):
+        return {name: fill_redacted(item, name, counter) for name, item in value.items()}
+    if isinstance(value, list):
+        return [fill_redacted(item, key, counter) for item in value]
+    if value != REDACTED:
+        return value
+    key = key.lower()
+    if 'password' in key:
+        return REPLAY_PASSWORD
+    if 'email' in key:
+        return f'replay-{next(counter)}@example.com'
+    return f'replay-{next(counter)}'
+
+
+def client_sender(host):
+    # One test client per thread, a view that raises counts as a 500
+    local = threading.local()
+
+    def send(method, path, token, body):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False, SERVER_NAME=host)
+        extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        response = local.client.generic(
+            method, path, json.dumps(body) if body is not None else '',
+            content_type='application/json', **extra)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+    return send
+
+
+def http_sender(url):
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' \
+        else http.client.HTTPConnection
+
+    def send(method, path, token, body):
+        headers = {'Content-Type': 'application/json', 'Connection': 'close'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        connection = connection_class(parts.netloc, timeout=120)
+        try:
+            connection.request(method, parts.path.rstrip('/') + path,
+                               json.dumps(body).encode() if body is not None else None, headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+    return send
+
+
+class Command(BaseCommand):
+    help = ("Replay the requests captured by RequestCaptureMiddleware (REQUEST_CAPTURE_PATH) "
+            "against the app, or a running server with --url, and report the latency per route. "
+            "The requests write: replay against a copy of the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help='NDJSON file written by RequestCaptureMiddleware')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='requests in flight at once')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='2 replays twice as fast as captured, 0 as fast as possible')
+        parser.add_argument('--url', help='base URL of a server using the same database, '
+                                          'instead of the app in this process')
+        parser.add_argument('--host', help='Host of the in-process requests, '
+                                           'by default the first one of ALLOWED_HOSTS')
+        parser.add_argument('--limit', type=int, help='only the first LIMIT requests')
+
+    def handle(self, *args, capture, concurrency, speed, url, host, limit, **options):
+        if concurrency < 1 or speed < 0:
+            raise CommandError('--concurrency must be at least 1 and --speed positive or 0')
+        try:
+            records = load_records(capture, limit)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Cannot read {capture}: {error}')
+        if not records:
+            raise CommandError(f'No requests in {capture}')
+
+        # Users are replayed by role, redacted values with fresh ones
+        tokens = role_tokens()
+        counter = itertools.count(1)
+        if host is None:
+            host = next((host for host in settings.ALLOWED_HOSTS
+                         if host != '*' and not host.startswith('.')), 'localhost')
+        send = http_sender(url) if url else client_sender(host)
+        results = []
+        pending = iter(records)
+        lock = threading.Lock()
+        first = records[0]['at']
+        started = time.perf_counter()
+
+        def worker():
+            while True:
+                with lock:
+                    record = next(pending, None)
+                    if record is None:
+                        return
+                    body = fill_redacted(record.get('body'), '', counter)
+                if speed:
+                    time.sleep(max(0.0, started + (record['at'] - first) / speed
+                                   - time.perf_counter()))
+                path = record['path']
+                if record.get('query'):
+                    path += '?' + urlencode(record['query'], doseq=True)
+                sent = time.perf_counter()
+                status = send(record['method'], path, tokens.get(record.get('role')), body)
+                with lock:
+                    results.append((record, status, (time.perf_counter() - sent) * 1000))
+
+        def thread_worker():
+            try:
+                worker()
+            finally:
+                connections.close_all()
+
+        # The replayed requests aren't captured again
+        with override_settings(REQUEST_CAPTURE_PATH=''):
+            if concurrency == 1:
+                worker()
+            else:
+                threads = [threading.Thread(target=thread_worker) for _ in range(concurrency)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        self.report(results, time.perf_counter() - started)
+
+    def report(self, results, elapsed):
+        by_route = defaultdict(list)
+        for record, status, ms in results:
+            by_route[f"{record['method']} /{record.get('route', record['path'])}"].append(
+                (record, status, ms))
+        width = max(len(route) for route in by_route)
+        self.stdout.write(f"{'route':<{width}}  {'count':>6}  {'captured p50':>12}  "
+                          f"{'p50':>8}  {'p95':>8}  {'p99':>8}  {'statuses'}")
+        changed = 0
+        for route, rows in sorted(by_route.items()):
+            captured = sorted(record['ms'] for record, _, _ in rows)
+            timings = sorted(ms for _, _, ms in rows)
+            statuses = Counter(status for _, status, _ in rows)
+            changed += sum(1 for record, status, _ in rows if status != record['status'])
+            self.stdout.write(
+                f"{route:<{width}}  {len(rows):>6}  {percentile(captured, 50):>10.2f}ms  "
+                + '  '.join(f'{percentile(timings, pct):>6.2f}ms' for pct in (50, 95, 99))
+                + '  ' + ' '.join(f'{code}x{count}' for code, count in sorted(statuses.items())))
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {len(results)} requests in {elapsed:.2f}s '
+            f'({len(results) / elapsed:,.1f} requests/s), '
+            f'{changed} with another status than captured'))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonDRF", "0005_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="title",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="menuitem",
+            name="inventory",
+            field=models.SmallIntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="menuitem",
+            name="price",
+            field=models.DecimalField(db_index=True, decimal_places=2, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name="menuitem",
+            name="title",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="menuitem",
+            index=models.Index(fields=["category", "price"], name="menuitem_category_price_idx"),
+        ),
+    ]
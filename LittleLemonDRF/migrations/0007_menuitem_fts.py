@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+FTS_TABLE = "LittleLemonDRF_menuitem_fts"
+
+
+def fts5_supported(schema_editor):
+    # The trigram tokenizer came with SQLite 3.34
+    if (schema_editor.connection.vendor != "sqlite"
+            or schema_editor.connection.Database.sqlite_version_info < (3, 34)):
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_fts_table(apps, schema_editor):
+    # Other databases and SQLite builds without FTS5 or the trigram tokenizer
+    # use the LIKE fallback
+    if not fts5_supported(schema_editor):
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(title, tokenize="trigram")')
+    schema_editor.execute(
+        f'INSERT INTO "{FTS_TABLE}" (rowid, title) '
+        f'SELECT id, title FROM "LittleLemonDRF_menuitem"')
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{FTS_TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonDRF", "0006_menu_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
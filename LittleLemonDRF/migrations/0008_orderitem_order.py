@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonDRF", "0007_menuitem_fts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="orderitem",
+            name="order",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="items",
+                to="LittleLemonDRF.order",
+            ),
+        ),
+    ]
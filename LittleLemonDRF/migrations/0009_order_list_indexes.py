@@ -0,0 +1,25 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonDRF", "0008_orderitem_order"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "date", "id"], name="order_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["delivery_crew", "date", "id"], name="order_crew_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def fill_summaries(apps, schema_editor):
+    # The same GROUP BY as the rebuild_ratings command, over the existing ratings
+    Rating = apps.get_model("LittleLemonDRF", "Rating")
+    MenuItem = apps.get_model("LittleLemonDRF", "MenuItem")
+    MenuItemRating = apps.get_model("LittleLemonDRF", "MenuItemRating")
+    rows = (
+        Rating.objects.filter(menuitem_id__in=MenuItem.objects.values("id"))
+        .values("menuitem_id")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating_value"),
+            **{
+                f"rating_{value}": Count("id", filter=Q(rating_value=value))
+                for value in range(0, 6)
+            },
+        )
+        .order_by()
+    )
+    MenuItemRating.objects.bulk_create([MenuItemRating(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonDRF", "0009_order_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MenuItemRating",
+            fields=[
+                (
+                    "menuitem",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_summary",
+                        serialize=False,
+                        to="LittleLemonDRF.menuitem",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("rating_0", models.PositiveIntegerField(default=0)),
+                ("rating_1", models.PositiveIntegerField(default=0)),
+                ("rating_2", models.PositiveIntegerField(default=0)),
+                ("rating_3", models.PositiveIntegerField(default=0)),
+                ("rating_4", models.PositiveIntegerField(default=0)),
+                ("rating_5", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,161 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:30
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+import django.db.models.deletion
+
+
+RATING_TABLE = "LittleLemonDRF_rating"
+SUMMARY_TABLE = "LittleLemonDRF_menuitemrating"
+TRIGGERS = ["rating_summary_insert", "rating_summary_update", "rating_summary_delete"]
+VALUES = range(0, 6)
+
+
+def clean_ratings(apps, schema_editor):
+    # The foreign key and the unique constraint need ratings of existing menu
+    # items, and one rating per user and item: the latest one is kept
+    Rating = apps.get_model("LittleLemonDRF", "Rating")
+    MenuItem = apps.get_model("LittleLemonDRF", "MenuItem")
+    MenuItemRating = apps.get_model("LittleLemonDRF", "MenuItemRating")
+    Rating.objects.exclude(menuitem_id__in=MenuItem.objects.values("id")).delete()
+    latest = (
+        Rating.objects.filter(user__isnull=False)
+        .values("user_id", "menuitem_id")
+        .annotate(last=Max("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    duplicates = Rating.objects.none()
+    for row in latest:
+        duplicates = duplicates | Rating.objects.filter(
+            user_id=row["user_id"], menuitem_id=row["menuitem_id"], id__lt=row["last"]
+        )
+    if not duplicates.delete()[0]:
+        return
+    # The historical models don't send the signals, recompute the aggregates
+    MenuItemRating.objects.all().delete()
+    rows = (
+        Rating.objects.values("menuitem_id")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating_value"),
+            **{
+                f"rating_{value}": Count("id", filter=Q(rating_value=value))
+                for value in VALUES
+            },
+        )
+        .order_by()
+    )
+    MenuItemRating.objects.bulk_create([MenuItemRating(**row) for row in rows])
+
+
+def histogram_changes(row, sign):
+    return ", ".join(
+        f"rating_{value} = rating_{value} {sign} ({row}.rating_value = {value})"
+        for value in VALUES
+    )
+
+
+def create_triggers(apps, schema_editor):
+    # Other databases keep the aggregates up to date with the Rating signals
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    columns = ", ".join(f"rating_{value}" for value in VALUES)
+    add_new = (
+        f'INSERT INTO "{SUMMARY_TABLE}" (menuitem_id, count, total, {columns}, updated_at) '
+        f"VALUES (NEW.menuitem_id, 1, NEW.rating_value, "
+        + ", ".join(f"NEW.rating_value = {value}" for value in VALUES)
+        + f", {now}) ON CONFLICT (menuitem_id) DO UPDATE SET "
+        f"count = count + 1, total = total + NEW.rating_value, "
+        f"{histogram_changes('NEW', '+')}, updated_at = excluded.updated_at;"
+    )
+    remove_old = (
+        f'UPDATE "{SUMMARY_TABLE}" SET count = count - 1, total = total - OLD.rating_value, '
+        f"{histogram_changes('OLD', '-')}, updated_at = {now} "
+        f"WHERE menuitem_id = OLD.menuitem_id;"
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER rating_summary_insert AFTER INSERT ON "{RATING_TABLE}" '
+        f"BEGIN {add_new} END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER rating_summary_update "
+        f'AFTER UPDATE OF menuitem_id, rating_value ON "{RATING_TABLE}" '
+        f"WHEN OLD.menuitem_id IS NOT NEW.menuitem_id "
+        f"OR OLD.rating_value IS NOT NEW.rating_value "
+        f"BEGIN {remove_old} {add_new} END"
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER rating_summary_delete AFTER DELETE ON "{RATING_TABLE}" '
+        f"BEGIN {remove_old} END"
+    )
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for name in TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonDRF", "0010_menuitemrating"),
+    ]
+
+    operations = [
+        migrations.RunPython(clean_ratings, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="rating",
+            name="category",
+        ),
+        # menuitem_id becomes the column of the menuitem foreign key
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name="rating",
+                    old_name="menuitem_id",
+                    new_name="menuitem",
+                ),
+                migrations.AlterField(
+                    model_name="rating",
+                    name="menuitem",
+                    field=models.SmallIntegerField(db_column="menuitem_id"),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="rating",
+            name="menuitem",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="ratings",
+                to="LittleLemonDRF.menuitem",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="rating",
+            name="rating_value",
+            field=models.SmallIntegerField(
+                validators=[
+                    django.core.validators.MinValueValidator(0),
+                    django.core.validators.MaxValueValidator(5),
+                ]
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rating",
+            index=models.Index(
+                fields=["menuitem", "rating_value"], name="rating_menuitem_value_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="rating",
+            constraint=models.UniqueConstraint(
+                fields=("user", "menuitem"), name="rating_user_menuitem_unique"
+            ),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("LittleLemonDRF", "0011_rating_menuitem_fk"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("time", models.TimeField()),
+                ("capacity", models.PositiveSmallIntegerField()),
+                ("booked", models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="bookings",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="bookingslot",
+            constraint=models.UniqueConstraint(
+                fields=("date", "time"), name="booking_slot_unique"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="bookingslot",
+            constraint=models.CheckConstraint(
+                check=models.Q(("booked__lte", models.F("capacity"))),
+                name="booking_slot_capacity",
+            ),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="slot",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="bookings",
+                to="LittleLemonDRF.bookingslot",
+            ),
+        ),
+    ]
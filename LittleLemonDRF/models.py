@@ -1,3 +1,4 @@
+from decimal import Decimal
 
 from django.db import models
 from django.core.validators import MinLengthValidator, MaxValueValidator, MinValueValidator
@@ -6,20 +7,39 @@ from django.contrib.auth.models import User
 # Create your models here.
 
 
+def max_decimal(model, field_name):
+    """The largest value the DecimalField ``field_name`` of ``model`` can store."""
+    field = model._meta.get_field(field_name)
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - \
+        Decimal(10) ** -field.decimal_places
+
+
 class Category(models.Model):
     slug = models.SlugField()
-    title = models.CharField(max_length=255)
+    # menu_items filters on category__title
+    title = models.CharField(max_length=255, db_index=True)
+    # Used as the Last-Modified/ETag validator of the read endpoints
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
 
 
 class MenuItem(models.Model):
-    title = models.CharField(max_length=255)
-    price = models.DecimalField(max_digits=6, decimal_places=2)
-    inventory = models.SmallIntegerField()
+    # Every field menu_items can order by is indexed
+    title = models.CharField(max_length=255, db_index=True)
+    price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
+    inventory = models.SmallIntegerField(db_index=True)
     category = models.ForeignKey(
         Category, on_delete=models.PROTECT, null=True, default=1)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Filtering on a category and ordering/filtering by price
+            models.Index(fields=['category', 'price'],
+                         name='menuitem_category_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -28,9 +48,49 @@ class MenuItem(models.Model):
 class Rating(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="users", null=True)
-    menuitem_id = models.SmallIntegerField()
-    rating_value = models.SmallIntegerField()
-    category = models.ForeignKey(User, on_delete=models.CASCADE)
+    # The (menuitem, rating_value) index below starts with menuitem, so the
+    # foreign key doesn't need an index of its own
+    menuitem = models.ForeignKey(
+        MenuItem, on_delete=models.CASCADE, related_name='ratings', db_index=False)
+    rating_value = models.SmallIntegerField(
+        validators=[MinValueValidator(0), MaxValueValidator(5)])
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # One rating per user and menu item, rating again replaces it
+            # (see ratings.upsert_rating)
+            models.UniqueConstraint(fields=['user', 'menuitem'],
+                                    name='rating_user_menuitem_unique'),
+        ]
+        indexes = [
+            # The ratings of a menu item and the histogram GROUP BY
+            models.Index(fields=['menuitem', 'rating_value'],
+                         name='rating_menuitem_value_idx'),
+        ]
+
+
+# >> Rating aggregates of a menu item, kept up to date by database triggers or
+# the Rating signals (see ratings.py), so reading them never needs a GROUP BY
+# over the ratings. There is one counter column per rating value for the histogram.
+class MenuItemRating(models.Model):
+    VALUES = range(0, 6)
+
+    menuitem = models.OneToOneField(
+        MenuItem, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    rating_0 = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def histogram(self):
+        return [getattr(self, f'rating_{value}') for value in self.VALUES]
 
 
 class Cart(models.Model):
@@ -53,9 +113,17 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
 
+    class Meta:
+        indexes = [
+            # The order lists of customers and delivery crew, newest first
+            models.Index(fields=['user', 'date', 'id'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date', 'id'],
+                         name='order_crew_date_idx'),
+        ]
+
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(User, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
@@ -66,10 +134,36 @@ class OrderItem(models.Model):
         unique_together = ('order', 'menuitem')
 
 
+# >> Seats taken in a booking slot, so availability is read from one row per
+# slot instead of summing the bookings (see bookings.py). A slot gets its row
+# with its first booking; the capacity is copied from the settings then.
+class BookingSlot(models.Model):
+    date = models.DateField()
+    time = models.TimeField()
+    capacity = models.PositiveSmallIntegerField()
+    booked = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the (date, time) index of the availability query
+            models.UniqueConstraint(fields=['date', 'time'], name='booking_slot_unique'),
+            models.CheckConstraint(check=models.Q(booked__lte=models.F('capacity')),
+                                   name='booking_slot_capacity'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.time:%H:%M}, {self.booked}/{self.capacity} seats'
+
+
 class Booking(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='bookings', null=True)
     name = models.CharField(max_length=150, validators=[MinLengthValidator(5)])
     no_of_guests = models.IntegerField(
         validators=[MinValueValidator(2), MaxValueValidator(6)])
+    # Bookings made before the slots existed have none
+    slot = models.ForeignKey(
+        BookingSlot, on_delete=models.PROTECT, related_name='bookings', null=True)
     booking_date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -0,0 +1,108 @@
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Prefetch, Value, When
+from django.utils import timezone
+
+from .cache import invalidate_menu_items
+from .models import Cart, MenuItem, Order, OrderItem, max_decimal
+
+
+# >> Order placement
+# The cart of a user becomes an order in one transaction with a fixed number
+# of queries, however many lines the cart has:
+#   1. lock and read the cart lines together with the current menu prices
+#   2. take the stock of every line in a single conditional UPDATE
+#   3. create the order, 4. bulk_create its items, 5. clear the cart
+
+class EmptyCart(Exception):
+    pass
+
+
+class InvalidQuantity(Exception):
+    def __init__(self, menuitem_ids):
+        super().__init__(f'Quantities below 1 for menu items {sorted(menuitem_ids)}')
+        self.menuitem_ids = sorted(menuitem_ids)
+
+
+class OrderTooLarge(Exception):
+    pass
+
+
+class OutOfStock(Exception):
+    def __init__(self, menuitem_ids):
+        super().__init__(f'Not enough stock for menu items {sorted(menuitem_ids)}')
+        self.menuitem_ids = sorted(menuitem_ids)
+
+
+def order_queryset():
+    """Orders with everything OrderSerializer reads, in a fixed number of queries."""
+    return Order.objects.select_related('user', 'delivery_crew').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('menuitem').order_by('id')))
+
+
+# >> Who sees which orders
+def visible_orders(user, groups):
+    if 'Manager' in groups:
+        return order_queryset()
+    if 'Delivery crew' in groups:
+        return order_queryset().filter(delivery_crew=user)
+    return order_queryset().filter(user=user)
+
+
+def place_order(user):
+    with transaction.atomic():
+        if not connection.features.has_select_for_update:
+            # SQLite has no row locks. Writing first takes the database write
+            # lock, so concurrent checkouts wait for each other instead of
+            # failing when they upgrade from a read lock.
+            Cart.objects.filter(user=user).update(quantity=F('quantity'))
+
+        lines = list(Cart.objects.select_for_update().filter(user=user)
+                     .select_related('menuitem').order_by('menuitem_id'))
+        if not lines:
+            raise EmptyCart('The cart is empty')
+        # A line below 1 would give stock back in the conditional UPDATE
+        invalid = [line.menuitem_id for line in lines if line.quantity < 1]
+        if invalid:
+            raise InvalidQuantity(invalid)
+
+        # >> Prices are snapshotted from the menu at the time of the order
+        items = [
+            OrderItem(menuitem_id=line.menuitem_id, quantity=line.quantity,
+                      unit_price=line.menuitem.price,
+                      price=line.quantity * line.menuitem.price)
+            for line in lines
+        ]
+        total = sum(item.price for item in items)
+        # Before any stock is taken. No item costs more than the total, and
+        # OrderItem.price holds as much as Order.total.
+        max_total = max_decimal(Order, 'total')
+        if total > max_total:
+            raise OrderTooLarge(f'The order comes to {total}, more than the {max_total} an order can be')
+
+        # >> Only rows that still have enough stock are updated, so two
+        # checkouts can never sell the same units twice
+        quantities = Case(
+            *[When(pk=line.menuitem_id, then=Value(line.quantity)) for line in lines],
+            output_field=IntegerField())
+        updated = MenuItem.objects.filter(
+            pk__in=[line.menuitem_id for line in lines], inventory__gte=quantities,
+        ).update(inventory=F('inventory') - quantities, updated_at=timezone.now())
+
+        if updated != len(lines):
+            short = set(MenuItem.objects.filter(
+                pk__in=[line.menuitem_id for line in lines], inventory__lt=quantities,
+            ).values_list('id', flat=True))
+            # Raising rolls back the stock of the lines that did fit
+            raise OutOfStock(short)
+
+        order = Order.objects.create(user=user, total=total, date=timezone.localdate())
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+
+        Cart.objects.filter(user=user).delete()
+
+        # update() sends no post_save, so the cached menu responses are invalidated here
+        menuitem_ids = [line.menuitem_id for line in lines]
+        transaction.on_commit(lambda: invalidate_menu_items(menuitem_ids))
+    return order
@@ -0,0 +1,127 @@
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+
+
+# >> Keyset (cursor) pagination
+# Instead of counting the whole table and skipping OFFSET rows, we remember the
+# ordering values of the last row a client has seen and ask the database for
+# the rows that come right after it. The cost of a page therefore does not
+# depend on how deep the client has paged.
+
+class InvalidCursor(Exception):
+    pass
+
+
+def parse_ordering(ordering, allowed_fields):
+    """Turn an ``ordering`` query param into ``[(field, descending), ...]``.
+
+    ``id`` is always appended as a tie breaker so every row has a unique
+    position. Raises ``InvalidCursor`` for fields outside ``allowed_fields``.
+    """
+    keys = []
+    for name in (ordering or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        descending = name.startswith("-")
+        field = name.lstrip("-")
+        if field not in allowed_fields:
+            raise InvalidCursor(f"Cannot order by '{field}'")
+        if field == "id":
+            keys.append((field, descending))
+            return keys
+        keys.append((field, descending))
+    keys.append(("id", False))
+    return keys
+
+
+def encode_cursor(keys, row):
+    values = []
+    for field, _ in keys:
+        # Rows can be model instances or .values() dicts
+        value = row[field] if isinstance(row, dict) else getattr(row, field)
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif hasattr(value, 'isoformat'):
+            # dates and datetimes
+            value = value.isoformat()
+        values.append(value)
+    payload = json.dumps({"o": _signature(keys), "v": values},
+                         separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(model, keys, token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["v"]
+        signature = payload["o"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise InvalidCursor("Invalid cursor")
+
+    # A cursor is only meaningful for the ordering it was created with
+    if signature != _signature(keys) or len(values) != len(keys):
+        raise InvalidCursor("Cursor does not match the requested ordering")
+
+    try:
+        return [model._meta.get_field(field).to_python(value)
+                for (field, _), value in zip(keys, values)]
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def keyset_filter(keys, values):
+    """Build ``(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...`` for the given keys."""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        lookup = "lt" if descending else "gt"
+        condition |= equal & Q(**{f"{field}__{lookup}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def paginate_by_cursor(queryset, keys, cursor, perpage):
+    """Return ``(rows, next_cursor)`` for one page of ``queryset``.
+
+    One extra row is fetched to find out whether there is a next page, so no
+    ``COUNT(*)`` is ever needed.
+    """
+    rows = list(cursor_page_queryset(queryset, keys, cursor, perpage))
+    return cursor_page(rows, keys, perpage)
+
+
+async def apaginate_by_cursor(queryset, keys, cursor, perpage):
+    """``paginate_by_cursor`` for the async views."""
+    rows = [row async for row in
+            cursor_page_queryset(queryset, keys, cursor, perpage).aiterator()]
+    return cursor_page(rows, keys, perpage)
+
+
+def cursor_page_queryset(queryset, keys, cursor, perpage):
+    if perpage < 1:
+        raise InvalidCursor("perpage must be a positive number")
+
+    if cursor:
+        values = decode_cursor(queryset.model, keys, cursor)
+        queryset = queryset.filter(keyset_filter(keys, values))
+
+    order_by = [("-" if descending else "") + field for field, descending in keys]
+    return queryset.order_by(*order_by)[:perpage + 1]
+
+
+def cursor_page(rows, keys, perpage):
+    next_cursor = None
+    if len(rows) > perpage:
+        rows = rows[:perpage]
+        next_cursor = encode_cursor(keys, rows[-1])
+    return rows, next_cursor
+
+
+def _signature(keys):
+    return ",".join(("-" if descending else "") + field for field, descending in keys)
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+
+
+# >> Role cache
+# The group names of a user are kept in a bounded per process LRU with a short
+# TTL, so a manager check doesn't cost a JOIN on auth_user_groups every time.
+# signals.py drops a user's entry as soon as their groups change. Other worker
+# processes pick the change up when their entry expires.
+
+_lock = threading.Lock()
+_roles = OrderedDict()
+
+
+def get_user_groups(user):
+    """Return the set of group names of ``user``."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    now = time.monotonic()
+    with _lock:
+        entry = _roles.get(user.pk)
+        if entry is not None and entry[0] > now:
+            _roles.move_to_end(user.pk)
+            return entry[1]
+
+    groups = frozenset(user.groups.values_list('name', flat=True))
+    with _lock:
+        _roles[user.pk] = (now + getattr(settings, 'ROLE_CACHE_TIMEOUT', 60), groups)
+        _roles.move_to_end(user.pk)
+        while len(_roles) > getattr(settings, 'ROLE_CACHE_SIZE', 1000):
+            _roles.popitem(last=False)
+    return groups
+
+
+def get_request_groups(request):
+    """Like ``get_user_groups`` but resolved at most once per request."""
+    groups = getattr(request, '_group_names', None)
+    if groups is None:
+        # CachingTokenAuthentication already knows the groups of the user
+        groups = getattr(request.user, '_group_names', None)
+        if groups is None:
+            groups = get_user_groups(request.user)
+        request._group_names = groups
+    return groups
+
+
+def invalidate_user_groups(user_ids=None):
+    """Forget the cached groups of ``user_ids``, or of every user when it is None."""
+    with _lock:
+        if user_ids is None:
+            _roles.clear()
+        else:
+            for user_id in user_ids:
+                _roles.pop(user_id, None)
+
+
+class IsManager(BasePermission):
+    message = "You're not autherized"
+
+    def has_permission(self, request, view):
+        return 'Manager' in get_request_groups(request)
+
+
+# >> Everyone can read, only managers can write
+class IsManagerOrReadOnly(IsManager):
+    def has_permission(self, request, view):
+        return request.method in SAFE_METHODS or super().has_permission(request, view)
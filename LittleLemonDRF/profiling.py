@@ -0,0 +1,164 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework import serializers
+
+from .db import execute_wrapper
+
+
+# >> Request profiling
+# With settings.REQUEST_PROFILING on, every request records its number of
+# queries, the time spent in SQL, in serializers (without the SQL they run
+# lazily) and in rendering, and its total time. They are sent back in a
+# Server-Timing header and kept per route (the last REQUEST_PROFILING_WINDOW
+# requests) for the p50/p95/p99 of the request-stats endpoint.
+# With the setting off the middleware removes itself when Django loads it.
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+
+_lock = threading.Lock()
+_samples = defaultdict(deque)
+
+METRICS = ('queries', 'sql_ms', 'serialize_ms', 'render_ms', 'total_ms')
+
+
+class Profile:
+    __slots__ = ('queries', 'sql', 'serialize', 'render', 'render_started', 'depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = self.serialize = self.render = 0.0
+        self.render_started = None
+        self.depth = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - started
+            self.queries += 1
+
+
+def profiled_serialization(data):
+    """Wrap the ``data`` getter of a serializer, to count its time as serialization."""
+    @functools.wraps(data)
+    def wrapper(serializer):
+        profile = _profile.get()
+        if profile is None or profile.depth:
+            return data(serializer)
+        profile.depth += 1
+        started, sql = time.perf_counter(), profile.sql
+        try:
+            return data(serializer)
+        finally:
+            profile.depth -= 1
+            # The queries a serializer runs (lazy querysets, related objects) are SQL time
+            profile.serialize += time.perf_counter() - started - (profile.sql - sql)
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_serializer_hook():
+    # ListSerializer.data and Serializer.data both go through BaseSerializer.data
+    data = serializers.BaseSerializer.data
+    if not getattr(data.fget, 'profiled', False):
+        serializers.BaseSerializer.data = property(profiled_serialization(data.fget))
+
+
+def record(route, sample):
+    window = settings.REQUEST_PROFILING_WINDOW
+    with _lock:
+        samples = _samples[route]
+        if samples.maxlen != window:
+            samples = _samples[route] = deque(samples, maxlen=window)
+        samples.append(sample)
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def request_stats():
+    with _lock:
+        samples = {route: list(values) for route, values in _samples.items()}
+    stats = {}
+    for route, values in sorted(samples.items()):
+        stats[route] = {'count': len(values)}
+        for index, metric in enumerate(METRICS):
+            ordered = sorted(value[index] for value in values)
+            stats[route][metric] = {f'p{pct}': round(percentile(ordered, pct), 3)
+                                    for pct in (50, 95, 99)}
+    return stats
+
+
+def reset_request_stats():
+    with _lock:
+        _samples.clear()
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        install_serializer_hook()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, started = Profile(), time.perf_counter()
+        with self.profiling(profile):
+            response = self.get_response(request)
+        return self.finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile, started = Profile(), time.perf_counter()
+        with self.profiling(profile):
+            response = await self.get_response(request)
+        return self.finish(request, response, profile, started)
+
+    @contextmanager
+    def profiling(self, profile):
+        token = _profile.set(profile)
+        try:
+            with execute_wrapper(profile.count_query):
+                yield
+        finally:
+            _profile.reset(token)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after the template response middleware
+        profile = _profile.get()
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(functools.partial(self.rendered, profile))
+        return response
+
+    @staticmethod
+    def rendered(profile, response):
+        profile.render = time.perf_counter() - profile.render_started
+
+    def finish(self, request, response, profile, started):
+        total = time.perf_counter() - started
+        sample = (profile.queries, profile.sql * 1000, profile.serialize * 1000,
+                  profile.render * 1000, total * 1000)
+        response['Server-Timing'] = (
+            f'db;dur={sample[1]:.2f};desc="{profile.queries} queries", '
+            f'serialize;dur={sample[2]:.2f}, render;dur={sample[3]:.2f}, total;dur={sample[4]:.2f}')
+        match = request.resolver_match
+        if match is not None:
+            record(f'{request.method} /{match.route}', sample)
+        return response
@@ -0,0 +1,122 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .cache import invalidate_menu_items
+from .exports import chunked
+from .models import MenuItemRating, Rating
+
+
+# >> Rating aggregates
+# On SQLite, triggers created by migration 0011 apply every inserted, changed or
+# deleted rating to the MenuItemRating row of its menu item, in the statement
+# that writes the rating. Bulk writes and raw SQL are covered too, and the
+# upsert below stays a single statement.
+# Other databases fall back to the Rating signals (signals.py), which apply the
+# change as a single UPDATE with F() expressions so concurrent ratings of the
+# same item don't lose counts. QuerySet.update(), bulk_create() and raw SQL
+# bypass the signals there: run the rebuild_ratings management command after those.
+
+TRIGGERS = ['rating_summary_insert', 'rating_summary_update', 'rating_summary_delete']
+
+_triggers_available = None
+
+
+def triggers_available():
+    global _triggers_available
+    if _triggers_available is None:
+        _triggers_available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                    TRIGGERS)
+                _triggers_available = cursor.fetchone()[0] == len(TRIGGERS)
+    return _triggers_available
+
+
+def histogram_field(value):
+    return f'rating_{value}' if value in MenuItemRating.VALUES else None
+
+
+def rating_changed(previous, current):
+    """Account for a rating going from ``previous`` to ``current``.
+
+    Both are ``(menuitem_id, rating_value)`` tuples, or None for a created or
+    deleted rating.
+    """
+    if previous == current:
+        return
+    if not triggers_available():
+        if previous is not None:
+            apply_rating(*previous, sign=-1)
+        if current is not None:
+            apply_rating(*current, sign=1)
+    # The aggregates are part of the menu item responses
+    invalidate_menu_items({rating[0] for rating in (previous, current) if rating is not None})
+
+
+def apply_rating(menuitem_id, value, sign):
+    """Add (``sign`` 1) or remove (``sign`` -1) one rating from the aggregates."""
+    changes = {'count': F('count') + sign, 'total': F('total') + sign * value,
+               # QuerySet.update() doesn't fill in auto_now fields
+               'updated_at': timezone.now()}
+    field = histogram_field(value)
+    if field:
+        changes[field] = F(field) + sign
+
+    summaries = MenuItemRating.objects.filter(menuitem_id=menuitem_id)
+    if not summaries.update(**changes) and sign > 0:
+        # The first rating of the item
+        try:
+            with transaction.atomic():
+                MenuItemRating.objects.create(
+                    menuitem_id=menuitem_id, count=1, total=value, **({field: 1} if field else {}))
+        except IntegrityError:
+            # Another request created the row in the meantime
+            summaries.update(**changes)
+
+
+def upsert_rating(user, menuitem_id, value):
+    """Rate a menu item for ``user``, replacing their previous rating of it.
+
+    With the triggers this is one INSERT ... ON CONFLICT DO UPDATE statement:
+    no SELECT for an existing rating, and the aggregates are updated by the
+    database. A menu item that doesn't exist fails the foreign key with an
+    IntegrityError (at the end of the transaction, the key is deferred).
+    """
+    rating = Rating(user=user, menuitem_id=menuitem_id, rating_value=value)
+    if not triggers_available():
+        # save() sends the signals that keep the aggregates up to date
+        rating, _ = Rating.objects.update_or_create(
+            user=user, menuitem_id=menuitem_id, defaults={'rating_value': value})
+        return rating
+    # bulk_create() fills in updated_at and doesn't send signals
+    Rating.objects.bulk_create(
+        [rating], update_conflicts=True, unique_fields=['user', 'menuitem'],
+        update_fields=['rating_value', 'updated_at'])
+    invalidate_menu_items([menuitem_id])
+    return rating
+
+
+def summary_rows():
+    """The aggregates of every rated menu item, computed in a single GROUP BY."""
+    return (
+        Rating.objects.values('menuitem_id')
+        .annotate(count=Count('id'), total=Sum('rating_value'),
+                  **{histogram_field(value): Count('id', filter=Q(rating_value=value))
+                     for value in MenuItemRating.VALUES})
+        .order_by()
+    )
+
+
+def rebuild_summaries(batch_size=1000):
+    """Recompute all the aggregates, return the number of rated menu items."""
+    with transaction.atomic():
+        changed = set(MenuItemRating.objects.values_list('menuitem_id', flat=True))
+        MenuItemRating.objects.all().delete()
+        for batch in chunked(summary_rows().iterator(chunk_size=batch_size), batch_size):
+            MenuItemRating.objects.bulk_create([MenuItemRating(**row) for row in batch])
+            changed.update(row['menuitem_id'] for row in batch)
+        transaction.on_commit(lambda: invalidate_menu_items(changed))
+    return MenuItemRating.objects.count()
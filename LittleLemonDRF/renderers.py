@@ -0,0 +1,84 @@
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# >> Fast JSON
+# orjson renders and parses JSON several times faster than the json module,
+# when it is installed. The output is the same as DRF's JSONRenderer:
+# compact, UTF-8, \u2028 and \u2029 escaped, and every type orjson doesn't
+# handle the DRF way (Decimal as a float, datetimes, dates and times as
+# isoformat(), lazy strings...) through the same encoder. Without orjson, or
+# for what it can't do (indented output, integers over 64 bits, the ASCII or
+# non compact settings), these are DRF's JSONRenderer and JSONParser.
+# Two differences, with values the serializers don't produce: orjson renders
+# NaN and infinities as null where the json module raises (STRICT_JSON), and
+# parses integers over 64 bits as floats.
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    def default(self, obj):
+        # Decimals not coerced to strings (price_after_tax) are the common case
+        if type(obj) is Decimal:
+            return float(obj)
+        return self.encoder_class().default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # The json module raises the same error, or handles what orjson can't
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            # Like the strict json module, orjson refuses NaN and Infinity
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # The json module words the error the way DRF clients know
+            return super().parse(BytesIO(body), media_type, parser_context)
+
+
+# >> Newline delimited JSON, one object per line
+# Used by the export endpoints (?format=ndjson), which stream their rows
+# themselves. render() is only called for whole responses such as errors.
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(render_line(row) for row in rows)
+
+
+def render_line(row, renderer=FastJSONRenderer()):
+    return renderer.render(row) + b'\n'
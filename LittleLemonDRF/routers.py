@@ -0,0 +1,145 @@
+import contextvars
+import hashlib
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+
+# >> Read replicas
+# settings.DATABASE_REPLICAS lists database aliases that hold a copy of the
+# primary ("default"). Only the GET/HEAD requests of the views marked with
+# replica_reads read from a replica (one picked per request). Everything else
+# uses the primary:
+#   - writes, and the reads of a request after its first write
+#   - the reads of a client for REPLICA_STICKY_SECONDS after it wrote, so it
+#     reads its own writes despite the replication lag. Clients are told apart
+#     by their Authorization header or session cookie. The mark is kept in the
+#     default cache, which must be shared by the worker processes: a client's
+#     next request can go to another one (see check_shared_cache).
+#   - users, groups, tokens and sessions, so a token created a moment ago on
+#     the primary already authenticates
+# Queries outside a request (management commands, shell) use the primary.
+
+PRIMARY_APPS = {'auth', 'authtoken', 'contenttypes', 'sessions'}
+
+# Cache backends whose entries the other worker processes don't see
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+
+_request = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    # Mutated in place, so writes seen in a sync_to_async thread count too
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def replica_reads(view):
+    """Let the GET/HEAD requests of a view (function or class) read from a replica."""
+    view.replica_reads = True
+    return view
+
+
+def reading_replica():
+    """Whether the reads of the current request go to a replica."""
+    state = _request.get()
+    return state is not None and state.replica is not None and not state.wrote
+
+
+@checks.register(checks.Tags.caches, checks.Tags.database)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if not settings.DATABASE_REPLICAS or backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [checks.Warning(
+        'The read replicas need a cache backend shared by the worker processes.',
+        hint="A client reads its own writes only from the worker it wrote through. "
+             "Set CACHES['default'] to Redis, Memcached, the database or a file based cache.",
+        id='LittleLemonDRF.W001')]
+
+
+def sticky_key(request):
+    client = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not client:
+        return None
+    return 'primary-reads:' + hashlib.sha256(client.encode()).hexdigest()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if (state is None or state.replica is None or state.wrote
+                or model._meta.app_label in PRIMARY_APPS):
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema from the primary
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.remember_write(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.remember_write(request, state)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _request.get()
+        view_class = getattr(view_func, 'cls', None)
+        if (state is None or not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS
+                or not (getattr(view_func, 'replica_reads', False)
+                        or getattr(view_class, 'replica_reads', False))):
+            return None
+        key = sticky_key(request)
+        if key is None or not cache.get(key):
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def remember_write(self, request, state):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            key = sticky_key(request)
+            if key is not None:
+                cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
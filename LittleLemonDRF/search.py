@@ -0,0 +1,74 @@
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+
+# >> Full text search for menu item titles
+# On SQLite builds with FTS5 the titles are copied into a trigram FTS5 table
+# (created by migration 0007). A trigram index answers substring matches, so
+# search= keeps the same meaning as title__contains, without scanning the menu.
+# signals.py keeps the table in sync on save/delete. Code that writes with
+# bulk_create() or QuerySet.update() has to call index_menu_items() for the
+# new rows or rebuild_search_index().
+# Without FTS5 or SQLite 3.34 (the trigram tokenizer), or for terms shorter
+# than a trigram, search falls back to LIKE.
+
+FTS_TABLE = 'LittleLemonDRF_menuitem_fts'
+
+_available = None
+
+
+def fts_available():
+    global _available
+    if _available is None:
+        # A database migrated with a newer SQLite can have the table without
+        # the trigram tokenizer (3.34) to read it
+        _available = (connection.vendor == 'sqlite'
+                      and connection.Database.sqlite_version_info >= (3, 34)
+                      and FTS_TABLE in connection.introspection.table_names())
+    return _available
+
+
+def search_menu_items(queryset, term):
+    if len(term) >= 3 and fts_available():
+        # A quoted FTS5 phrase, so the term is matched literally
+        phrase = '"' + term.replace('"', '""') + '"'
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s', (phrase,)))
+    return queryset.filter(title__contains=term)
+
+
+def index_menu_item(item):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [item.pk])
+            cursor.execute(
+                f'INSERT INTO "{FTS_TABLE}" (rowid, title) VALUES (%s, %s)', [item.pk, item.title])
+
+
+def index_menu_items(pks):
+    """Index new rows, e.g. from bulk_create(). One statement per 500 rows."""
+    if fts_available():
+        pks = list(pks)
+        with connection.cursor() as cursor:
+            for start in range(0, len(pks), 500):
+                batch = pks[start:start + 500]
+                cursor.execute(
+                    f'INSERT INTO "{FTS_TABLE}" (rowid, title) '
+                    f'SELECT id, title FROM "LittleLemonDRF_menuitem" '
+                    f'WHERE id IN ({", ".join(["%s"] * len(batch))})', batch)
+
+
+def unindex_menu_item(pk):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [pk])
+
+
+def rebuild_search_index():
+    """Copy every menu item title into the FTS table again, in one statement each."""
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+            cursor.execute(
+                f'INSERT INTO "{FTS_TABLE}" (rowid, title) '
+                f'SELECT id, title FROM "LittleLemonDRF_menuitem"')
@@ -1,9 +1,13 @@
 from django.contrib.auth.models import User
 from rest_framework.validators import UniqueTogetherValidator
 from .models import Rating
-from .models import MenuItem, Category, Rating, Cart, Booking
+from .models import MenuItem, MenuItemRating, Category, Rating, Cart, Booking, Order, OrderItem
 from rest_framework import serializers
+import decimal
 from decimal import Decimal
+from rest_framework.settings import api_settings
+from .bookings import is_past, slot_times
+from .profiling import profiled_serialization
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
 ################ SIMPLE SERIALIZER #################
@@ -19,6 +23,17 @@ class MenuItemSerializerSimple(serializers.Serializer):
 ################ MODEL SERIALIZER ##################
 
 
+# >> The "rating" of a menu item, from the counters of MenuItemRating.
+# Shared by the serializers below, so they all produce the same output.
+def rating_data(count=0, total=0, histogram=None):
+    histogram = histogram or [0] * len(MenuItemRating.VALUES)
+    return {
+        'count': count,
+        'average': round(total / count, 2) if count else None,
+        'histogram': {str(value): histogram[i] for i, value in enumerate(MenuItemRating.VALUES)},
+    }
+
+
 class CategorySerializer (serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -48,10 +63,13 @@ class MenuItemSerializer(serializers.HyperlinkedModelSerializer):
     # changing name of inventory field in the model to stock
     stock = serializers.IntegerField(source='inventory')
 
+    # >> Precomputed rating aggregates, select_related('rating_summary') avoids a query per item
+    rating = serializers.SerializerMethodField(method_name="get_rating")
+
     class Meta:
         model = MenuItem
         fields = ["id", "title", "price", "stock",
-                  "price_after_tax", 'category', "category_id"]
+                  "price_after_tax", 'category', "category_id", "rating"]
 
         # Data validation
         extra_kwargs = {
@@ -81,33 +99,124 @@ class MenuItemSerializer(serializers.HyperlinkedModelSerializer):
     def calculate_tax(self, product: MenuItem):
         return product.price * Decimal(1.1)
 
+    def get_rating(self, product: MenuItem):
+        try:
+            summary = product.rating_summary
+        except MenuItemRating.DoesNotExist:
+            return rating_data()
+        return rating_data(summary.count, summary.total, summary.histogram)
+
+
+# >> Read only fast path for menu item lists
+# Produces exactly the same output as MenuItemSerializer(many=True), but works
+# on plain .values() rows instead of building DRF fields for every object.
+# The nested category and the rating aggregates come with the rows, LEFT JOINs
+# on their primary keys, so a page is a single query.
+class FastMenuItemSerializer:
+    rating_fields = ('rating_summary__count', 'rating_summary__total',
+                     *[f'rating_summary__rating_{value}' for value in MenuItemRating.VALUES])
+    value_fields = ('id', 'title', 'price', 'inventory', 'category_id',
+                    'category__slug', 'category__title', *rating_fields)
+
+    # Same value MenuItemSerializer.calculate_tax multiplies with
+    TAX_RATE = Decimal(1.1)
+    PRICE_QUANTUM = Decimal('0.01')
+    PRICE_CONTEXT = decimal.Context(prec=6)  # max_digits of MenuItem.price
+
+    def __init__(self, rows, categories=None):
+        self.rows = rows
+        self.categories = categories
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.value_fields)
+
+    @property
+    @profiled_serialization
+    def data(self):
+        rows = list(self.rows)
+        categories = self.categories
+        if categories is None:
+            categories = {
+                row['category_id']: {'id': row['category_id'], 'slug': row['category__slug'],
+                                      'title': row['category__title']}
+                for row in rows if row['category_id'] is not None
+            }
+
+        coerce_to_string = api_settings.COERCE_DECIMAL_TO_STRING
+        quantum, context, tax_rate = self.PRICE_QUANTUM, self.PRICE_CONTEXT, self.TAX_RATE
+        data = []
+        for row in rows:
+            price = row['price']
+            quantized = price.quantize(quantum, context=context)
+            data.append({
+                'id': row['id'],
+                'title': row['title'],
+                'price': '{:f}'.format(quantized) if coerce_to_string else quantized,
+                'stock': row['inventory'],
+                'price_after_tax': price * tax_rate,
+                'category': categories.get(row['category_id']),
+                'rating': rating_data(
+                    row['rating_summary__count'] or 0, row['rating_summary__total'] or 0,
+                    [row[field] or 0 for field in self.rating_fields[2:]]),
+            })
+        return data
+
+
+# >> One row of a bulk menu import (imports.py). The fields and limits of
+# MenuItemSerializer, without the per row queries: the unique title and the
+# category are checked for a whole batch at once.
+class MenuItemImportSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=2)
+    stock = serializers.IntegerField(source='inventory', min_value=0, max_value=32767)
+    category_id = serializers.IntegerField()
+
+
+class MenuItemRatingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MenuItemRating
+        fields = ['menuitem']
+
+    def to_representation(self, instance):
+        return {**super().to_representation(instance),
+                **rating_data(instance.count, instance.total, instance.histogram)}
+
 
 class BookingSerializer(serializers.ModelSerializer):
+    # The requested slot, the seats are taken by bookings.book(). Null for the
+    # bookings made before there were slots.
+    date = serializers.DateField(source='slot.date', allow_null=True)
+    time = serializers.TimeField(source='slot.time', format='%H:%M', allow_null=True)
+
     class Meta:
         model = Booking
-        fields = []
+        fields = ['id', 'name', 'no_of_guests', 'date', 'time', 'booking_date']
+
+    def validate(self, attrs):
+        slot = attrs['slot']
+        if slot['date'] is None or slot['time'] is None:
+            raise serializers.ValidationError('A date and a time are required')
+        if slot['time'] not in slot_times():
+            raise serializers.ValidationError({'time': ['Not the start of a booking slot']})
+        if is_past(slot['date'], slot['time']):
+            raise serializers.ValidationError({'date': ['The slot is in the past']})
+        return attrs
 
 
 class RatingSerializer (serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all(),
-        default=serializers.CurrentUserDefault()
-    )
+    # The rating of the authenticated user. A plain integer for the menu item:
+    # the foreign key is checked by the database when the rating is written,
+    # instead of a SELECT per request (see ratings.upsert_rating)
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    menuitem = serializers.IntegerField(source='menuitem_id')
 
     class Meta:
         model = Rating
-        fields = ['user', 'menuitem_id', 'rating']
-
-    validators = [
-        UniqueTogetherValidator(
-            queryset=Rating.objects.all(),
-            fields=['user', 'menuitem_id']
-        )
-    ]
-
-    extra_kwargs = {
-        'rating': {'min_value': 0, 'max_value': 5},
-    }
+        fields = ['user', 'menuitem', 'rating_value']
+        # (user, menuitem) is unique in the database and rating an item again
+        # replaces the rating, so there is no UniqueTogetherValidator query
+        validators = []
 
 
 # class CartSerializer(serializers.ModelSerializer):
@@ -166,6 +275,7 @@ class CartSerializer(serializers.ModelSerializer):
                   'menuitem_inventory', 'quantity', 'price')
         read_only_fields = ('id', 'user', 'menuitem_title',
                             'menuitem_price', 'menuitem_inventory', 'price')
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
     def calculate_price(self, validated_data):
         quantity = validated_data['quantity']
@@ -175,3 +285,34 @@ class CartSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data['price'] = self.calculate_price(validated_data)
         return super().create(validated_data)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    line_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+# One entry of the bulk cart endpoint, a quantity of 0 removes the line
+class CartEntrySerializer(serializers.Serializer):
+    menuitem_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, max_value=1000)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    menuitem_title = serializers.CharField(
+        source='menuitem.title', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'menuitem', 'menuitem_title', 'quantity', 'unit_price', 'price')
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    # >> Expects the items to be prefetched together with their menu items
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'user', 'delivery_crew', 'status', 'total', 'date', 'items')
+        read_only_fields = ('user', 'total', 'date')
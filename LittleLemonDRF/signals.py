@@ -0,0 +1,116 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_cached_tokens
+from .bookings import release_seats
+from .cache import bump_version, version_key
+from .permissions import invalidate_user_groups
+from .ratings import rating_changed, triggers_available
+from .search import index_menu_item, unindex_menu_item
+from .models import MenuItem, Category, Rating, Booking
+
+
+# >> Cache invalidation
+# Saving or deleting a row bumps the version of its model (used by the list
+# responses) and the version of the row itself (used by the detail responses).
+# This covers the API views as well as the admin, since both call save()/delete().
+# Note that QuerySet.update() and bulk_create() don't send these signals.
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    bump_version(version_key(MenuItem))
+    bump_version(version_key(MenuItem, instance.pk))
+
+
+# >> Search index
+@receiver(post_save, sender=MenuItem)
+def menu_item_saved(sender, instance, **kwargs):
+    index_menu_item(instance)
+
+
+@receiver(post_delete, sender=MenuItem)
+def menu_item_deleted(sender, instance, **kwargs):
+    unindex_menu_item(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_version(version_key(Category))
+    bump_version(version_key(Category, instance.pk))
+
+
+# >> Rating aggregates (see ratings.py)
+# Without the triggers, an update takes the old rating, read back from the
+# database, out of the aggregates and adds the new one. With them the database
+# does that, and no SELECT is needed: the menu item the rating was loaded with
+# is enough to invalidate both items when a rating moves to another one.
+@receiver(post_init, sender=Rating)
+def rating_loaded(sender, instance, **kwargs):
+    # From __dict__, so a deferred field doesn't run a query
+    instance._loaded_menuitem_id = instance.__dict__.get('menuitem_id')
+
+
+@receiver(pre_save, sender=Rating)
+def rating_saving(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk is None:
+        return
+    if not triggers_available():
+        instance._previous_rating = Rating.objects.filter(pk=instance.pk).values_list(
+            'menuitem_id', 'rating_value').first()
+    elif instance._loaded_menuitem_id is not None:
+        # Only the menu item is used, for the invalidation
+        instance._previous_rating = (instance._loaded_menuitem_id, None)
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, **kwargs):
+    rating_changed(getattr(instance, '_previous_rating', None),
+                   (instance.menuitem_id, instance.rating_value))
+    instance._loaded_menuitem_id = instance.menuitem_id
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    rating_changed((instance.menuitem_id, instance.rating_value), None)
+
+
+# >> A deleted booking gives its seats back to the slot (see bookings.py)
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    release_seats(instance)
+
+
+# >> Role cache invalidation
+# user.groups.add() sends the signal with the user as instance, while
+# group.user_set.add() (used by the managers view) sends it with the group
+# as instance and the user ids in pk_set.
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_user_groups([instance.pk])
+        invalidate_cached_tokens(user_ids={instance.pk})
+    elif pk_set:
+        invalidate_user_groups(pk_set)
+        invalidate_cached_tokens(user_ids=set(pk_set))
+    else:
+        # group.user_set.clear() doesn't tell which users were affected
+        invalidate_user_groups()
+        invalidate_cached_tokens()
+
+
+# >> Token cache invalidation
+# djoser's logout deletes the token, deactivating a user saves it
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_cached_tokens(user_ids={instance.user_id})
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    invalidate_cached_tokens(user_ids={instance.pk})
@@ -1,3 +1,1739 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import async_views, views
+from .cache import bump_version, cache_stats, reset_cache_stats, version_key
+from .exports import menu_item_chunks, order_chunks, stream_json, stream_ndjson
+from .imports import ImportFormatError, import_menu_items, iter_json_array
+from .models import (MenuItem, MenuItemRating, Category, Cart, Order, OrderItem, Rating, Booking,
+                     BookingSlot)
+from .authentication import invalidate_cached_tokens
+from .bookings import slot_times
+from .budgets import QueryCounter, get_query_budget
+from .db import query_stats, reset_query_stats
+from .profiling import reset_request_stats
+from .renderers import FastJSONParser, FastJSONRenderer
+from .routers import check_shared_cache
+from .permissions import get_user_groups, invalidate_user_groups
+from .throttling import MemoryStore, FileStore, reset_store
+from .serializers import MenuItemSerializer, FastMenuItemSerializer, OrderSerializer
+from .orders import order_queryset
+from .ratings import triggers_available, upsert_rating
+from .search import fts_available, rebuild_search_index
+from .views import SingleMenuItemView
 
 # Create your tests here.
+
+
+class APITestMixin:
+    # The global throttle rates (5/minute for users) are far below what a test run needs
+    def setUp(self):
+        reset_store()
+        cache.clear()
+        invalidate_user_groups()
+        invalidate_cached_tokens()
+        patcher = mock.patch(
+            'LittleLemonDRF.throttling.GCRAThrottle.allow_request', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # On with DEBUG. QueryBudgetTests checks the budgets, without the
+        # savepoints the test transaction adds to every atomic() block.
+        budgets = override_settings(QUERY_BUDGET_WARNINGS=False)
+        budgets.enable()
+        self.addCleanup(budgets.disable)
+
+        self.user = User.objects.create_user('customer', password='lemon-pass-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_manager(self, user):
+        managers, _ = Group.objects.get_or_create(name="Manager")
+        managers.user_set.add(user)
+
+
+class APITestCase(APITestMixin, TestCase):
+    pass
+
+
+class MenuItemsCursorTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        for i in range(7):
+            MenuItem.objects.create(
+                title=f'Dish {i}', price=Decimal('5.00') + i % 3, inventory=10,
+                category=self.mains if i % 2 else self.desserts)
+
+    def walk(self, **params):
+        titles, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get(
+                '/api/menu-items/', {**params, 'cursor': cursor, 'perpage': 2})
+            self.assertEqual(response.status_code, 200)
+            titles += [item['title'] for item in response.data['results']]
+            cursor = response.data['next']
+        return titles
+
+    def test_walks_every_item_once_in_order(self):
+        expected = list(MenuItem.objects.order_by('-price', 'id')
+                        .values_list('title', flat=True))
+        self.assertEqual(self.walk(ordering='-price'), expected)
+
+    def test_keeps_filters(self):
+        expected = list(MenuItem.objects.filter(category__title='Mains')
+                        .order_by('title', 'id').values_list('title', flat=True))
+        self.assertEqual(self.walk(category='Mains', ordering='title'), expected)
+
+    def test_page_query_does_not_count_or_offset(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/menu-items/', {'cursor': '', 'perpage': 3})
+        # The remaining queries are the ETag validators
+        page_queries = [q['sql'] for q in queries if 'LIMIT' in q['sql']]
+        self.assertEqual(len(page_queries), 1)
+        self.assertNotIn('COUNT', page_queries[0])
+        self.assertNotIn('OFFSET', page_queries[0])
+
+    def test_rejects_bad_cursor_and_ordering(self):
+        response = self.client.get('/api/menu-items/', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            '/api/menu-items/', {'cursor': '', 'ordering': 'category__slug'})
+        self.assertEqual(response.status_code, 400)
+
+        cursor = self.client.get(
+            '/api/menu-items/', {'cursor': '', 'ordering': 'price'}).data['next']
+        response = self.client.get(
+            '/api/menu-items/', {'cursor': cursor, 'ordering': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_cache_stats()
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.pasta = MenuItem.objects.create(
+            title='Pasta', price=Decimal('9.50'), inventory=5, category=self.mains)
+        self.cake = MenuItem.objects.create(
+            title='Cake', price=Decimal('4.00'), inventory=5, category=self.desserts)
+
+    def test_list_is_served_from_cache_until_a_write(self):
+        first = self.client.get('/api/menu-items/', {'perpage': 5, 'page': 1})
+        # Only the ETag aggregates are left
+        with self.assertNumQueries(4):
+            # Same params in a different order hit the same entry
+            second = self.client.get('/api/menu-items/', {'page': 1, 'perpage': 5})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+        self.cake.price = Decimal('4.50')
+        self.cake.save()
+        third = self.client.get('/api/menu-items/', {'perpage': 5, 'page': 1})
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data[1]['price'], '4.50')
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 2)
+
+    def test_detail_writes_only_invalidate_affected_entries(self):
+        self.make_manager(self.user)
+        self.client.get(f'/api/menu-items/{self.pasta.pk}')
+        self.client.get(f'/api/menu-items/{self.cake.pk}')
+        self.client.get(f'/api/category/{self.desserts.pk}')
+
+        response = self.client.patch(
+            f'/api/menu-items/{self.cake.pk}',
+            {'title': 'Lemon cake', 'price': '5.00', 'stock': 3, 'category_id': self.desserts.pk})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.pasta.pk}')['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(f'/api/category/{self.desserts.pk}')['X-Cache'], 'HIT')
+        response = self.client.get(f'/api/menu-items/{self.cake.pk}')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], 'Lemon cake')
+
+        # A category change reaches the menu items nested in it
+        self.desserts.title = 'Sweets'
+        self.desserts.save()
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.pasta.pk}')['X-Cache'], 'HIT')
+        response = self.client.get(f'/api/menu-items/{self.cake.pk}')
+        self.assertEqual(response.data['category']['title'], 'Sweets')
+
+    def test_deleted_item_is_not_served(self):
+        self.make_manager(self.user)
+        self.client.get(f'/api/menu-items/{self.cake.pk}')
+        self.client.delete(f'/api/menu-items/{self.cake.pk}')
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.cake.pk}').status_code, 404)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(
+            title='Pasta', price=Decimal('9.50'), inventory=5, category=self.mains)
+
+    def test_if_none_match_returns_304_until_a_change(self):
+        response = self.client.get('/api/menu-items/', {'perpage': 5})
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get('/api/menu-items/', {'perpage': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Different params are a different representation
+        response = self.client.get('/api/menu-items/', {'perpage': 4}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # So is the category nested in every item
+        self.mains.title = 'Main courses'
+        self.mains.save()
+        response = self.client.get('/api/menu-items/', {'perpage': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_is_the_same_in_every_worker(self):
+        # A cleared cache stands in for another worker process
+        etag = self.client.get('/api/menu-items/')['ETag']
+        cache.clear()
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A write another worker made: no cache version is bumped here
+        MenuItem.objects.filter(pk=self.pasta.pk).update(inventory=4, updated_at=timezone.now())
+        cache.clear()
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['stock'], 4)
+
+    def test_if_modified_since(self):
+        response = self.client.get(f'/api/category/{self.mains.pk}')
+        last_modified = response['Last-Modified']
+        response = self.client.get(
+            f'/api/category/{self.mains.pk}', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_generic_view_skips_the_serializer(self):
+        view = SingleMenuItemView.as_view()
+        factory = APIRequestFactory()
+        request = factory.get('/')
+        force_authenticate(request, self.user)
+        etag = view(request, pk=self.pasta.pk)['ETag']
+
+        request = factory.get('/', HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(request, self.user)
+        with mock.patch.object(SingleMenuItemView, 'retrieve') as retrieve:
+            response = view(request, pk=self.pasta.pk)
+        self.assertEqual(response.status_code, 304)
+        retrieve.assert_not_called()
+
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        for i in range(5):
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('5.25') + i,
+                                    inventory=i, category=self.mains)
+        self.item = MenuItem.objects.first()
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, view, path, params=None, headers=None, **kwargs):
+        headers = {'Authorization': f'Token {self.token.key}', **(headers or {})}
+        request = AsyncRequestFactory().get(path, params or {}, headers=headers)
+        return async_to_sync(view)(request, **kwargs)
+
+    def assertSameResponse(self, sync_response, async_response):
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        for header in ('ETag', 'Last-Modified', 'Allow', 'Vary'):
+            self.assertEqual(async_response.get(header), sync_response.get(header), header)
+
+    def test_menu_items_match_the_sync_view(self):
+        for params in ({'perpage': 3, 'ordering': '-price'}, {'cursor': '', 'perpage': 2},
+                       {'search': 'Dish 3'}, {'ordering': 'name'}):
+            cache.clear()
+            sync_response = self.client.get('/api/menu-items/', params)
+            cache.clear()
+            async_response = self.get(async_views.menu_items, '/api/menu-items/', params)
+            self.assertSameResponse(sync_response, async_response)
+
+    def test_detail_views_share_the_response_cache(self):
+        path = f'/api/menu-items/{self.item.pk}'
+        sync_response = self.client.get(path)
+        async_response = self.get(async_views.single_menu_item, path, id=self.item.pk)
+        self.assertEqual(async_response['X-Cache'], 'HIT')
+        self.assertSameResponse(sync_response, async_response)
+
+        path = f'/api/category/{self.mains.pk}'
+        async_response = self.get(async_views.category_detail, path, pk=self.mains.pk)
+        self.assertEqual(async_response['X-Cache'], 'MISS')
+        self.assertSameResponse(self.client.get(path), async_response)
+
+        async_response = self.get(async_views.single_menu_item, '/api/menu-items/0', id=0)
+        self.assertSameResponse(self.client.get('/api/menu-items/0'), async_response)
+
+    def test_if_none_match(self):
+        path = f'/api/menu-items/{self.item.pk}'
+        etag = self.get(async_views.single_menu_item, path, id=self.item.pk)['ETag']
+        response = self.get(async_views.single_menu_item, path,
+                            headers={'If-None-Match': etag}, id=self.item.pk)
+        self.assertEqual(response.status_code, 304)
+
+    def test_file_store_throttles_run_off_the_event_loop(self):
+        # async_to_sync runs the event loop in another thread, sync_to_async
+        # hands the sync code back to this one
+        threads = []
+
+        def allow_request(request, view):
+            threads.append(threading.current_thread())
+            return True
+
+        path = f'/api/menu-items/{self.item.pk}'
+        for store, off_the_loop in (('memory', False), ('file', True)):
+            threads.clear()
+            with override_settings(THROTTLE_STORE=store, THROTTLE_STORE_PATH=os.path.join(
+                    tempfile.mkdtemp(), 'throttle.sqlite3')), \
+                    mock.patch('LittleLemonDRF.throttling.GCRAThrottle.allow_request',
+                               side_effect=allow_request):
+                reset_store()
+                self.get(async_views.single_menu_item, path, id=self.item.pk)
+            self.assertTrue(threads)
+            self.assertEqual({thread is threading.current_thread() for thread in threads},
+                             {off_the_loop}, store)
+        reset_store()
+
+    def test_cache_is_used_off_the_event_loop(self):
+        # The sync methods of a shared backend would block the event loop on
+        # network I/O. The async cache API hands them back to this thread.
+        threads = []
+        backend = caches['default']
+
+        def recorded(method):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return method(*args, **kwargs)
+            return wrapper
+
+        path = f'/api/menu-items/{self.item.pk}'
+        with mock.patch.multiple(backend, **{name: recorded(getattr(backend, name))
+                                             for name in ('get', 'get_many', 'set', 'add')}):
+            # A miss and a hit, with the token looked up and then cached
+            for cache_status in ('MISS', 'HIT'):
+                response = self.get(async_views.single_menu_item, path, id=self.item.pk)
+                self.assertEqual(response['X-Cache'], cache_status)
+        self.assertTrue(threads)
+        self.assertEqual({thread is threading.current_thread() for thread in threads}, {True})
+
+    def test_other_requests_are_handed_to_the_sync_view(self):
+        factory = AsyncRequestFactory()
+        response = async_to_sync(async_views.menu_items)(factory.get('/api/menu-items/'))
+        self.assertEqual(response.status_code, 401)
+
+        request = factory.post('/api/menu-items/', {'title': 'Soup'},
+                               headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(async_to_sync(async_views.menu_items)(request).status_code, 403)
+
+        request = factory.get('/api/menu-items/', headers={'Authorization': 'Token unknown'})
+        self.assertEqual(async_to_sync(async_views.menu_items)(request).status_code, 401)
+
+
+class FastMenuItemSerializerTests(TestCase):
+    def setUp(self):
+        mains = Category.objects.create(slug='mains', title='Mains')
+        desserts = Category.objects.create(slug='desserts', title='Desserts')
+        prices = ['2.00', '9.99', '10.05', '0.01', '1234.50', '3.3', '7']
+        for i, price in enumerate(prices):
+            MenuItem.objects.create(
+                title=f'Dish {i}', price=Decimal(price), inventory=i * 3,
+                category=(mains, desserts, None)[i % 3])
+
+    def assertSameJSON(self, queryset):
+        slow = MenuItemSerializer(queryset.select_related('category'), many=True).data
+        fast = FastMenuItemSerializer(FastMenuItemSerializer.values(queryset)).data
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_same_json_as_menu_item_serializer(self):
+        self.assertSameJSON(MenuItem.objects.order_by('id'))
+        self.assertSameJSON(MenuItem.objects.filter(category__title='Mains').order_by('-price'))
+        self.assertSameJSON(MenuItem.objects.none())
+
+    def test_same_json_with_prebuilt_category_map(self):
+        categories = {c['id']: c for c in Category.objects.values('id', 'slug', 'title')}
+        queryset = MenuItem.objects.order_by('title')
+        slow = MenuItemSerializer(queryset, many=True).data
+        with self.assertNumQueries(1):
+            fast = FastMenuItemSerializer(FastMenuItemSerializer.values(queryset), categories).data
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_menu_items_endpoint_output_is_unchanged(self):
+        user = User.objects.create_user('parity')
+        client = APIClient()
+        client.force_authenticate(user)
+        cache.clear()
+        with mock.patch('LittleLemonDRF.throttling.GCRAThrottle.allow_request',
+                        return_value=True):
+            response = client.get('/api/menu-items/', {'perpage': 4, 'page': 2, 'ordering': 'id'})
+        expected = MenuItemSerializer(MenuItem.objects.order_by('id')[4:8], many=True).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+
+class FastJSONTests(TestCase):
+    data = {
+        'price': Decimal('10.05'), 'total': Decimal('1234.50'),
+        'at': timezone.make_aware(datetime(2023, 6, 1, 12, 30, 15, 123456), dt_timezone.utc),
+        'local': datetime(2023, 6, 1, 12, 30, tzinfo=dt_timezone(timedelta(hours=2))),
+        'day': date(2023, 6, 1), 'time': datetime(2023, 6, 1, 19, 30).time(), 'wait': timedelta(minutes=90),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'), 'lazy': gettext_lazy('Mains'),
+        'text': 'Crème brûlée \u2028 \u2029 "quoted"', 'histogram': {1: 2, 5: 7},
+        'items': [{'rating': 4.5, 'ok': True, 'none': None}], 'big': 2 ** 70,
+    }
+
+    def test_same_bytes_as_drf(self):
+        for accepted in (None, 'application/json', 'application/json; indent=4'):
+            self.assertEqual(FastJSONRenderer().render(self.data, accepted),
+                             JSONRenderer().render(self.data, accepted))
+        with mock.patch('LittleLemonDRF.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parser(self):
+        body = JSONRenderer().render({key: self.data[key] for key in ('price', 'text', 'items')})
+        parsed = FastJSONParser().parse(BytesIO(body))
+        self.assertEqual(parsed, JSONParser().parse(BytesIO(body)))
+        for invalid in (b'{"quantity": 2', b'{"quantity": NaN}'):
+            with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+                FastJSONParser().parse(BytesIO(invalid))
+        with mock.patch('LittleLemonDRF.renderers.orjson', None):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), parsed)
+
+
+class ManagerRoleCacheTests(APITestCase):
+    def test_role_is_resolved_without_queries_in_steady_state(self):
+        self.make_manager(self.user)
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/manager-view/').status_code, 200)
+
+    @override_settings(ROLE_CACHE_SIZE=2)
+    def test_cache_is_bounded(self):
+        users = [self.user, *(User.objects.create_user(f'guest{i}') for i in range(2))]
+        for user in users:
+            get_user_groups(user)
+        # The least recently used entry was dropped
+        with self.assertNumQueries(0):
+            get_user_groups(users[2])
+            get_user_groups(users[1])
+        with self.assertNumQueries(1):
+            get_user_groups(users[0])
+
+    def test_managers_view_invalidates_the_cache(self):
+        Group.objects.create(name="Manager")
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 403)
+
+        admin = User.objects.create_superuser('admin', password='lemon-pass-1')
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+        admin_client.post('/api/groups/manager/users', {'username': 'customer'})
+
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 200)
+        self.user.groups.clear()
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 403)
+
+    def test_only_managers_can_write_menu_items(self):
+        category = Category.objects.create(slug='mains', title='Mains')
+        item = {'title': 'Soup', 'price': '5.00', 'stock': 3, 'category_id': category.pk}
+        self.assertEqual(self.client.post('/api/menu-items/', item).status_code, 403)
+        self.make_manager(self.user)
+        self.assertEqual(self.client.post('/api/menu-items/', item).status_code, 201)
+
+
+class TokenCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_is_looked_up_once(self):
+        self.make_manager(self.user)
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/manager-view/').status_code, 200)
+
+    def test_logout_invalidates_the_token(self):
+        self.assertEqual(self.client.get('/api/secret/').status_code, 200)
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        response = self.client.get('/api/secret/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'], 'Invalid token.')
+
+    def test_deactivating_the_user_invalidates_the_token(self):
+        self.assertEqual(self.client.get('/api/secret/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/secret/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'], 'User inactive or deleted.')
+
+    def test_group_changes_reach_cached_tokens(self):
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 403)
+        self.make_manager(self.user)
+        self.assertEqual(self.client.get('/api/manager-view/').status_code, 200)
+
+    def test_revocation_in_another_process(self):
+        self.assertEqual(self.client.get('/api/secret/').status_code, 200)
+        # Another worker logs out: the row goes without signals in this
+        # process, which only sees the version it bumped in the shared cache
+        Token.objects.filter(pk=self.token.pk)._raw_delete(DEFAULT_DB_ALIAS)
+        bump_version(version_key(User, self.user.pk))
+        self.assertEqual(self.client.get('/api/secret/').status_code, 401)
+
+
+class ThrottlingTests(TestCase):
+    def check_store(self, store):
+        # 3 requests per 60 seconds: a burst of 3, then one every 20 seconds
+        hits = [store.hit('key', now, 20, 60)[0] for now in (0, 0, 0, 0, 19, 20, 21)]
+        self.assertEqual(hits, [True, True, True, False, False, True, False])
+        self.assertTrue(store.hit('other', 0, 20, 60)[0])
+
+    def test_memory_store(self):
+        self.check_store(MemoryStore())
+
+    def test_memory_store_drops_the_least_recent_keys(self):
+        store = MemoryStore(max_keys=3)
+        # 1 request per hour: every key stays throttled for the whole test
+        for now, key in enumerate(['a', 'b', 'c', 'd']):
+            self.assertTrue(store.hit(key, now, 3600, 3600)[0])
+        self.assertEqual(list(store.tats), ['b', 'c', 'd'])
+        self.assertFalse(store.hit('b', 10, 3600, 3600)[0])
+        # Over the limit, 'a' starts over
+        self.assertTrue(store.hit('a', 10, 3600, 3600)[0])
+        self.assertEqual(list(store.tats), ['c', 'd', 'a'])
+
+    def test_file_store(self):
+        directory = tempfile.mkdtemp()
+        self.check_store(FileStore(os.path.join(directory, 'throttle.sqlite3')))
+
+    @override_settings(REST_FRAMEWORK={
+        'DEFAULT_THROTTLE_RATES': {'anon': '100/minute', 'user': '100/minute',
+                                   'throttle_check': '2/minute'}})
+    def test_view_scope(self):
+        reset_store()
+        client = APIClient()
+        statuses = [client.get('/api/throttle-check').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class MenuFilterQueryPlanTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        mains = Category.objects.create(slug='mains', title='Mains')
+        for i in range(30):
+            MenuItem.objects.create(
+                title=f'Dish {i}', price=Decimal(2 + i), inventory=i, category=mains)
+
+    def query_plans(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/menu-items/', params)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for query in queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, params, sorted_by_index=True):
+        filtered = set(params) - {'ordering', 'cursor'}
+        for sql, plan in self.query_plans(params):
+            for step in plan:
+                # "SCAN table" without an index is a full table scan. Unfiltered
+                # queries may walk the table in rowid order, the LIMIT stops them.
+                if filtered and step.startswith('SCAN') and 'LittleLemonDRF_' in step:
+                    self.assertTrue('USING' in step or 'VIRTUAL TABLE' in step,
+                                    f'{params}: {step}\n{sql}')
+                if sorted_by_index:
+                    self.assertNotIn('TEMP B-TREE', step, f'{params}: {step}\n{sql}')
+
+    def test_filters_use_indexes(self):
+        self.assertUsesIndexes({'category': 'Mains'})
+        # Category titles aren't unique, so rows of several categories may need sorting
+        self.assertUsesIndexes({'category': 'Mains', 'ordering': 'price'}, sorted_by_index=False)
+        self.assertUsesIndexes({'to_price': '10'})
+        self.assertUsesIndexes({'to_price': '10', 'ordering': '-price'})
+        self.assertUsesIndexes({'search': 'ish 1'})
+        for field in ('id', 'title', 'price', 'inventory'):
+            self.assertUsesIndexes({'ordering': field})
+            self.assertUsesIndexes({'ordering': field, 'cursor': ''})
+
+    def test_search_matches_substrings_and_follows_writes(self):
+        def search(term):
+            response = self.client.get('/api/menu-items/', {'search': term, 'perpage': 50})
+            return sorted(item['title'] for item in response.data)
+
+        self.assertEqual(search('ish 2'), ['Dish 2'] + [f'Dish {i}' for i in range(20, 30)])
+        item = MenuItem.objects.get(title='Dish 2')
+        item.title = 'Lemon tart'
+        item.save()
+        self.assertEqual(search('lemon'), ['Lemon tart'])
+        item.delete()
+        self.assertEqual(search('lemon'), [])
+        # Shorter than a trigram
+        self.assertEqual(len(search('9')), 3)
+
+    def test_like_fallback_without_the_trigram_tokenizer(self):
+        # SQLite 3.9 to 3.33 can have FTS5, but not its trigram tokenizer
+        migration = importlib.import_module('LittleLemonDRF.migrations.0007_menuitem_fts')
+        with mock.patch.object(connection.Database, 'sqlite_version_info', (3, 33, 0)), \
+                mock.patch('LittleLemonDRF.search._available', None):
+            self.assertFalse(migration.fts5_supported(connection.schema_editor()))
+            self.assertFalse(fts_available())
+            response = self.client.get('/api/menu-items/', {'search': 'ish 2', 'perpage': 50})
+        self.assertEqual(len(response.data), 11)
+
+    def test_ordering_allow_list(self):
+        response = self.client.get('/api/menu-items/', {'ordering': 'category__slug'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'ordering': ["Cannot order by 'category__slug'"]})
+
+
+class CartTestCase(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('other')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('2.50') + i,
+                                    inventory=50, category=category)
+            for i in range(10)]
+        Cart.objects.create(user=self.other, menuitem=self.items[0], quantity=1,
+                            unit_price=self.items[0].price, price=self.items[0].price)
+
+    def fill_cart(self, lines):
+        for item in self.items[:lines]:
+            Cart.objects.create(user=self.user, menuitem=item, quantity=2,
+                                unit_price=item.price, price=2 * item.price)
+
+
+class CartTests(CartTestCase):
+    def test_cart_is_scoped_to_the_user_with_totals(self):
+        self.fill_cart(3)
+        response = self.client.get('/api/cart/menu-items/')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['line_count'], 3)
+        self.assertEqual(response.data['item_count'], 6)
+        self.assertEqual(response.data['total'], '21.00')
+        self.assertEqual(response.data['results'][0]['menuitem_title'], 'Dish 0')
+
+    def test_empty_cart_totals(self):
+        response = self.client.get('/api/cart/menu-items/')
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['total'], '0.00')
+
+    def test_total_over_the_column_limit_changes_nothing(self):
+        # Each line fits Cart.price, the 27000.00 total doesn't fit Order.total
+        MenuItem.objects.filter(pk__in=[item.pk for item in self.items[:3]]).update(
+            price=Decimal('90.00'), inventory=200)
+        for item in self.items[:3]:
+            Cart.objects.create(user=self.user, menuitem=item, quantity=100,
+                                unit_price=Decimal('90.00'), price=Decimal('9000.00'))
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('27000.00', response.data['message'])
+        self.assertEqual(MenuItem.objects.get(pk=self.items[0].pk).inventory, 200)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        self.fill_cart(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/cart/menu-items/')
+        Cart.objects.filter(user=self.user).delete()
+        self.fill_cart(10)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/cart/menu-items/')
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(large), 2)
+
+    def test_quantity_below_one_is_rejected(self):
+        for quantity in (0, -1, 'two'):
+            response = self.client.post('/api/cart/menu-items/',
+                                        {'menuitem_id': self.items[0].pk, 'quantity': quantity})
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_delete_only_clears_the_users_cart(self):
+        self.fill_cart(2)
+        self.client.delete('/api/cart/menu-items/')
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertTrue(Cart.objects.filter(user=self.other).exists())
+
+
+class CartBulkTests(CartTestCase):
+    url = '/api/cart/menu-items/bulk'
+
+    def test_bulk_adds_updates_and_removes_lines(self):
+        self.fill_cart(2)
+        entries = [
+            {'menuitem_id': self.items[0].pk, 'quantity': 5},
+            {'menuitem_id': self.items[1].pk, 'quantity': 0},
+            {'menuitem_id': self.items[2].pk, 'quantity': 1},
+            {'menuitem_id': self.items[3].pk, 'quantity': 1},
+            {'menuitem_id': self.items[3].pk, 'quantity': 3},
+        ]
+        response = self.client.post(self.url, entries, format='json')
+        self.assertEqual(response.status_code, 200)
+        lines = {line['menuitem']: line['quantity'] for line in response.data['results']}
+        self.assertEqual(lines, {self.items[0].pk: 5, self.items[2].pk: 1, self.items[3].pk: 3})
+        self.assertEqual(response.data['total'], '33.50')
+        self.assertEqual(Cart.objects.get(user=self.other).quantity, 1)
+
+    def test_errors_abort_the_batch_unless_partial(self):
+        entries = [
+            {'menuitem_id': self.items[0].pk, 'quantity': 2},
+            {'menuitem_id': 999999, 'quantity': 1},
+            {'menuitem_id': self.items[1].pk, 'quantity': -1},
+        ]
+        response = self.client.post(self.url, entries, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+        response = self.client.post(self.url + '?partial=true', entries, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertEqual(response.data['line_count'], 1)
+
+    def test_line_price_is_limited_to_the_column(self):
+        # Cart.price holds up to 9999.99
+        item = MenuItem.objects.create(title='Platter', price=Decimal('10.00'), inventory=5,
+                                       category=self.items[0].category)
+        entries = [{'menuitem_id': self.items[0].pk, 'quantity': 2},
+                   {'menuitem_id': item.pk, 'quantity': 1000}]
+        response = self.client.post(self.url, entries, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error['index'], list(error)[1]) for error in response.data['errors']],
+                         [(1, 'quantity')])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+        response = self.client.post(self.url + '?partial=true', entries, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['line_count'], len(response.data['errors'])), (1, 1))
+
+        entries = [{'menuitem_id': item.pk, 'quantity': 999}]
+        response = self.client.post(self.url, entries, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cart.objects.get(user=self.user, menuitem=item).price, Decimal('9990.00'))
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def post(count):
+            entries = [{'menuitem_id': item.pk, 'quantity': 2} for item in self.items[:count]]
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(self.url, entries, format='json')
+            return len(queries)
+
+        self.assertEqual(post(2), post(10))
+
+
+class OrderPlacementTests(CartTestCase):
+    def test_cart_becomes_an_order(self):
+        self.fill_cart(3)
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total'], '21.00')
+        self.assertEqual([item['menuitem_title'] for item in response.data['items']],
+                         ['Dish 0', 'Dish 1', 'Dish 2'])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(MenuItem.objects.get(pk=self.items[0].pk).inventory, 48)
+
+    def test_prices_are_snapshotted(self):
+        self.fill_cart(1)
+        self.client.post('/api/orders')
+        MenuItem.objects.filter(pk=self.items[0].pk).update(price=Decimal('99.00'))
+        self.assertEqual(OrderItem.objects.get().unit_price, Decimal('2.50'))
+
+    def test_out_of_stock_changes_nothing(self):
+        self.fill_cart(2)
+        MenuItem.objects.filter(pk=self.items[1].pk).update(inventory=1)
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['menuitems'], [self.items[1].pk])
+        self.assertEqual(MenuItem.objects.get(pk=self.items[0].pk).inventory, 50)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart(self):
+        self.assertEqual(self.client.post('/api/orders').status_code, 400)
+
+    def test_quantity_below_one_changes_nothing(self):
+        self.fill_cart(2)
+        Cart.objects.filter(user=self.user, menuitem=self.items[1]).update(quantity=-4)
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(MenuItem.objects.get(pk=self.items[0].pk).inventory, 50)
+        self.assertEqual(MenuItem.objects.get(pk=self.items[1].pk).inventory, 50)
+        self.assertFalse(Order.objects.exists())
+
+    def test_total_over_the_column_limit_changes_nothing(self):
+        # Each line fits Cart.price, the 27000.00 total doesn't fit Order.total
+        MenuItem.objects.filter(pk__in=[item.pk for item in self.items[:3]]).update(
+            price=Decimal('90.00'), inventory=200)
+        for item in self.items[:3]:
+            Cart.objects.create(user=self.user, menuitem=item, quantity=100,
+                                unit_price=Decimal('90.00'), price=Decimal('9000.00'))
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('27000.00', response.data['message'])
+        self.assertEqual(MenuItem.objects.get(pk=self.items[0].pk).inventory, 200)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        def checkout(lines):
+            Cart.objects.filter(user=self.user).delete()
+            self.fill_cart(lines)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.post('/api/orders').status_code, 201)
+            return len(queries)
+
+        self.assertEqual(checkout(1), checkout(10))
+
+
+class SQLiteProfileTests(TestCase):
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal', 'synchronous': 'normal',
+                                       'busy_timeout': 1234, 'cache_size': -2048})
+    def test_pragmas_are_applied_to_new_connections(self):
+        path = os.path.join(tempfile.mkdtemp(), 'profile.sqlite3')
+        wrapper = type(connections['default'])({**connection.settings_dict, 'NAME': path}, 'profile')
+        self.addCleanup(wrapper.close)
+        values = []
+        with wrapper.cursor() as cursor:
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                values.append(cursor.fetchone()[0])
+        # synchronous=NORMAL reads back as 1
+        self.assertEqual(values, ['wal', 1, 1234, -2048])
+
+
+@override_settings(QUERY_STATS=True, QUERY_BUDGET_WARNINGS=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    # A second SQLite file stands in for a replica. sync_replica() is the
+    # replication: a full copy of the primary, committed rows only.
+    def setUp(self):
+        reset_store()
+        cache.clear()
+        invalidate_user_groups()
+        invalidate_cached_tokens()
+        reset_query_stats()
+        patcher = mock.patch(
+            'LittleLemonDRF.throttling.GCRAThrottle.allow_request', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.replica_path = os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')
+        connections.settings['replica'] = {**connection.settings_dict, 'NAME': self.replica_path}
+        self.addCleanup(self.remove_replica)
+        replicas = override_settings(DATABASE_REPLICAS=['replica'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+        self.user = User.objects.create_user('customer')
+        self.client = self.token_client(self.user)
+        self.category = Category.objects.create(slug='mains', title='Mains')
+        self.sync_replica()
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def sync_replica(self):
+        connections['replica'].close()
+        source = sqlite3.connect(connection.settings_dict['NAME'])
+        target = sqlite3.connect(self.replica_path)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+
+    def token_client(self, user):
+        # Created on the primary only: authentication must not read from the replica
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+
+    def test_read_endpoints_use_the_replica(self):
+        MenuItem.objects.create(title='Pasta', price=Decimal('9.50'), inventory=5,
+                                category=self.category)
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual((response.status_code, response.data), (200, []))
+        self.assertGreater(query_stats().get('replica', 0), 0)
+
+        # Not cached: the replica lagged behind the version it was read with
+        self.sync_replica()
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual([item['title'] for item in response.data], ['Pasta'])
+        response = self.client.get(f'/api/category/{self.category.pk}')
+        self.assertEqual(response.status_code, 200)
+
+        # Not a replica endpoint
+        reset_query_stats()
+        self.client.get('/api/cart/menu-items/')
+        self.assertNotIn('replica', query_stats())
+
+    def test_replica_lists_send_no_validators(self):
+        MenuItem.objects.create(title='Pasta', price=Decimal('9.50'), inventory=5,
+                                category=self.category)
+        stale = self.client.get('/api/menu-items/')
+        self.assertEqual(stale.data, [])
+        # The versions already include Pasta, the body doesn't
+        self.assertFalse(stale.has_header('ETag'))
+        self.assertFalse(stale.has_header('Last-Modified'))
+
+        self.sync_replica()
+        response = self.client.get('/api/menu-items/',
+                                   HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['title'] for item in response.data], ['Pasta'])
+
+    def test_replicas_warn_about_a_per_process_cache(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['LittleLemonDRF.W001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                              'LOCATION': 'cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_clients_read_their_writes_from_the_primary(self):
+        pasta = MenuItem.objects.create(title='Pasta', price=Decimal('9.50'), inventory=5,
+                                        category=self.category)
+        self.sync_replica()
+
+        response = self.client.post('/api/ratings', {'menuitem': pasta.pk, 'rating_value': 4})
+        self.assertEqual(response.status_code, 201)
+        # The client that wrote reads the primary for a while, the others the replica
+        self.assertEqual(self.client.get('/api/ratings').data['count'], 1)
+        other = self.token_client(User.objects.create_user('other'))
+        self.assertEqual(other.get('/api/ratings').data['count'], 0)
+
+        # Once REPLICA_STICKY_SECONDS are over
+        cache.clear()
+        self.assertEqual(self.client.get('/api/ratings').data['count'], 0)
+
+
+@override_settings(REQUEST_PROFILING=True)
+class RequestProfilingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_request_stats()
+        category = Category.objects.create(slug='mains', title='Mains')
+        for title in ('Pasta', 'Soup'):
+            MenuItem.objects.create(title=title, price=Decimal('5.00'), inventory=5,
+                                    category=category)
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/menu-items/')
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+
+    def test_sync_view_queries_are_counted_under_asgi(self):
+        # The sync view runs in a sync_to_async thread, not the one of the middleware
+        client = AsyncClient()
+        path = f'/api/booking/availability?date={date.today() + timedelta(days=1)}'
+
+        async def asgi_get():
+            return await client.get(path)
+
+        wsgi_timing = self.client.get(path)['Server-Timing']
+        asgi_timing = async_to_sync(asgi_get)()['Server-Timing']
+        queries = wsgi_timing.split(',')[0].split(';')[2]
+        self.assertEqual(queries, 'desc="1 queries"')
+        self.assertEqual(asgi_timing.split(',')[0].split(';')[2], queries)
+
+    def test_stats_per_route(self):
+        for perpage in range(1, 4):
+            # Different pages, none of them a cache hit without queries
+            self.client.get('/api/menu-items/', {'perpage': perpage})
+        self.client.get(f'/api/category/{Category.objects.get().pk}')
+        response = self.client.get('/api/request-stats')
+        self.assertEqual(response.status_code, 403)
+
+        self.make_manager(self.user)
+        stats = self.client.get('/api/request-stats').data['routes']
+        self.assertEqual(stats['GET /api/menu-items/']['count'], 3)
+        self.assertEqual(stats['GET /api/category/<int:pk>']['count'], 1)
+        self.assertEqual(set(stats['GET /api/menu-items/']['total_ms']), {'p50', 'p95', 'p99'})
+        self.assertGreater(stats['GET /api/menu-items/']['queries']['p50'], 0)
+
+    def test_off_by_default(self):
+        with override_settings(REQUEST_PROFILING=False):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            self.assertNotIn('Server-Timing', client.get('/api/menu-items/'))
+
+
+class QueryBudgetTests(APITestMixin, TransactionTestCase):
+    # Each endpoint is called at every size, with the data grown in between. Not
+    # in a test transaction, where atomic() blocks would run savepoints instead
+    # of BEGIN: the queries are counted as in production.
+    SIZES = (1, 10, 40)
+
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user('boss')
+        self.make_manager(self.manager)
+        self.crew = User.objects.create_user('crew')
+        Group.objects.create(name='Delivery crew').user_set.add(self.crew)
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.tokens = {user: Token.objects.create(user=user).key
+                       for user in (self.user, self.manager, self.crew, self.admin)}
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.guests = []
+        # Checked once per process, on the first rating write
+        triggers_available()
+
+    def grow(self, size):
+        """About ``size`` menu items, ratings, cart lines, orders and bookings, each with
+        ``size`` related rows, plus a menu item to delete that has as many."""
+        self.guests += [User.objects.create_user(f'guest{i}')
+                        for i in range(len(self.guests), size)]
+        User.objects.create_user(f'promoted{size}')
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f'Dish {size}-{i}', price=Decimal('5.00'), inventory=30000,
+                     category=self.mains) for i in range(size)])
+        # bulk_create() sends no signals, the search index is filled here
+        rebuild_search_index()
+        self.items = list(MenuItem.objects.order_by('id'))
+        self.victim = MenuItem.objects.create(title=f'Victim {size}', price=Decimal('5.00'),
+                                              inventory=30000, category=self.mains)
+        for item in (self.items[0], self.victim):
+            Rating.objects.bulk_create([Rating(user=guest, menuitem=item, rating_value=i % 6)
+                                        for i, guest in enumerate(self.guests)],
+                                       ignore_conflicts=True)
+        Cart.objects.bulk_create([
+            Cart(user=guest, menuitem=self.victim, quantity=1, unit_price=5, price=5)
+            for guest in self.guests])
+        Cart.objects.filter(user=self.user).delete()
+        Cart.objects.bulk_create([
+            Cart(user=self.user, menuitem=item, quantity=1, unit_price=5, price=5)
+            for item in self.items[:size]])
+        orders = Order.objects.bulk_create([
+            Order(user=self.user, delivery_crew=self.crew, total=5, date=date.today())
+            for _ in range(size)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=1, unit_price=5, price=5)
+            for order in orders for item in [*self.items[:size - 1], self.victim]])
+        self.order = orders[0]
+        day = date.today() + timedelta(days=1)
+        Booking.objects.bulk_create([
+            Booking(user=self.user, name='Party of two', no_of_guests=2,
+                    slot=BookingSlot.objects.create(date=day + timedelta(days=size), time=time,
+                                                    capacity=40, booked=2))
+            for time in slot_times()[:size]])
+
+    def endpoints(self, size):
+        # (method, path, user, data), in an order where the writes don't get in the way
+        item, day = self.items[0], (date.today() + timedelta(days=2 + size)).isoformat()
+        menu_item = {'title': f'New dish {size}', 'price': '7.50', 'stock': 30000,
+                     'category_id': self.mains.pk}
+        return [
+            # The public endpoints as a signed-in client, authentication included
+            ('GET', '/', self.user, None),
+            ('GET', '/api/menu-items/?perpage=10', self.user, None),
+            ('GET', '/api/menu-items/?perpage=10&cursor=&ordering=-price', self.user, None),
+            ('GET', '/api/menu-items/?perpage=10&search=Dish&category=Mains', self.user, None),
+            ('POST', '/api/menu-items/', self.manager, menu_item),
+            ('POST', '/api/menu-items/import', self.manager,
+             [{**menu_item, 'title': f'Imported {size}-{i}'} for i in range(size)]),
+            ('GET', f'/api/menu-items/{item.pk}', self.user, None),
+            ('PUT', f'/api/menu-items/{item.pk}', self.manager, {**menu_item, 'title': item.title}),
+            ('PATCH', f'/api/menu-items/{item.pk}', self.manager, {**menu_item, 'title': item.title}),
+            ('DELETE', f'/api/menu-items/{self.victim.pk}', self.manager, None),
+            ('GET', f'/api/category/{self.mains.pk}', self.user, None),
+            ('GET', '/api/cart/menu-items/', self.user, None),
+            ('POST', '/api/cart/menu-items/', self.user,
+             {'menuitem_id': item.pk, 'menuitem': item.pk, 'quantity': 2}),
+            ('POST', '/api/cart/menu-items/bulk', self.user,
+             [{'menuitem_id': other.pk, 'quantity': 3} for other in self.items[:size]]),
+            ('POST', '/api/orders', self.user, None),
+            ('DELETE', '/api/cart/menu-items/', self.user, None),
+            ('GET', '/api/orders', self.user, None),
+            ('GET', '/api/orders', self.manager, None),
+            ('GET', '/api/orders', self.crew, None),
+            ('GET', f'/api/orders/{self.order.pk}', self.user, None),
+            ('GET', '/api/ratings', self.user, None),
+            ('POST', '/api/ratings', self.user, {'menuitem': item.pk, 'rating_value': size % 6}),
+            ('GET', '/api/ratings/summary', self.user, None),
+            ('GET', '/api/booking/', self.user, None),
+            ('GET', '/api/booking/', self.manager, None),
+            ('POST', '/api/booking/', self.user,
+             {'name': 'Party of four', 'no_of_guests': 4, 'date': day, 'time': '19:00'}),
+            ('GET', f'/api/booking/availability?date={day}', self.user, None),
+            ('GET', '/api/secret/', self.user, None),
+            ('POST', '/api/api-token-auth', None, {'username': 'customer', 'password': 'lemon-pass-1'}),
+            ('GET', '/api/manager-view/', self.manager, None),
+            ('GET', '/api/throttle-check', self.user, None),
+            ('POST', '/api/groups/manager/users', self.admin, {'username': f'promoted{size}'}),
+            ('GET', '/api/cache-stats', self.admin, None),
+            ('GET', '/api/db-stats', self.admin, None),
+            ('GET', '/api/request-stats', self.manager, None),
+            ('GET', '/api/export/menu-items', self.admin, None),
+            ('GET', '/api/export/orders', self.admin, None),
+        ]
+
+    def count_queries(self, method, path, user, data):
+        # Nothing cached: the token, the groups and the responses are all loaded
+        cache.clear()
+        invalidate_user_groups()
+        invalidate_cached_tokens()
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[user]}')
+        # Counted as QueryBudgetMiddleware does, without the COMMITs the query log has
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = client.generic(method, path, json.dumps(data) if data is not None else '',
+                                      content_type='application/json')
+        return response, counter.queries
+
+    def test_endpoints_stay_within_their_budget(self):
+        counts = defaultdict(list)
+        for size in self.SIZES:
+            self.grow(size)
+            for index, (method, path, user, data) in enumerate(self.endpoints(size)):
+                response, queries = self.count_queries(method, path, user, data)
+                endpoint = f'{method} {path} as {user}'
+                self.assertLess(response.status_code, 300,
+                                f'{endpoint}: {getattr(response, "data", None)}')
+                budget = get_query_budget(resolve(path.partition('?')[0]).func, method)
+                self.assertIsNotNone(budget, f'{endpoint} has no query budget')
+                self.assertLessEqual(queries, budget, f'{endpoint} with {size} rows')
+                counts[index].append((endpoint, queries))
+        for values in counts.values():
+            self.assertEqual(len({queries for _, queries in values}), 1,
+                             f'Queries grow with the data: {values}')
+
+    def test_warning_over_budget(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[self.user]}')
+        with override_settings(QUERY_BUDGET_WARNINGS=True), \
+                mock.patch.object(views.secret, 'query_budget', (0, {})), \
+                self.assertLogs('LittleLemonDRF.budgets', 'WARNING') as logs:
+            client.get('/api/secret/')
+        self.assertIn('GET /api/secret/ ran 2 queries, over its budget of 0', logs.output[0])
+
+        # Under ASGI the sync view runs in another thread, its queries count too
+        cache.clear()
+        invalidate_user_groups()
+        invalidate_cached_tokens()
+
+        async def asgi_get():
+            return await AsyncClient().get(
+                '/api/secret/', headers={'authorization': f'Token {self.tokens[self.user]}'})
+
+        with override_settings(QUERY_BUDGET_WARNINGS=True), \
+                mock.patch.object(views.secret, 'query_budget', (0, {})), \
+                self.assertLogs('LittleLemonDRF.budgets', 'WARNING') as logs:
+            async_to_sync(asgi_get)()
+        self.assertIn('GET /api/secret/ ran 2 queries, over its budget of 0', logs.output[0])
+
+        # The middleware is left out with the setting off
+        with override_settings(QUERY_BUDGET_WARNINGS=False), \
+                mock.patch.object(views.secret, 'query_budget', (0, {})), \
+                self.assertNoLogs('LittleLemonDRF.budgets'):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[self.user]}')
+            client.get('/api/secret/')
+
+
+class RequestCaptureTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(tempfile.mkdtemp(), 'capture.ndjson')
+        self.item = MenuItem.objects.create(
+            title='Pasta', price=Decimal('9.50'), inventory=5,
+            category=Category.objects.create(slug='mains', title='Mains'))
+
+    def read_capture(self):
+        with open(self.path) as capture:
+            return [json.loads(line) for line in capture]
+
+    def test_requests_are_captured_sanitized_in_batches(self):
+        token = Token.objects.create(user=self.user)
+        with override_settings(REQUEST_CAPTURE_PATH=self.path, REQUEST_CAPTURE_BATCH=2):
+            client = APIClient()
+            client.post('/api/api-token-auth',
+                        {'username': 'customer', 'password': 'lemon-pass-1'}, format='json')
+            # Buffered until the batch is full
+            self.assertFalse(os.path.exists(self.path))
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            client.get('/api/menu-items/?perpage=10&search=Pasta')
+
+        login, menu = self.read_capture()
+        self.assertEqual(
+            {key: login[key] for key in ('method', 'path', 'route', 'body', 'role', 'status')},
+            {'method': 'POST', 'path': '/api/api-token-auth', 'route': 'api/api-token-auth',
+             'body': {'username': '<redacted>', 'password': '<redacted>'},
+             'role': 'anonymous', 'status': 200})
+        self.assertEqual((menu['query'], menu['body'], menu['role'], menu['queries']),
+                         ({'perpage': '10', 'search': 'Pasta'}, None, 'customer', 8))
+        self.assertGreater(menu['at'], login['at'])
+        self.assertGreater(menu['ms'], 0)
+
+    def test_invalid_content_length_is_no_body(self):
+        with override_settings(REQUEST_CAPTURE_PATH=self.path, REQUEST_CAPTURE_BATCH=1):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            response = client.get('/api/menu-items/', CONTENT_LENGTH='12 bytes')
+        self.assertEqual(response.status_code, 200)
+        record, = self.read_capture()
+        self.assertEqual((record['body'], record['status']), (None, 200))
+        self.assertNotIn('body_bytes', record)
+
+    def test_replay(self):
+        records = [
+            {'at': 100.0, 'method': 'GET', 'path': '/api/menu-items/', 'route': 'api/menu-items/',
+             'query': {'perpage': '10'}, 'body': None, 'role': 'anonymous', 'status': 401,
+             'ms': 3.0, 'queries': 0},
+            {'at': 100.5, 'method': 'POST', 'path': '/api/cart/menu-items/',
+             'route': 'api/cart/menu-items/', 'query': {},
+             'body': {'menuitem_id': self.item.pk, 'menuitem': self.item.pk, 'quantity': 2},
+             'role': 'customer', 'status': 201, 'ms': 5.0, 'queries': 6},
+        ]
+        with open(self.path, 'w') as capture:
+            capture.writelines(json.dumps(record) + '\n' for record in records)
+
+        out = StringIO()
+        call_command('replay_requests', self.path, '--speed', '0', stdout=out)
+        self.assertIn('Replayed 2 requests', out.getvalue())
+        self.assertIn('0 with another status than captured', out.getvalue())
+        cart = Cart.objects.get(user__username='replay-customer')
+        self.assertEqual((cart.menuitem, cart.quantity), (self.item, 2))
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_parallel_checkouts_never_oversell(self):
+        stock, buyers = 5, 20
+        item = MenuItem.objects.create(
+            title='Last lemon tarts', price=Decimal('4.00'), inventory=stock,
+            category=Category.objects.create(slug='desserts', title='Desserts'))
+        users = [User.objects.create_user(f'buyer{i}') for i in range(buyers)]
+        for user in users:
+            Cart.objects.create(user=user, menuitem=item, quantity=1,
+                                unit_price=item.price, price=item.price)
+
+        statuses = []
+        barrier = threading.Barrier(buyers)
+
+        def checkout(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                statuses.append(client.post('/api/orders').status_code)
+            finally:
+                connection.close()
+
+        with mock.patch('LittleLemonDRF.throttling.GCRAThrottle.allow_request',
+                        return_value=True):
+            threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(statuses), [201] * stock + [409] * (buyers - stock))
+        self.assertEqual(MenuItem.objects.get(pk=item.pk).inventory, 0)
+        self.assertEqual(OrderItem.objects.count(), stock)
+
+
+class OrderListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.crew = User.objects.create_user('crew')
+        Group.objects.create(name='Delivery crew').user_set.add(self.crew)
+        self.manager = User.objects.create_user('manager')
+        self.make_manager(self.manager)
+        other = User.objects.create_user('other')
+
+        category = Category.objects.create(slug='mains', title='Mains')
+        menu = [MenuItem.objects.create(title=f'Dish {i}', price=Decimal('3.00'),
+                                        inventory=10, category=category) for i in range(3)]
+        today = date.today()
+        for i in range(12):
+            order = Order.objects.create(
+                user=self.user if i % 2 else other, delivery_crew=self.crew if i % 3 == 0 else None,
+                status=i % 4 == 0, total=Decimal('6.00'), date=today - timedelta(days=i // 3))
+            for item in menu[:1 + i % 3]:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=2,
+                                         unit_price=item.price, price=2 * item.price)
+
+    def list_ids(self, user, **params):
+        self.client.force_authenticate(user)
+        ids, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get('/api/orders', {**params, 'cursor': cursor, 'perpage': 5})
+            self.assertEqual(response.status_code, 200)
+            ids += [order['id'] for order in response.data['results']]
+            cursor = response.data['next']
+        return ids
+
+    def test_orders_are_scoped_by_role(self):
+        newest_first = Order.objects.order_by('-date', '-id')
+        self.assertEqual(self.list_ids(self.manager), [o.id for o in newest_first])
+        self.assertEqual(self.list_ids(self.crew),
+                         [o.id for o in newest_first.filter(delivery_crew=self.crew)])
+        self.assertEqual(self.list_ids(self.user),
+                         [o.id for o in newest_first.filter(user=self.user)])
+
+    def test_filters(self):
+        self.assertEqual(self.list_ids(self.manager, status=1),
+                         [o.id for o in Order.objects.filter(status=True).order_by('-date', '-id')])
+        day = date.today() - timedelta(days=1)
+        self.assertEqual(self.list_ids(self.manager, date=day.isoformat()),
+                         [o.id for o in Order.objects.filter(date=day).order_by('-id')])
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/orders', {'date': 'today'}).status_code, 400)
+
+    def test_query_count_is_constant_per_page(self):
+        self.client.force_authenticate(self.manager)
+        # Role lookup on the first request only
+        self.client.get('/api/orders')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders', {'perpage': 2})
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders', {'perpage': 12})
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(response.data['results'][0]['items'][0]['menuitem_title'], 'Dish 0')
+
+    def test_detail_is_scoped(self):
+        other_order = Order.objects.exclude(user=self.user).first()
+        own_order = Order.objects.filter(user=self.user).first()
+        self.assertEqual(self.client.get(f'/api/orders/{own_order.pk}').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/orders/{other_order.pk}').status_code, 404)
+
+
+class MenuImportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_manager(self.user)
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.soup = MenuItem.objects.create(
+            title='Soup', price=Decimal('4.00'), inventory=3, category=self.mains)
+
+    def test_csv_creates_and_updates(self):
+        # A cached detail response has to be invalidated by the import
+        self.client.get(f'/api/menu-items/{self.soup.pk}')
+        body = ('title,price,stock,category_id\r\n'
+                f'Pasta,9.50,10,{self.mains.pk}\r\n'
+                f'"Soup, tomato",5.00,2,{self.mains.pk}\r\n'
+                f'Soup,4.50,8,{self.mains.pk}\r\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/menu-items/import', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'created': 2, 'updated': 1, 'errors': []})
+
+        response = self.client.get(f'/api/menu-items/{self.soup.pk}')
+        self.assertEqual((response.data['price'], response.data['stock']), ('4.50', 8))
+        response = self.client.get('/api/menu-items/', {'search': 'tomato'})
+        self.assertEqual([item['title'] for item in response.data], ['Soup, tomato'])
+
+    def test_errors_roll_back_unless_partial(self):
+        rows = [{'title': 'Pasta', 'price': '9.50', 'stock': 1, 'category_id': self.mains.pk},
+                {'title': 'Cake', 'price': '1.00', 'stock': 1, 'category_id': self.mains.pk},
+                {'title': 'Tea', 'price': '3.00', 'stock': 1, 'category_id': 0}]
+        response = self.client.post('/api/menu-items/import', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error['index'], list(error)[1]) for error in response.data['errors']],
+                         [(1, 'price'), (2, 'category_id')])
+        self.assertFalse(MenuItem.objects.filter(title='Pasta').exists())
+
+        response = self.client.post('/api/menu-items/import?partial=true', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], len(response.data['errors'])), (1, 2))
+        self.assertTrue(MenuItem.objects.filter(title='Pasta').exists())
+
+    def test_ndjson_file_upload(self):
+        upload = SimpleUploadedFile('menu.ndjson', (
+            f'{{"title": "Pasta", "price": 9.5, "stock": 1, "category_id": {self.mains.pk}}}\n'
+            '\n'
+            f'{{"title": "Cake", "price": 3, "stock": 2, "category_id": {self.mains.pk}}}\n'
+        ).encode())
+        response = self.client.post('/api/menu-items/import', {'file': upload})
+        self.assertEqual(response.data, {'created': 2, 'updated': 0, 'errors': []})
+
+        response = self.client.post('/api/menu-items/import', 'x', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_uploads_it_cannot_read(self):
+        # A chunked body comes without a Content-Length, the test client sends none for ''
+        response = self.client.post('/api/menu-items/import', '', content_type='text/csv')
+        self.assertEqual(response.status_code, 411)
+
+        body = f'title,price,stock,category_id\r\nCr\xe8me,4.00,1,{self.mains.pk}\r\n'
+        response = self.client.post('/api/menu-items/import', body.encode('latin-1'),
+                                    content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'message': 'The upload is not UTF-8 text'})
+        self.assertFalse(MenuItem.objects.filter(title__startswith='Cr').exists())
+
+    def test_queries_per_batch_do_not_depend_on_the_rows(self):
+        def count_queries(rows):
+            data = [{'title': f'Dish {rows}-{i}', 'price': '3.00', 'stock': 1,
+                     'category_id': self.mains.pk} for i in range(rows)]
+            with CaptureQueriesContext(connection) as queries:
+                import_menu_items(data)
+            return len(queries)
+
+        # SQLite takes at most 999 params per query, bulk_create() splits at 199 rows
+        self.assertEqual(count_queries(10), count_queries(150))
+
+    def test_json_array_split_anywhere(self):
+        text = '[ {"a": 1, "b": [1, 2]}, {"c": "]"} ,12.5 ]'
+        for size in (1, 2, 7, len(text)):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(list(iter_json_array(chunks)),
+                             [{'a': 1, 'b': [1, 2]}, {'c': ']'}, Decimal('12.5')])
+        for text in ('{"a": 1}', '[{"a": 1}', '[{"a": 1}] []'):
+            with self.assertRaises(ImportFormatError):
+                list(iter_json_array([text]))
+
+    def test_only_managers(self):
+        self.client.force_authenticate(User.objects.create_user('guest'))
+        response = self.client.post('/api/menu-items/import', [], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        category = Category.objects.create(slug='mains', title='Mains')
+        for i in range(5):
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('3.10') + i,
+                                    inventory=i, category=category)
+        for i in range(3):
+            order = Order.objects.create(user=self.user, total=Decimal('6.20'), date=date.today())
+            OrderItem.objects.create(order=order, menuitem=MenuItem.objects.first(), quantity=2,
+                                     unit_price=Decimal('3.10'), price=Decimal('6.20'))
+
+    def as_json(self, data):
+        return json.loads(JSONRenderer().render(data))
+
+    def test_menu_items_have_the_serializer_layout(self):
+        expected = self.as_json(
+            MenuItemSerializer(MenuItem.objects.order_by('id'), many=True).data)
+        response = self.client.get('/api/export/menu-items')
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), expected)
+        # The same rows over several chunks
+        body = b''.join(stream_json(menu_item_chunks(chunk_size=2)))
+        self.assertEqual(json.loads(body), expected)
+
+    def test_orders_as_ndjson(self):
+        expected = self.as_json(OrderSerializer(order_queryset().order_by('id'), many=True).data)
+        response = self.client.get('/api/export/orders', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+        lines = b''.join(stream_ndjson(order_chunks(chunk_size=2))).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_empty_export_and_permissions(self):
+        Order.objects.all().delete()
+        self.assertEqual(b''.join(self.client.get('/api/export/orders').streaming_content), b'[]')
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/export/orders').status_code, 403)
+
+
+@tag('slow')
+class ExportMemoryTests(APITestCase):
+    ROWS = 1000000
+    # Well below the ~1 GB a materialized list of a million serialized items takes
+    MAX_GROWTH = 50 * 2 ** 20
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        category = Category.objects.create(slug='mains', title='Mains')
+        # A recursive CTE inserts the rows in one statement, bulk_create takes minutes
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{MenuItem._meta.db_table}" '
+                '(title, price, inventory, category_id, updated_at) '
+                'WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %s) '
+                "SELECT 'Item ' || i, 5.5, i %% 100, %s, %s FROM seq",
+                [self.ROWS, category.pk, timezone.now()])
+
+    def rss(self):
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def test_peak_rss_stays_flat(self):
+        if not os.path.exists('/proc/self/statm'):
+            self.skipTest('Needs /proc to read the RSS')
+        response = self.client.get('/api/export/menu-items', {'format': 'ndjson'})
+        baseline = peak = self.rss()
+        lines = 0
+        for part in response.streaming_content:
+            lines += part.count(b'\n')
+            peak = max(peak, self.rss())
+        self.assertEqual(lines, self.ROWS)
+        self.assertLess(peak - baseline, self.MAX_GROWTH)
+
+
+class RatingAggregateTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        mains = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(
+            title='Pasta', price=Decimal('9.50'), inventory=5, category=mains)
+        self.soup = MenuItem.objects.create(
+            title='Soup', price=Decimal('4.00'), inventory=5, category=mains)
+        self.users = [User.objects.create_user(f'guest{i}') for i in range(3)]
+
+    def rate(self, user, item, value):
+        return Rating.objects.create(user=user, menuitem=item, rating_value=value)
+
+    def summary(self, item):
+        summary = MenuItemRating.objects.get(menuitem=item)
+        return summary.count, summary.total, summary.histogram
+
+    def test_kept_up_to_date_on_create_update_delete(self):
+        first = self.rate(self.users[0], self.pasta, 5)
+        self.rate(self.users[1], self.pasta, 3)
+        self.assertEqual(self.summary(self.pasta), (2, 8, [0, 0, 0, 1, 0, 1]))
+
+        first.rating_value = 4
+        first.save()
+        self.assertEqual(self.summary(self.pasta), (2, 7, [0, 0, 0, 1, 1, 0]))
+
+        # Moving a rating to another item
+        first.menuitem_id = self.soup.pk
+        first.save()
+        self.assertEqual(self.summary(self.pasta), (1, 3, [0, 0, 0, 1, 0, 0]))
+        self.assertEqual(self.summary(self.soup), (1, 4, [0, 0, 0, 0, 1, 0]))
+
+        first.delete()
+        self.assertEqual(self.summary(self.soup), (0, 0, [0] * 6))
+        # Deleting the menu item deletes its ratings
+        self.rate(self.users[1], self.soup, 2)
+        self.soup.delete()
+        self.assertFalse(Rating.objects.filter(menuitem_id=self.soup.pk).exists())
+        self.assertEqual(MenuItemRating.objects.count(), 1)
+
+    def test_update_does_not_read_the_rating_back(self):
+        rating = self.rate(self.users[0], self.pasta, 5)
+        self.client.get(f'/api/menu-items/{self.pasta.pk}')
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.menuitem = self.soup
+        triggers_available()
+        with CaptureQueriesContext(connection) as queries:
+            rating.save()
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['UPDATE'])
+        # The item the rating moved away from is invalidated too
+        response = self.client.get(f'/api/menu-items/{self.pasta.pk}')
+        self.assertEqual((response['X-Cache'], response.data['rating']['count']), ('MISS', 0))
+
+    def test_menu_item_output(self):
+        self.rate(self.users[0], self.pasta, 5)
+        self.rate(self.users[1], self.pasta, 2)
+        expected = {'count': 2, 'average': 3.5,
+                    'histogram': {'0': 0, '1': 0, '2': 1, '3': 0, '4': 0, '5': 1}}
+
+        response = self.client.get(f'/api/menu-items/{self.pasta.pk}')
+        self.assertEqual(response.data['rating'], expected)
+        response = self.client.get('/api/menu-items/', {'perpage': 5})
+        self.assertEqual([item['rating']['average'] for item in response.data], [3.5, None])
+
+        # A new rating invalidates the cached responses
+        self.rate(self.users[2], self.pasta, 5)
+        response = self.client.get(f'/api/menu-items/{self.pasta.pk}')
+        self.assertEqual(response.data['rating']['count'], 3)
+
+        items = MenuItem.objects.order_by('id')
+        with self.assertNumQueries(1):
+            data = MenuItemSerializer(
+                items.select_related('category', 'rating_summary'), many=True).data
+        self.assertEqual(FastMenuItemSerializer(FastMenuItemSerializer.values(items)).data, data)
+
+    def test_rebuild_command_and_summary_view(self):
+        self.rate(self.users[0], self.pasta, 5)
+        # bulk_create() doesn't send the signals, the triggers still count the ratings
+        Rating.objects.bulk_create([
+            Rating(user=user, menuitem=self.soup, rating_value=value)
+            for user, value in zip(self.users, [1, 2, 2])])
+        self.assertEqual(self.summary(self.soup), (3, 5, [0, 1, 2, 0, 0, 0]))
+
+        MenuItemRating.objects.update(count=0, total=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(self.summary(self.pasta), (1, 5, [0, 0, 0, 0, 0, 1]))
+        self.assertEqual(self.summary(self.soup), (3, 5, [0, 1, 2, 0, 0, 0]))
+
+        response = self.client.get('/api/ratings/summary')
+        self.assertEqual([(row['menuitem'], row['average']) for row in response.data['results']],
+                         [(self.pasta.pk, 5.0), (self.soup.pk, 1.67)])
+
+    def test_upsert_is_one_statement(self):
+        upsert_rating(self.users[0], self.pasta.pk, 5)
+        with self.assertNumQueries(1):
+            upsert_rating(self.users[0], self.pasta.pk, 2)
+        self.assertEqual(Rating.objects.get().rating_value, 2)
+        self.assertEqual(self.summary(self.pasta), (1, 2, [0, 0, 1, 0, 0, 0]))
+
+    def test_ratings_endpoint(self):
+        self.client.force_authenticate(self.users[0])
+        for value in (4, 1):
+            response = self.client.post('/api/ratings',
+                                        {'menuitem': self.pasta.pk, 'rating_value': value})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data, {'user': self.users[0].pk, 'menuitem': self.pasta.pk,
+                                             'rating_value': value})
+        response = self.client.post('/api/ratings', {'menuitem': self.pasta.pk, 'rating_value': 6})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/ratings')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(self.summary(self.pasta), (1, 1, [0, 1, 0, 0, 0, 0]))
+
+
+class RatingForeignKeyTests(TransactionTestCase):
+    # The foreign key is deferred, a TestCase transaction would never check it
+    def test_unknown_menu_item(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('guest'))
+        response = client.post('/api/ratings', {'menuitem': 404, 'rating_value': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Rating.objects.exists())
+        self.assertFalse(MenuItemRating.objects.exists())
+
+
+@override_settings(BOOKING_OPENING_TIME='18:00', BOOKING_CLOSING_TIME='20:00',
+                   BOOKING_SLOT_MINUTES=30, BOOKING_SLOT_CAPACITY=10)
+class BookingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() + timedelta(days=7)
+
+    def book(self, guests, time='18:30', day=None, client=None):
+        return (client or self.client).post('/api/booking/', {
+            'name': 'Table for friends', 'no_of_guests': guests,
+            'date': day or self.day, 'time': time})
+
+    def availability(self, guests):
+        response = self.client.get('/api/booking/availability',
+                                   {'date': self.day, 'guests': guests})
+        self.assertEqual(response.status_code, 200)
+        return [(slot['time'], slot['available']) for slot in response.data['slots']]
+
+    def test_booking_takes_seats(self):
+        self.assertEqual(self.availability(2),
+                         [('18:00', 10), ('18:30', 10), ('19:00', 10), ('19:30', 10)])
+        response = self.book(6)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['date'], response.data['time']), (str(self.day), '18:30'))
+        self.assertEqual(self.book(4).status_code, 201)
+
+        self.assertEqual(self.availability(2), [('18:00', 10), ('19:00', 10), ('19:30', 10)])
+        self.assertEqual(self.book(2).status_code, 409)
+        self.assertEqual(BookingSlot.objects.get().booked, 10)
+
+        # A cancelled booking gives its seats back
+        Booking.objects.get(no_of_guests=4).delete()
+        self.assertIn(('18:30', 4), self.availability(4))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.book(2, time='18:10').status_code, 400)
+        self.assertEqual(self.book(2, time='20:00').status_code, 400)
+        self.assertEqual(self.book(2, day=timezone.localdate() - timedelta(days=1)).status_code, 400)
+        self.assertEqual(self.book(7).status_code, 400)
+        response = self.client.get('/api/booking/availability', {'date': 'tomorrow'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BookingSlot.objects.exists())
+
+    def test_availability_reads_the_slots_only(self):
+        for _ in range(3):
+            self.book(2, time='19:00')
+        with self.assertNumQueries(1):
+            self.client.get('/api/booking/availability', {'date': self.day, 'guests': 6})
+
+    def test_bookings_are_scoped_to_their_user(self):
+        self.book(2)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.book(3, client=other)
+
+        response = self.client.get('/api/booking/')
+        self.assertEqual([booking['no_of_guests'] for booking in response.data['results']], [2])
+        self.make_manager(self.user)
+        response = self.client.get('/api/booking/')
+        self.assertEqual(response.data['count'], 2)
+
+
+@override_settings(BOOKING_SLOT_CAPACITY=40)
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_parallel_bookings_never_overbook(self):
+        guests, clients = 4, 30
+        day = timezone.localdate() + timedelta(days=1)
+        users = [User.objects.create_user(f'guest{i}') for i in range(clients)]
+        statuses = []
+        barrier = threading.Barrier(clients)
+
+        def book(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                statuses.append(client.post('/api/booking/', {
+                    'name': 'Birthday party', 'no_of_guests': guests,
+                    'date': day, 'time': '19:00'}).status_code)
+            finally:
+                connection.close()
+
+        with mock.patch('LittleLemonDRF.throttling.GCRAThrottle.allow_request',
+                        return_value=True):
+            threads = [threading.Thread(target=book, args=(user,)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        booked = 40 // guests
+        self.assertEqual(sorted(statuses), [201] * booked + [409] * (clients - booked))
+        self.assertEqual(BookingSlot.objects.get().booked, 40)
+        self.assertEqual(Booking.objects.count(), booked)
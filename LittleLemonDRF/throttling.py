@@ -0,0 +1,185 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+# >> GCRA throttling
+# DRF's SimpleRateThrottle keeps the timestamp of every request in the window
+# and writes the whole list back to the cache each time. GCRA (the generic cell
+# rate algorithm, a token bucket in disguise) only needs one number per key:
+# the "theoretical arrival time" (TAT) of the next request. A request is let
+# through if pushing the TAT one interval further keeps it within one period
+# of now, which allows bursts of up to the full rate and nothing more.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/minute' -> (5, 60), the same format as DEFAULT_THROTTLE_RATES."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class MemoryStore:
+    """TATs kept in a dict of this process, at most ``max_keys`` of them.
+
+    The dict is in the order the keys were last allowed, so going over the
+    limit drops the least recent key in O(1) instead of scanning for expired
+    TATs under the lock. A dropped key whose TAT was still ahead can burst
+    again, which takes more than ``max_keys`` keys active at the same time.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.tats = OrderedDict()
+
+    def hit(self, key, now, interval, period):
+        """Return ``(allowed, tat)`` and record the request when it is allowed."""
+        with self.lock:
+            tat = max(self.tats.get(key, now), now) + interval
+            if tat - now > period:
+                return False, tat - interval
+            self.tats[key] = tat
+            self.tats.move_to_end(key)
+            if len(self.tats) > self.max_keys:
+                self.tats.popitem(last=False)
+            return True, tat
+
+
+class FileStore:
+    """TATs kept in a local SQLite file, shared by every worker process on the host.
+
+    Each request is one conditional UPSERT, so the check and the update happen
+    atomically without a read-modify-write race between the workers.
+    """
+
+    HIT = (
+        'INSERT INTO throttle (key, tat) VALUES (:key, :now + :interval) '
+        'ON CONFLICT(key) DO UPDATE SET tat = max(tat, :now) + :interval '
+        'WHERE max(tat, :now) + :interval - :now <= :period '
+        'RETURNING tat'
+    )
+    PRUNE_EVERY = 10000
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.calls = 0
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # The state is cheap to lose, so there is no need to wait for fsync
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat REAL NOT NULL) '
+                'WITHOUT ROWID')
+            self.local.connection = connection
+        return connection
+
+    def hit(self, key, now, interval, period):
+        params = {'key': key, 'now': now, 'interval': interval, 'period': period}
+        row = self.connection.execute(self.HIT, params).fetchone()
+        self.calls += 1
+        if self.calls % self.PRUNE_EVERY == 0:
+            self.connection.execute('DELETE FROM throttle WHERE tat <= ?', (now,))
+        if row is not None:
+            return True, row[0]
+        tat = self.connection.execute(
+            'SELECT tat FROM throttle WHERE key = ?', (key,)).fetchone()[0]
+        return False, tat
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if getattr(settings, 'THROTTLE_STORE', 'memory') == 'file':
+                _store = FileStore(settings.THROTTLE_STORE_PATH)
+            else:
+                _store = MemoryStore()
+        return _store
+
+
+def reset_store():
+    global _store
+    with _store_lock:
+        _store = None
+
+
+class GCRAThrottle(BaseThrottle):
+    """Base class, subclasses return the key to throttle on from ``get_key``."""
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        # The rates are read on every call, so changes to the settings apply right away
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        num, period = parse_rate(rate)
+        self.interval, self.period = period / num, period
+        self.now = time.time()
+        allowed, self.tat = get_store().hit(f'{scope}:{key}', self.now, self.interval, period)
+        return allowed
+
+    def wait(self):
+        return max(0, self.tat + self.interval - self.period - self.now)
+
+
+class AnonThrottle(GCRAThrottle):
+    scope = 'anon'
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserThrottle(GCRAThrottle):
+    scope = 'user'
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+# >> Per view scopes
+# The view's throttle_scope (set with the throttle_scope decorator on function
+# views) picks the rate from DEFAULT_THROTTLE_RATES. Views without a scope are
+# not limited by this class.
+class ScopedThrottle(UserThrottle):
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None)
+
+
+def throttle_scope(scope):
+    """Set the throttle scope of an @api_view function view. Goes above @api_view."""
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+    return decorator
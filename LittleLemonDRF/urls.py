@@ -1,19 +1,37 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+from .budgets import query_budget
 from rest_framework.authtoken.views import obtain_auth_token
 
+# >> Under ASGI the hot reads are served by async views, see async_views.py
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
+
 urlpatterns = [
     # path('', views.index, name='index'),
     path('menu-items/',
-         views.menu_items, name="menu-items"),
-    path('menu-items/<int:id>', views.single_menu_item, name="menu-item-detail"),
-    path('category/<int:pk>', views.category_detail, name='category-detail'),
+         read_views.menu_items, name="menu-items"),
+    path('menu-items/<int:id>', read_views.single_menu_item, name="menu-item-detail"),
+    path('menu-items/import', views.menu_items_import),
+    path('category/<int:pk>', read_views.category_detail, name='category-detail'),
     path('cart/menu-items/', views.cart),
+    path('cart/menu-items/bulk', views.cart_bulk),
+    path('orders', views.orders),
+    path('orders/<int:id>', views.single_order),
+    path('ratings', views.RatingsView.as_view()),
+    path('ratings/summary', views.RatingSummaryView.as_view()),
     path('booking/', views.BookingView.as_view()),
+    path('booking/availability', views.booking_availability),
     path('secret/', views.secret),
-    path('api-token-auth', obtain_auth_token),
+    # A user's first sign-in creates their token: BEGIN and an INSERT more
+    path('api-token-auth', query_budget(POST=4)(obtain_auth_token)),
     path('manager-view/', views.manager_view),
     path('throttle-check', views.throttle_check),
     # path('throttle-check-auth', views.throttle_check_auth)
     path('groups/manager/users', views.managers),
+    path('cache-stats', views.response_cache_stats),
+    path('db-stats', views.database_stats),
+    path('request-stats', views.request_profiling_stats),
+    path('export/menu-items', views.export_menu_items),
+    path('export/orders', views.export_orders),
 ]
@@ -1,136 +1,248 @@
+from django.conf import settings
 from django.shortcuts import render
-from .models import MenuItem, Category, Rating, Cart, Booking
-from .serializers import MenuItemSerializer, CategorySerializer, RatingSerializer, CartSerializer, BookingSerializer
+from .models import MenuItem, MenuItemRating, Category, Rating, Cart, Booking, max_decimal
+from .serializers import MenuItemSerializer, CategorySerializer, RatingSerializer, CartSerializer, BookingSerializer, FastMenuItemSerializer, CartSummarySerializer, CartEntrySerializer, OrderSerializer, MenuItemRatingSerializer
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.core.paginator import Paginator, EmptyPage
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+from .throttling import AnonThrottle, ScopedThrottle, throttle_scope
 from django.contrib.auth.models import User, Group
+from datetime import date
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from .permissions import IsManager, IsManagerOrReadOnly, get_request_groups
+from .search import search_menu_items
+from .ratings import upsert_rating
+from .bookings import SlotFull, available_slots, book
+from .db import query_stats
+from .profiling import request_stats
+from .routers import replica_reads
+from .budgets import query_budget
+from .orders import (EmptyCart, InvalidQuantity, OrderTooLarge, OutOfStock, order_queryset, place_order,
+                     visible_orders)
+from .pagination import InvalidCursor, parse_ordering, paginate_by_cursor
+from .cache import cached_response, cache_stats, version_key
+from .exports import export_response, menu_item_chunks, order_chunks
+from .imports import ImportFormatError, ImportLengthRequired, import_menu_items, upload_rows
+from .renderers import FastJSONRenderer, NDJSONRenderer
+from .conditional import (ConditionalGetMixin, conditional_response, menu_items_validators,
+                          menu_item_validators, category_validators, ratings_validators)
 
 # Create your views here.
 ###################### FUNCTIONS BASED VIWES ####################
 
 
+@query_budget(0)
 def index(request):
     return render(request, 'index.html', {})
 
 
+# Fields menu_items can be ordered by. They are all indexed, non nullable columns
+# of MenuItem, so they can be used for cursors as well
+MENU_ITEM_ORDERING_FIELDS = ('id', 'title', 'price', 'inventory')
+
+
+def filter_menu_items(params):
+    """Apply the category, to_price, search and ordering params to the menu items.
+
+    Returns ``(items, ordering_fields)``. The ordering is only validated, the
+    callers apply it the way their pagination needs. Raises ``ValidationError``
+    for fields outside MENU_ITEM_ORDERING_FIELDS.
+    """
+    # >> The categories are loaded separately by FastMenuItemSerializer, one query per page
+    items = MenuItem.objects.all()
+
+    # >> Fetching the query params from the url to implement filtering, searching, ordering and pagination
+    category_name = params.get('category')
+    to_price = params.get('to_price')
+    search = params.get('search')
+    ordering = params.get('ordering')
+
+    # >> Loading items on the basis of query_params
+    if category_name:
+        # Using double underscores in case of related model 'category__title'
+        items = items.filter(category__title=category_name)
+    elif to_price:
+        # __lte is a field lookup. There are man other field lookups but in this case it means lower than equal to
+        items = items.filter(price__lte=to_price)
+
+    if search:
+        # Uses the FTS5 index when there is one, title__contains otherwise
+        items = search_menu_items(items, search)
+
+    # >> Only the indexed fields are accepted, the param used to go straight into order_by()
+    ordering_fields = [field.strip() for field in (ordering or "").split(",") if field.strip()]
+    for field in ordering_fields:
+        if field.lstrip("-") not in MENU_ITEM_ORDERING_FIELDS:
+            raise ValidationError({'ordering': [f"Cannot order by '{field.lstrip('-')}'"]})
+    return items, ordering_fields
+
+
+def list_menu_items(request):
+    items, ordering_fields = filter_menu_items(request.query_params)
+
+    ordering = request.query_params.get('ordering')
+    page = request.query_params.get('page', default=1)
+    perpage = request.query_params.get('perpage', default=2)
+
+    # >> Cursor mode: ?cursor= (empty for the first page) switches to keyset pagination,
+    # which skips the COUNT(*) and the OFFSET scan of the page/perpage mode
+    if 'cursor' in request.query_params:
+        try:
+            keys = parse_ordering(ordering, MENU_ITEM_ORDERING_FIELDS)
+            items, next_cursor = paginate_by_cursor(
+                FastMenuItemSerializer.values(items), keys,
+                request.query_params.get('cursor'), int(perpage))
+        except (InvalidCursor, ValueError) as error:
+            return Response({"message": str(error)}, status.HTTP_400_BAD_REQUEST)
+
+        serialized_item = FastMenuItemSerializer(items)
+        return Response({"next": next_cursor, "results": serialized_item.data})
+
+    if ordering_fields:
+        # The ordering value can contain more than one criteria e.g ordering=price,title
+        items = items.order_by(*ordering_fields)
+
+    # >> Creating a paginator
+    paginator = Paginator(FastMenuItemSerializer.values(items), per_page=perpage)
+    try:
+        items = paginator.page(number=page)
+    except:
+        items = []
+
+    # >> The list is read only, so it can skip the per object field building of MenuItemSerializer
+    serialized_item = FastMenuItemSerializer(items)
+    # return Response(items.values())
+    return Response(serialized_item.data)
+
+
+@replica_reads
+@throttle_scope('menu_items')
+@query_budget(GET=8, POST=8)
 @api_view(['GET', 'POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManagerOrReadOnly])
 def menu_items(request):
     if request.method == "GET":
-        # >> Loading the related models in a single query
-        items = MenuItem.objects.select_related('category').all()
-
-        # >> Fetching the query params from the url to implement filtering, searching, ordering and pagination
-        category_name = request.query_params.get('category')
-        to_price = request.query_params.get('to_price')
-        search = request.query_params.get('search')
-        ordering = request.query_params.get('ordering')
-        page = request.query_params.get('page', default=1)
-        perpage = request.query_params.get('perpage', default=2)
-
-        # >> Loading items on the basis of query_params
-        if category_name:
-            # Using double underscores in case of related model 'category__title'
-            items = items.filter(category__title=category_name)
-        elif to_price:
-            # __lte is a field lookup. There are man other field lookups but in this case it means lower than equal to
-            items = items.filter(price__lte=to_price)
-
-        if search:
-            # We can place an 'i' before the '__contains" or "--istartswith" for case sensitivity
-            items = items.filter(title__contains=search)
-
-        if ordering:
-            # Spliting the ordering value if it contains more than one criteria e.g ordering=price,title
-            ordering_fields = ordering.split(",")
-            items = items.order_by(*ordering_fields)
-
-        # >> Creating a paginator
-        paginator = Paginator(items, per_page=perpage)
-        try:
-            items = paginator.page(number=page)
-        except:
-            items = []
-
-        # >> We pass context when we are using HyperlinkedModelSerializer to display related models as serializers
-        serialized_item = MenuItemSerializer(
-            items, many=True, context={'request': request})
-        # return Response(items.values())
-        return Response(serialized_item.data)
-
-    # >> Checking for POST requests
+        # >> The menu item payload nests the category, so both versions are dependencies
+        return conditional_response(
+            request, menu_items_validators,
+            lambda: cached_response(
+                request, [version_key(MenuItem), version_key(Category)],
+                lambda: (list_menu_items(request), [])))
+
+    # >> Checking for POST requests, IsManagerOrReadOnly has already checked the role
     if request.method == "POST":
-        if request.user.groups.filter(name="Manager").exists():
-            serialized_item = MenuItemSerializer(data=request.data)
-            serialized_item.is_valid(raise_exception=True)
-            serialized_item.save()
-            return Response(serialized_item.data, status.HTTP_201_CREATED)
-        else:
-            return Response({"message": "You're not autherized"}, 403)
+        serialized_item = MenuItemSerializer(data=request.data)
+        serialized_item.is_valid(raise_exception=True)
+        serialized_item.save()
+        return Response(serialized_item.data, status.HTTP_201_CREATED)
 
 
+# >> Creating and updating many menu items from one CSV, JSON or NDJSON upload.
+# Rows have the fields of a menu_items POST: title, price, stock, category_id.
+# With ?partial=true the valid rows are imported even when others fail,
+# otherwise nothing is imported.
+# The budget covers an upload of up to IMPORT_BATCH_SIZE rows, each further batch adds 4
+@query_budget(POST=9)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsManager])
+def menu_items_import(request):
+    partial = request.query_params.get('partial') in ('1', 'true')
+    try:
+        result = import_menu_items(upload_rows(request), partial=partial)
+    except ImportLengthRequired as error:
+        return Response({"message": str(error)}, status.HTTP_411_LENGTH_REQUIRED)
+    except ImportFormatError as error:
+        return Response({"message": str(error)}, status.HTTP_400_BAD_REQUEST)
+
+    if result['errors'] and not partial:
+        return Response({"errors": result['errors']}, status.HTTP_400_BAD_REQUEST)
+    return Response(result, status.HTTP_200_OK)
+
+
+@query_budget(GET=4, PUT=7, PATCH=7, DELETE=11)
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, IsManagerOrReadOnly])
 def single_menu_item(request, id):
     # item = MenuItem.objects.get(pk=id)
     if request.method == "GET":
-        item = get_object_or_404(MenuItem, pk=id)
-        serialized_item = MenuItemSerializer(item)
-        return Response(serialized_item.data)
-
+        def build():
+            # The nested category and the rating are serialized too, so they are joined right away
+            item = get_object_or_404(
+                MenuItem.objects.select_related('category', 'rating_summary'), pk=id)
+            serialized_item = MenuItemSerializer(item)
+            return Response(serialized_item.data), [version_key(Category, item.category_id)]
+
+        # >> Only writes to this item or to its category invalidate the cached response
+        return conditional_response(
+            request, lambda: menu_item_validators(id),
+            lambda: cached_response(request, [version_key(MenuItem, id)], build))
+
+    # >> Only managers get past IsManagerOrReadOnly for the write methods
     if request.method == "PUT":
-        if request.user.groups.filter(name="Manager").exists():
-            menu_item = get_object_or_404(MenuItem, pk=id)
-            serialized_item = MenuItemSerializer(menu_item, data=request.data)
-            serialized_item.is_valid(raise_exception=True)
-            serialized_item.save()
-            return Response(serialized_item.data, status.HTTP_200_OK)
-
-        else:
-            return Response({"message": "You're not autherized"}, 403)
+        menu_item = get_object_or_404(
+            MenuItem.objects.select_related('category', 'rating_summary'), pk=id)
+        serialized_item = MenuItemSerializer(menu_item, data=request.data)
+        serialized_item.is_valid(raise_exception=True)
+        serialized_item.save()
+        return Response(serialized_item.data, status.HTTP_200_OK)
 
     if request.method == "DELETE":
-        if request.user.groups.filter(name="Manager").exists():
-            menu_item = get_object_or_404(MenuItem, pk=id)
-            menu_item.delete()
-            return Response({"message": "Item deleted succesfuly"}, status.HTTP_200_OK)
-        else:
-            return Response({"message": "You're not autherized"}, 403)
+        menu_item = get_object_or_404(MenuItem, pk=id)
+        menu_item.delete()
+        return Response({"message": "Item deleted succesfuly"}, status.HTTP_200_OK)
 
     if request.method == "PATCH":
-        if request.user.groups.filter(name="Manager").exists():
-            menu_item = get_object_or_404(MenuItem, pk=id)
-            serialized_item = MenuItemSerializer(menu_item, data=request.data)
-            serialized_item.is_valid(raise_exception=True)
-            serialized_item.save()
-            return Response(serialized_item.data, status.HTTP_200_OK)
-
-        else:
-            return Response({"message": "You're not autherized"}, 403)
+        menu_item = get_object_or_404(
+            MenuItem.objects.select_related('category', 'rating_summary'), pk=id)
+        serialized_item = MenuItemSerializer(menu_item, data=request.data)
+        serialized_item.is_valid(raise_exception=True)
+        serialized_item.save()
+        return Response(serialized_item.data, status.HTTP_200_OK)
 
 
+@replica_reads
+@query_budget(4)
 @api_view()
 def category_detail(request, pk):
-    category = get_object_or_404(Category, pk=pk)
-    serialized_category = CategorySerializer(category)
-    return Response(serialized_category.data)
+    def build():
+        category = get_object_or_404(Category, pk=pk)
+        serialized_category = CategorySerializer(category)
+        return Response(serialized_category.data), []
+
+    return conditional_response(
+        request, lambda: category_validators(pk),
+        lambda: cached_response(request, [version_key(Category, pk)], build))
 
 
+def cart_summary(user):
+    summary = Cart.objects.filter(user=user).aggregate(
+        line_count=Count('id'), item_count=Sum('quantity'), total=Sum('price'))
+    # SUM() of no rows is NULL
+    return {key: value or 0 for key, value in summary.items()}
+
+
+def cart_data(user):
+    # >> Only the cart of the given user. menuitem is joined for the menuitem_* fields
+    cart_items = Cart.objects.filter(user=user).select_related('menuitem')
+    serialized_items = CartSerializer(cart_items, many=True)
+    # >> The totals come from one aggregate query
+    summary = CartSummarySerializer(cart_summary(user))
+    return {**summary.data, "results": serialized_items.data}
+
+
+@throttle_scope('cart')
+@query_budget(GET=4, POST=5, DELETE=4)
 @api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def cart(request):
     if request.method == "GET":
-        cart_items = Cart.objects.select_related('user').all()
-        serialized_items = CartSerializer(
-            cart_items, many=True)
-        # return Response(items.values())
-        return Response(serialized_items.data, status=status.HTTP_200_OK)
+        return Response(cart_data(request.user), status=status.HTTP_200_OK)
 
     if request.method == "POST":
         menuitem_id = request.data.get('menuitem_id')
@@ -139,37 +251,163 @@ def cart(request):
 
         if not menuitem_id or not quantity:
             return Response({'error': 'menuitem_id and quantity are required.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create or update cart item
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            return Response({'error': 'quantity must be a whole number of at least 1.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Create or update cart item. The body is validated above: running it
+        # through CartSerializer again would load the menu item a second time
+        # and write the new line twice.
         cart_item, created = Cart.objects.get_or_create(
             user=request.user,
             menuitem=menuitem,
             defaults={
                 'quantity': quantity,
                 'unit_price': menuitem.price,
-                'price': int(quantity) * (menuitem.price)
+                'price': quantity * menuitem.price
             }
         )
 
         if not created:
             cart_item.quantity = quantity
-            cart_item.price = int(quantity) * menuitem.price
-            # cart_item.save()
-
-        serialized_item = CartSerializer(cart_item, data=request.data)
-        serialized_item.is_valid(raise_exception=True)
-        serialized_item.save()
-        return Response(serialized_item.data, status.HTTP_201_CREATED)
+            cart_item.price = quantity * menuitem.price
+            cart_item.save(update_fields=['quantity', 'price'])
+        cart_item.menuitem = menuitem
+        return Response(CartSerializer(cart_item).data, status.HTTP_201_CREATED)
 
     if request.method == "DELETE":
-        cart_items = Cart.objects.select_related('user').all()
+        cart_items = Cart.objects.filter(user=request.user)
         cart_items.delete()
         return Response({"message": "successfully deleted all items"}, status=status.HTTP_200_OK)
 
 
+# >> Adding, changing and removing (quantity 0) many cart lines in one request
+# Body: [{"menuitem_id": 1, "quantity": 2}, ...]. With ?partial=true the valid
+# entries are applied even when others fail, otherwise nothing is applied.
+@throttle_scope('cart')
+@query_budget(POST=8)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cart_bulk(request):
+    if not isinstance(request.data, list):
+        return Response({"message": "Expected a list of {menuitem_id, quantity} entries"},
+                        status.HTTP_400_BAD_REQUEST)
+
+    errors, valid = [], []
+    for index, data in enumerate(request.data):
+        entry = CartEntrySerializer(data=data)
+        if entry.is_valid():
+            valid.append((index, entry.validated_data))
+        else:
+            errors.append({"index": index, **entry.errors})
+
+    # >> One query for all the menu items
+    menuitems = MenuItem.objects.only('id', 'price').in_bulk(
+        {entry['menuitem_id'] for _, entry in valid})
+
+    # A later entry for the same menu item wins
+    lines, removed = {}, set()
+    max_price = max_decimal(Cart, 'price')
+    for index, entry in valid:
+        menuitem_id, quantity = entry['menuitem_id'], entry['quantity']
+        menuitem = menuitems.get(menuitem_id)
+        if menuitem is None:
+            errors.append({"index": index, "menuitem_id": [f"Menu item {menuitem_id} does not exist."]})
+        elif quantity * menuitem.price > max_price:
+            errors.append({"index": index, "quantity": [
+                f"The line would cost {quantity * menuitem.price}, more than {max_price}."]})
+        elif quantity == 0:
+            lines.pop(menuitem_id, None)
+            removed.add(menuitem_id)
+        else:
+            removed.discard(menuitem_id)
+            lines[menuitem_id] = Cart(user=request.user, menuitem=menuitem, quantity=quantity,
+                                      unit_price=menuitem.price, price=quantity * menuitem.price)
+
+    errors.sort(key=lambda error: error["index"])
+    partial = request.query_params.get('partial') in ('1', 'true')
+    if errors and not partial:
+        return Response({"errors": errors}, status.HTTP_400_BAD_REQUEST)
+
+    # >> Inserts and updates in a single statement on the (menuitem, user) unique constraint
+    with transaction.atomic():
+        if lines:
+            Cart.objects.bulk_create(
+                lines.values(), update_conflicts=True, unique_fields=['menuitem', 'user'],
+                update_fields=['quantity', 'unit_price', 'price'])
+        if removed:
+            Cart.objects.filter(user=request.user, menuitem_id__in=removed).delete()
+
+    return Response({**cart_data(request.user), "errors": errors}, status.HTTP_200_OK)
+
+
+# Orders are listed newest first, pages are cut with a cursor on (date, id)
+ORDER_CURSOR_KEYS = [('date', True), ('id', True)]
+
+
+# >> Listing the orders the user may see, or turning their cart into an order
+@query_budget(GET=4, POST=12)
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def orders(request):
+    if request.method == "GET":
+        # Managers see every order, delivery crew the ones assigned to them, customers their own
+        items = visible_orders(request.user, get_request_groups(request))
+
+        order_status = request.query_params.get('status')
+        order_date = request.query_params.get('date')
+        perpage = request.query_params.get('perpage', default=10)
+
+        if order_status is not None:
+            if order_status not in ('0', '1', 'false', 'true'):
+                return Response({"message": "status must be 0 or 1"}, status.HTTP_400_BAD_REQUEST)
+            items = items.filter(status=order_status in ('1', 'true'))
+        if order_date:
+            try:
+                items = items.filter(date=date.fromisoformat(order_date))
+            except ValueError:
+                return Response({"message": "date must be YYYY-MM-DD"}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            items, next_cursor = paginate_by_cursor(
+                items, ORDER_CURSOR_KEYS, request.query_params.get('cursor'),
+                min(int(perpage), 100))
+        except (InvalidCursor, ValueError) as error:
+            return Response({"message": str(error)}, status.HTTP_400_BAD_REQUEST)
+
+        # >> One query for the page and one for the prefetched items, whatever the page size
+        serialized_orders = OrderSerializer(items, many=True)
+        return Response({"next": next_cursor, "results": serialized_orders.data})
+
+    if request.method == "POST":
+        try:
+            order = place_order(request.user)
+        except (EmptyCart, InvalidQuantity, OrderTooLarge) as error:
+            return Response({"message": str(error)}, status.HTTP_400_BAD_REQUEST)
+        except OutOfStock as error:
+            return Response({"message": "Not enough stock", "menuitems": error.menuitem_ids},
+                            status.HTTP_409_CONFLICT)
+
+        serialized_order = OrderSerializer(order_queryset().get(pk=order.pk))
+        return Response(serialized_order.data, status.HTTP_201_CREATED)
+
+
+@query_budget(4)
+@api_view()
+@permission_classes([IsAuthenticated])
+def single_order(request, id):
+    order = get_object_or_404(visible_orders(request.user, get_request_groups(request)), pk=id)
+    serialized_order = OrderSerializer(order)
+    return Response(serialized_order.data)
+
+
 # >> Authentication
 
 
+@query_budget(2)
 @api_view()
 # This will return response for authenticated users only
 @permission_classes([IsAuthenticated])
@@ -177,19 +415,19 @@ def secret(request):
     return Response({"message": "some secret message"})
 
 
+@query_budget(2)
 @api_view()
-@permission_classes([IsAuthenticated])
+# >> IsManager checks if the user with the token belongs to manager group only, therefore no other token should display this message
+@permission_classes([IsAuthenticated, IsManager])
 def manager_view(request):
-    # >> We are checking if the user with the token belongs to manager group only, therefore no other token should display this message
-    if request.user.groups.filter(name="Manager").exists():
-        return Response({"message": "Only Manager Should See This"})
-    else:
-        return Response({"message": "You're not autherized"}, 403)
+    return Response({"message": "Only Manager Should See This"})
 
 
 # >> Throttling
+@throttle_scope('throttle_check')
+@query_budget(2)
 @api_view()
-@throttle_classes([AnonRateThrottle])
+@throttle_classes([AnonThrottle, ScopedThrottle])
 def throttle_check(request):
     return Response({"message": "successful"})
 
@@ -202,6 +440,7 @@ def throttle_check(request):
 
 # >> User Management
 # This view is for super admin to add and remove users from manager groups
+@query_budget(POST=7)
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def managers(request):
@@ -218,43 +457,159 @@ def managers(request):
         return Response({"message": "ok"})
 
     return Response({"message": "error"}, status.HTTP_400_BAD_REQUEST)
+
+
+# >> Hit/miss counters of the menu and category response cache
+@query_budget(2)
+@api_view()
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    return Response(cache_stats())
+
+
+# >> Queries per database alias (see db.py), e.g. the share the replicas take
+@query_budget(2)
+@api_view()
+@permission_classes([IsAdminUser])
+def database_stats(request):
+    return Response(query_stats())
+
+
+# >> Query count and SQL, serializer, render and total time percentiles per
+# route, while settings.REQUEST_PROFILING is on (see profiling.py)
+@query_budget(2)
+@api_view()
+@permission_classes([IsAuthenticated, IsManager])
+def request_profiling_stats(request):
+    return Response({'enabled': settings.REQUEST_PROFILING, 'routes': request_stats()})
+
+
+# >> Full dumps for admins, streamed chunk by chunk (see exports.py).
+# ?format=ndjson (or Accept: application/x-ndjson) for one object per line.
+# The budgets count the view, the chunks are loaded while the response streams
+@query_budget(2)
+@api_view()
+@renderer_classes([FastJSONRenderer, NDJSONRenderer])
+@permission_classes([IsAdminUser])
+def export_menu_items(request):
+    return export_response(request, menu_item_chunks(), 'menu-items')
+
+
+@query_budget(2)
+@api_view()
+@renderer_classes([FastJSONRenderer, NDJSONRenderer])
+@permission_classes([IsAdminUser])
+def export_orders(request):
+    return export_response(request, order_chunks(), 'orders')
+
+
 ####################### CLASS BASED VIEWS #####################
 
 
+@replica_reads
 class CategoriesView(generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, [version_key(Category)],
+            lambda: (super(CategoriesView, self).list(request, *args, **kwargs), []))
+
 # >>  The least a generic view requires for functioning properly is a serializer_class and queryset
 
 
-class MenuItemsView(generics.ListCreateAPIView, ):
+class MenuItemsView(ConditionalGetMixin, generics.ListCreateAPIView):
     # throttle_classes = [AnonRateThrottle, UserRateThrottle]
-    queryset = MenuItem.objects.all()
+    queryset = MenuItem.objects.select_related('category', 'rating_summary')
     serializer_class = MenuItemSerializer
     ordering_fields = ["price", "inventory"]
     search_fields = ['title', 'category__title']
-    throttle_classes = [AnonRateThrottle, UserRateThrottle]
+
+    def get_validators(self):
+        return menu_items_validators()
 
 
 # >> The generic view RetrieveUpdateDestroy has everything to create a new model item and delete a model item from the database
-class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+class SingleMenuItemView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MenuItem.objects.select_related('category', 'rating_summary')
     serializer_class = MenuItemSerializer
 
+    def get_validators(self):
+        return menu_item_validators(self.kwargs['pk'])
+
 
-class RatingsView(generics.ListCreateAPIView):
-    queryset = Rating.objects.all()
+@replica_reads
+@query_budget(GET=6, POST=4)
+class RatingsView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = Rating.objects.order_by('id')
     serializer_class = RatingSerializer
 
+    def get_validators(self):
+        return ratings_validators()
+
     def get_permissions(self):
         if (self.request.method == 'GET'):
             return []
 
         return [IsAuthenticated()]
 
+    # >> Rating an item again replaces the rating, in a single upsert statement
+    def perform_create(self, serializer):
+        try:
+            serializer.instance = upsert_rating(
+                self.request.user, serializer.validated_data['menuitem_id'],
+                serializer.validated_data['rating_value'])
+        except IntegrityError:
+            raise ValidationError({'menuitem': ['Menu item not found']})
+
+
+# >> Rating count, average and histogram of every rated menu item, read from
+# the precomputed aggregates instead of grouping the ratings on each request
+@query_budget(GET=4)
+class RatingSummaryView(generics.ListAPIView):
+    queryset = MenuItemRating.objects.order_by('menuitem_id')
+    serializer_class = MenuItemRatingSerializer
 
+
+@query_budget(GET=4, POST=11)
 class BookingView(generics.ListCreateAPIView):
-    queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Managers see every booking, customers their own
+        bookings = Booking.objects.select_related('slot').order_by('-id')
+        if 'Manager' in get_request_groups(self.request):
+            return bookings
+        return bookings.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            booking = book(request.user, data['name'], data['no_of_guests'],
+                           data['slot']['date'], data['slot']['time'])
+        except SlotFull as error:
+            return Response({"message": str(error)}, status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(booking).data, status.HTTP_201_CREATED)
+
+
+# >> The slots of a day that can still seat a party, from the per-slot seat
+# counts (see bookings.py)
+@query_budget(GET=3)
+@api_view(['GET'])
+def booking_availability(request):
+    try:
+        day = date.fromisoformat(request.query_params.get('date', ''))
+        guests = int(request.query_params.get('guests', 2))
+    except ValueError:
+        return Response({"message": "date must be YYYY-MM-DD and guests a number"},
+                        status.HTTP_400_BAD_REQUEST)
+    if guests < 1:
+        return Response({"message": "guests must be at least 1"}, status.HTTP_400_BAD_REQUEST)
+
+    slots = [{'time': slot['time'].strftime('%H:%M'), 'available': slot['available']}
+             for slot in available_slots(day, guests)]
+    return Response({'date': day, 'guests': guests, 'slots': slots})
@@ -0,0 +1,127 @@
+"""Sync vs. async read views under uvicorn, at a fixed number of concurrent clients.
+
+The same ASGI app is started twice, once with the sync DRF views and once with
+LittleLemonDRF.async_views (LITTLELEMON_ASYNC_VIEWS=0/1). Every client keeps one
+HTTP/1.1 connection open and cycles through menu list, menu item and category
+requests.
+
+    python -m benchmarks.bench_asgi --rows 100000 --concurrency 64
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BASE_DIR, percentile, seed_menu, setup_django
+
+
+def start_server(port, async_views, workers):
+    env = {**os.environ, "LITTLELEMON_ASYNC_VIEWS": "1" if async_views else "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "LittleLemonAPIV2.asgi:application",
+         "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BASE_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    headers = dict(line.split(b": ", 1) for line in head.split(b"\r\n")[1:-2])
+    headers = {key.lower(): value for key, value in headers.items()}
+    if b"content-length" in headers:
+        await reader.readexactly(int(headers[b"content-length"]))
+    else:
+        # Transfer-Encoding: chunked
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def client(port, paths, token, deadline, timings):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for path in paths:
+        if time.perf_counter() >= deadline:
+            break
+        started = time.perf_counter()
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+                     f"Authorization: Token {token}\r\n\r\n".encode())
+        status = await read_response(reader)
+        assert status == 200, (path, status)
+        timings.append((time.perf_counter() - started) * 1000)
+    writer.close()
+
+
+async def load(port, paths, token, concurrency, duration):
+    timings = []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client(port, itertools.islice(itertools.cycle(paths), i, None), token, deadline, timings)
+        for i in range(concurrency)
+    ])
+    return timings, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit("This benchmark needs an ASGI server: pip install uvicorn")
+
+    setup_django()
+    from rest_framework.authtoken.models import Token
+    from benchmarks.common import get_user
+
+    print(f"Seeding {args.rows} menu items...")
+    seed_menu(args.rows)
+    token = Token.objects.create(user=get_user()).key
+    step = max(1, args.rows // 100)
+    paths = [path for i in range(1, args.rows, step) for path in (
+        f"/api/menu-items/?perpage=10&page={i % 50 + 1}",
+        f"/api/menu-items/{i}",
+        f"/api/category/{i % 10 + 1}",
+    )]
+
+    print(f"{args.concurrency} concurrent clients, {args.workers} worker(s), "
+          f"{args.duration:.0f}s per run")
+    for label, async_views in (("sync views", False), ("async views", True)):
+        server = start_server(args.port, async_views, args.workers)
+        try:
+            # A short warm up, so both runs start with loaded code and a warm page cache
+            asyncio.run(load(args.port, paths, token, args.concurrency, 1.0))
+            timings, elapsed = asyncio.run(
+                load(args.port, paths, token, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{label:<15} {len(timings) / elapsed:9,.0f} requests/s"
+              f"   p50 {percentile(timings, 50):8.2f} ms   p99 {percentile(timings, 99):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Concurrent bookings of the same slot, and availability with many bookings.
+
+Threads POST bookings for a single slot through the booking view, as fast as
+they can, until the slot is full and beyond. The run checks that the seats
+taken never exceed the capacity and match the stored bookings. Availability is
+then timed on a day with many booked slots, to show it doesn't depend on the
+number of bookings.
+
+    python -m benchmarks.bench_bookings --threads 32 --attempts 4000
+"""
+import argparse
+import datetime
+import threading
+import time
+from collections import Counter
+
+from benchmarks.common import get_user, percentile, report, setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=4000, help="booking POSTs in total")
+    parser.add_argument("--capacity", type=int, default=2000, help="seats of the slot")
+    parser.add_argument("--guests", type=int, default=2)
+    parser.add_argument("--days", type=int, default=365, help="days of bookings for availability")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.utils import timezone
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from LittleLemonDRF.bookings import available_slots, slot_times
+    from LittleLemonDRF.models import Booking, BookingSlot
+    from LittleLemonDRF.views import BookingView
+
+    settings.BOOKING_SLOT_CAPACITY = args.capacity
+    day = timezone.localdate() + datetime.timedelta(days=1)
+    slot_time = slot_times()[len(slot_times()) // 2]
+    users = [get_user(f"guest-{i}") for i in range(args.threads)]
+    factory = APIRequestFactory()
+    view = BookingView.as_view()
+
+    statuses = Counter()
+    timings = []
+    barrier = threading.Barrier(args.threads)
+
+    def client(user, attempts):
+        barrier.wait()
+        try:
+            for _ in range(attempts):
+                request = factory.post("/api/booking/", {
+                    "name": "Load test party", "no_of_guests": args.guests,
+                    "date": day.isoformat(), "time": slot_time.strftime("%H:%M")}, format="json")
+                force_authenticate(request, user)
+                started = time.perf_counter()
+                status = view(request).status_code
+                timings.append((time.perf_counter() - started) * 1000)
+                statuses[status] += 1
+        finally:
+            connection.close()
+
+    per_thread = args.attempts // args.threads
+    threads = [threading.Thread(target=client, args=(user, per_thread)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    slot = BookingSlot.objects.get(date=day, time=slot_time)
+    stored = sum(Booking.objects.filter(slot=slot).values_list("no_of_guests", flat=True))
+    print(f"{args.threads} threads, {sum(statuses.values())} POSTs for one slot of "
+          f"{args.capacity} seats in {elapsed:.1f}s ({sum(statuses.values()) / elapsed:,.0f}/s)")
+    print(f"statuses {dict(sorted(statuses.items()))}   p50 {percentile(timings, 50):.2f} ms"
+          f"   p99 {percentile(timings, 99):.2f} ms")
+    print(f"seats taken {slot.booked}/{slot.capacity}, in stored bookings {stored}")
+    assert slot.booked <= slot.capacity and slot.booked == stored, "overbooked"
+    assert statuses[201] == min(per_thread * args.threads, args.capacity // args.guests)
+
+    # Availability on a day with bookings in every slot, after a year of bookings
+    print(f"Seeding {args.days} days of bookings...")
+    first = day + datetime.timedelta(days=1)
+    slots = BookingSlot.objects.bulk_create([
+        BookingSlot(date=first + datetime.timedelta(days=i), time=time_, capacity=40, booked=i % 41)
+        for i in range(args.days) for time_ in slot_times()])
+    Booking.objects.bulk_create(
+        [Booking(user=users[0], name="Seeded party", no_of_guests=2, slot=slot)
+         for slot in slots for _ in range(slot.booked // 2)], batch_size=5000)
+    print(f"{Booking.objects.count():,} bookings")
+    report("available_slots(day, 4)", timeit(lambda: available_slots(first, 4), repeat=200))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Bulk menu import vs. one menu_items POST per row.
+
+The one-by-one POSTs are timed on a sample of the rows (they take minutes for
+the full set), the import endpoint on all of them, first as new items and then
+again as updates of the same titles.
+
+    python -m benchmarks.bench_import --rows 50000
+"""
+import argparse
+import csv
+import io
+import time
+
+from benchmarks.common import get_user, setup_django
+
+
+def make_csv(rows, category_ids, price="5.50"):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["title", "price", "stock", "category_id"])
+    for i in range(rows):
+        writer.writerow([f"Imported {i:07d}", price, i % 100, category_ids[i % len(category_ids)]])
+    return out.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--sample", type=int, default=500, help="rows POSTed one by one")
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from LittleLemonDRF.models import Category, MenuItem
+    from LittleLemonDRF.views import menu_items, menu_items_import
+
+    Category.objects.bulk_create(
+        [Category(slug=f"category-{i}", title=f"Category {i}") for i in range(10)])
+    category_ids = list(Category.objects.values_list("id", flat=True))
+    manager = get_user("manager", manager=True)
+    factory = APIRequestFactory()
+
+    started = time.perf_counter()
+    for i in range(args.sample):
+        request = factory.post("/api/menu-items/", {
+            "title": f"Posted {i}", "price": "5.50", "stock": 1,
+            "category_id": category_ids[i % len(category_ids)]}, format="json")
+        force_authenticate(request, manager)
+        assert menu_items(request).status_code == 201
+    per_row = (time.perf_counter() - started) / args.sample
+    print(f"{'menu_items POST, one per row':<34} {1 / per_row:10,.0f} rows/s"
+          f"   ~{per_row * args.rows:8.1f} s for {args.rows} rows")
+
+    for label, price in (("import, new items", "5.50"), ("import, updating the same", "6.00")):
+        body = make_csv(args.rows, category_ids, price)
+        request = factory.post("/api/menu-items/import", body, content_type="text/csv")
+        force_authenticate(request, manager)
+        started = time.perf_counter()
+        response = menu_items_import(request)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.data
+        print(f"{label:<34} {args.rows / elapsed:10,.0f} rows/s   {elapsed:9.1f} s for {args.rows} rows"
+              f"   ({response.data['created']} created, {response.data['updated']} updated)")
+
+    assert MenuItem.objects.filter(title__startswith="Imported").count() == args.rows
+
+
+if __name__ == "__main__":
+    main()
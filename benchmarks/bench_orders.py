@@ -0,0 +1,83 @@
+"""Order list pages for managers and customers on a large order table.
+
+    python -m benchmarks.bench_orders --orders 100000 --items-per-order 10
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+from benchmarks.common import setup_django, get_user, seed_menu, timeit, report
+
+
+def seed_orders(orders, items_per_order, customers, batch_size=5000):
+    from django.contrib.auth.models import User
+    from LittleLemonDRF.models import MenuItem, Order, OrderItem
+
+    User.objects.bulk_create([User(username=f"customer{i}") for i in range(customers)])
+    user_ids = list(User.objects.filter(username__startswith="customer").values_list("id", flat=True))
+    menu = list(MenuItem.objects.values_list("id", "price"))
+    today = date.today()
+    rng = random.Random(42)
+
+    for start in range(0, orders, batch_size):
+        created = Order.objects.bulk_create([
+            Order(user_id=user_ids[i % len(user_ids)], status=i % 3 == 0, total=0,
+                  date=today - timedelta(days=(orders - i) // 100))
+            for i in range(start, min(start + batch_size, orders))
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem_id=menuitem_id, quantity=1,
+                      unit_price=price, price=price)
+            for order in created
+            for menuitem_id, price in rng.sample(menu, items_per_order)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--items-per-order", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--perpage", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from LittleLemonDRF.views import orders
+
+    print(f"Seeding {args.orders} orders with {args.orders * args.items_per_order} items...")
+    seed_menu(200)
+    seed_orders(args.orders, args.items_per_order, args.customers)
+    manager = get_user("manager", manager=True)
+    from django.contrib.auth.models import User
+    customer = User.objects.get(username="customer0")
+    factory = APIRequestFactory()
+
+    def get(user, params):
+        request = factory.get("/api/orders", params)
+        force_authenticate(request, user)
+        response = orders(request)
+        assert response.status_code == 200, response.data
+        return response.data
+
+    for label, user in (("manager", manager), ("customer", customer)):
+        # Walk a few pages in to measure a deep page as well
+        cursor, pages = "", {1: ""}
+        for page in range(2, 51):
+            cursor = get(user, {"cursor": cursor, "perpage": args.perpage})["next"]
+            if cursor is None:
+                break
+            pages[page] = cursor
+        for page in sorted({1, max(pages)}):
+            params = {"cursor": pages[page], "perpage": args.perpage}
+            with CaptureQueriesContext(connection) as queries:
+                get(user, params)
+            report(f"{label} page {page} ({len(queries)} queries)",
+                   timeit(lambda: get(user, params), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
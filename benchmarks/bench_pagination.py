@@ -0,0 +1,53 @@
+"""Page/perpage (COUNT + OFFSET) vs. cursor (keyset) pagination of menu_items.
+
+    python -m benchmarks.bench_pagination --rows 1000000
+"""
+import argparse
+
+from benchmarks.common import setup_django, get_user, seed_menu, timeit, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--perpage", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from LittleLemonDRF.views import menu_items
+
+    print(f"Seeding {args.rows} menu items...")
+    seed_menu(args.rows)
+    user = get_user()
+    factory = APIRequestFactory()
+
+    def get(params):
+        request = factory.get("/api/menu-items/", params)
+        force_authenticate(request, user)
+        response = menu_items(request)
+        assert response.status_code == 200, response.data
+        return response.data
+
+    last_page = args.rows // args.perpage
+    for page in sorted({1, 5000, last_page}):
+        if page > last_page:
+            continue
+        params = {"page": page, "perpage": args.perpage, "ordering": "id"}
+        report(f"page={page}", timeit(lambda: get(params), args.repeat))
+
+        # Walking to the same depth with cursors is what a client would do,
+        # here the cursor of the previous page is taken straight from the database
+        cursor = ""
+        if page > 1:
+            from LittleLemonDRF.models import MenuItem
+            from LittleLemonDRF.pagination import encode_cursor
+            row = MenuItem.objects.order_by("id")[(page - 1) * args.perpage - 1]
+            cursor = encode_cursor([("id", False)], row)
+        params = {"cursor": cursor, "perpage": args.perpage, "ordering": "id"}
+        report(f"cursor at page {page}", timeit(lambda: get(params), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Overhead of the request profiling middleware (settings.REQUEST_PROFILING).
+
+Two WSGI handlers are built in the same process, one with the setting off
+(the middleware removes itself) and one with it on. Every request is sent to
+both, in alternating order, so that drift and noise affect both alike; the
+summed times are compared.
+
+    python -m benchmarks.bench_profiling --rounds 10 --requests 500
+"""
+import argparse
+import time
+
+from benchmarks.common import get_user, seed_menu, setup_django, wsgi_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=500, help="requests per round")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from rest_framework.authtoken.models import Token
+
+    seed_menu(args.rows)
+    token = Token.objects.create(user=get_user()).key
+    handlers = {}
+    for enabled in (False, True):
+        settings.REQUEST_PROFILING = enabled
+        handlers[enabled] = WSGIHandler()
+    paths = [path for i in range(1, args.requests // 3 + 2) for path in (
+        f"/api/menu-items/?perpage=10&page={i % 50 + 1}",
+        f"/api/menu-items/{i % args.rows + 1}",
+        f"/api/category/{i % 10 + 1}",
+    )][:args.requests]
+
+    elapsed = {False: 0.0, True: 0.0}
+    for round_ in range(args.rounds):
+        for i, path in enumerate(paths):
+            order = (False, True) if (i + round_) % 2 else (True, False)
+            for enabled in order:
+                started = time.perf_counter()
+                assert wsgi_request(handlers[enabled], "GET", path, token) == 200
+                elapsed[enabled] += time.perf_counter() - started
+
+    count = args.rounds * len(paths)
+    for enabled, seconds in elapsed.items():
+        print(f"profiling {'on ' if enabled else 'off'}  {count / seconds:9,.0f} requests/s"
+              f"   {seconds / count * 1000:.3f} ms/request")
+    print(f"overhead {(elapsed[True] / elapsed[False] - 1) * 100:+.2f}%")
+
+
+if __name__ == "__main__":
+    main()
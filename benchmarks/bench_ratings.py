@@ -0,0 +1,91 @@
+"""Rating write throughput: the upsert path vs. save() through the signals.
+
+Users rate random menu items, most of them for the second time, so the
+numbers are dominated by re-ratings. Each path is run on its own set of users
+and reports writes per second and queries per write:
+
+- upsert: ratings.upsert_rating, one INSERT ... ON CONFLICT DO UPDATE
+- save(): Rating.objects.update_or_create, the path of the admin and of code
+  that saves Rating instances
+- POST /api/ratings: the upsert behind the ratings view, serializer included
+
+    python -m benchmarks.bench_ratings --items 1000 --writes 20000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import get_user, seed_menu, setup_django
+
+
+def run(label, write, ratings):
+    from django.db import connection
+
+    statements = []
+
+    def count(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        for user, menuitem_id, value in ratings:
+            write(user, menuitem_id, value)
+        elapsed = time.perf_counter() - started
+    queries = sum(1 for sql in statements if sql != "BEGIN")
+    print(f"{label:<20} {len(ratings) / elapsed:9,.0f} writes/s"
+          f"   {queries / len(ratings):5.2f} queries/write")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=20000, help="ratings per path")
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from LittleLemonDRF.models import MenuItemRating, Rating
+    from LittleLemonDRF.ratings import rebuild_summaries, triggers_available, upsert_rating
+    from LittleLemonDRF.views import RatingsView
+
+    print(f"Seeding {args.items} menu items...")
+    seed_menu(args.items)
+    if not triggers_available():
+        print("No rating triggers on this database, the upsert falls back to save()")
+
+    factory = APIRequestFactory()
+    view = RatingsView.as_view()
+
+    def save(user, menuitem_id, value):
+        Rating.objects.update_or_create(
+            user=user, menuitem_id=menuitem_id, defaults={"rating_value": value})
+
+    def post(user, menuitem_id, value):
+        request = factory.post("/api/ratings", {"menuitem": menuitem_id, "rating_value": value},
+                               format="json")
+        force_authenticate(request, user)
+        assert view(request).status_code == 201
+
+    rng = random.Random(0)
+    # Few items per user, so most writes change an existing rating
+    per_user = max(1, args.writes // args.users // 4)
+    for label, write in (("upsert", upsert_rating), ("save()", save), ("POST /api/ratings", post)):
+        users = [get_user(f"{label}-{i}") for i in range(args.users)]
+        picks = {user: rng.sample(range(1, args.items + 1), per_user) for user in users}
+        ratings = [(user, rng.choice(picks[user]), rng.randint(0, 5))
+                   for user in (rng.choice(users) for _ in range(args.writes))]
+        run(label, write, ratings)
+
+    # The aggregates kept by the writes must match a full recount
+    kept = {row.menuitem_id: (row.count, row.total, row.histogram)
+            for row in MenuItemRating.objects.all()}
+    rebuild_summaries()
+    assert kept == {row.menuitem_id: (row.count, row.total, row.histogram)
+                    for row in MenuItemRating.objects.all()}, "aggregates drifted"
+    print(f"{Rating.objects.count():,} ratings, aggregates match a recount")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""DRF's JSONRenderer/JSONParser vs. the orjson backed FastJSONRenderer/FastJSONParser.
+
+The payloads are what the views return: menu item lists (MenuItemSerializer,
+with the nested category and ratings) and a customer's cart (cart_data(), with
+the Decimal prices and totals), at every --sizes. Each is serialized once, then
+rendered --repeat times by both renderers; the bodies are checked to be the
+same bytes. The rendered bodies are then parsed back by both parsers.
+
+    python -m benchmarks.bench_render --sizes 100 1000 10000
+"""
+import argparse
+import statistics
+from io import BytesIO
+
+from benchmarks.common import get_user, seed_menu, setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from LittleLemonDRF import renderers
+    from LittleLemonDRF.models import Cart, MenuItem
+    from LittleLemonDRF.serializers import MenuItemSerializer
+    from LittleLemonDRF.views import cart_data
+
+    if renderers.orjson is None:
+        print("orjson is not installed: FastJSONRenderer falls back to JSONRenderer")
+    seed_menu(max(args.sizes))
+    items = MenuItem.objects.select_related("category", "rating_summary").order_by("id")
+
+    payloads = []
+    for size in args.sizes:
+        payloads.append((f"menu {size}", MenuItemSerializer(items[:size], many=True).data))
+        customer = get_user(f"customer-{size}")
+        Cart.objects.bulk_create([
+            Cart(user=customer, menuitem=item, quantity=i % 5 + 1, unit_price=item.price,
+                 price=item.price * (i % 5 + 1)) for i, item in enumerate(items[:size])])
+        payloads.append((f"cart {size}", cart_data(customer)))
+
+    slow_renderer, fast_renderer = JSONRenderer(), renderers.FastJSONRenderer()
+    slow_parser, fast_parser = JSONParser(), renderers.FastJSONParser()
+    print(f"{'payload':<12} {'bytes':>10} {'render DRF':>11} {'fast':>9} {'speedup':>8}"
+          f" {'parse DRF':>10} {'fast':>9} {'speedup':>8}")
+    for label, data in payloads:
+        body = slow_renderer.render(data)
+        assert fast_renderer.render(data) == body
+        assert fast_parser.parse(BytesIO(body)) == slow_parser.parse(BytesIO(body))
+        times = [statistics.median(timeit(func, args.repeat)) for func in (
+            lambda: slow_renderer.render(data),
+            lambda: fast_renderer.render(data),
+            lambda: slow_parser.parse(BytesIO(body)),
+            lambda: fast_parser.parse(BytesIO(body)),
+        )]
+        print(f"{label:<12} {len(body):>10,} {times[0]:>9.3f}ms {times[1]:>7.3f}ms"
+              f" {times[0] / times[1]:>7.1f}x {times[2]:>8.3f}ms {times[3]:>7.3f}ms"
+              f" {times[2] / times[3]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+"""Every API and djoser route under a mixed load, through the test client and a WSGI server.
+
+A synthetic dataset (categories, menu items, customers with carts, ratings,
+orders and bookings) is seeded into a fresh database, then the same request
+mix is replayed against each target, each in its own process:
+
+  client  Django's test client, one request at a time
+  wsgi    a real WSGI server in a subprocess (``manage.py runserver`` unless
+          --server-command starts another one) and --threads HTTP clients
+
+The mix is generated from --seed: every route once, then weighted picks. Or it
+is read from an NDJSON file (--mix) with one {"method", "path", "user", "body",
+"expect", "session"} object per line; --record writes the generated one.
+Requests with the same session are sent in order by the same client thread,
+e.g. the cart POST before the order POST that checks the cart out.
+Queries per request come from the Server-Timing header of the request
+profiling middleware, which the run turns on.
+
+The run reports, per target and route, the requests, the unexpected statuses,
+the p50/p95/p99 latency and the queries per request. --save-baseline writes
+them to a JSON file. --baseline compares the run with such a file and exits
+with 1 on regressions: more queries per request on a route, a p50 or a
+throughput worse by more than --tolerance, or unexpected statuses.
+
+    python -m benchmarks.bench_routes --requests 5000 --save-baseline routes.json
+    python -m benchmarks.bench_routes --requests 5000 --baseline routes.json
+    python -m benchmarks.bench_routes --targets wsgi \\
+        --server-command "gunicorn -w 4 -b 127.0.0.1:{port} LittleLemonAPIV2.wsgi"
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import BASE_DIR, get_user, percentile, seed_menu, setup_django
+
+TARGETS = ["client", "wsgi"]
+PASSWORD = "Lemon-bench-2023"
+SERVER_COMMAND = f"{shlex.quote(sys.executable)} manage.py runserver --noreload 127.0.0.1:{{port}}"
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+# >> Dataset
+
+class Dataset:
+    """The ids and names the generated requests refer to."""
+
+    def __init__(self, disposable):
+        from django.contrib.auth.models import User
+        from LittleLemonDRF.models import Category, MenuItem, Order
+
+        self.categories = list(Category.objects.values_list("id", flat=True))
+        items = list(MenuItem.objects.order_by("id").values_list("id", "title", "category_id"))
+        # The last items are only there to be deleted, once each
+        self.items, self.disposable = items[:-disposable], [id_ for id_, _, _ in items[-disposable:]]
+        self.customers = list(User.objects.filter(username__startswith="customer")
+                              .order_by("id").values_list("username", flat=True))
+        self.orders = defaultdict(list)
+        for username, order_id in Order.objects.values_list("user__username", "id"):
+            self.orders[username].append(order_id)
+        # Customers with orders, so that every customer can view one of theirs
+        self.buyers = [username for username in self.customers if self.orders[username]]
+
+    def item(self, rng):
+        return rng.choice(self.items)
+
+    def customer(self, rng):
+        return rng.choice(self.buyers or self.customers)
+
+
+def seed_dataset(args, disposable):
+    from django.contrib.auth.models import Group, User
+    from rest_framework.authtoken.models import Token
+    from LittleLemonDRF.bookings import book, slot_times
+    from LittleLemonDRF.models import Cart, MenuItem, Order, Rating
+    from benchmarks.bench_orders import seed_orders
+
+    rng = random.Random(args.seed)
+    seed_menu(args.items + disposable, categories=args.categories)
+    # Enough stock for every order the mix places
+    MenuItem.objects.update(inventory=30000)
+    seed_orders(args.orders, min(3, args.items), args.users)
+
+    User.objects.create(username="admin", is_staff=True, is_superuser=True)
+    get_user("manager", manager=True)
+    crew = get_user("crew")
+    Group.objects.get_or_create(name="Delivery crew")[0].user_set.add(crew)
+    get_user("promoted")
+    visitor = User(username="visitor", email="visitor@example.com")
+    visitor.set_password(PASSWORD)
+    visitor.save()
+    Order.objects.filter(id__lte=args.orders // 4).update(delivery_crew=crew)
+
+    customers = list(User.objects.filter(username__startswith="customer"))
+    menu = list(MenuItem.objects.values_list("id", "price")[:args.items])
+    Cart.objects.bulk_create([
+        Cart(user=customer, menuitem_id=menuitem_id, quantity=1, unit_price=price, price=price)
+        for customer in customers
+        for menuitem_id, price in rng.sample(menu, min(args.cart_lines, len(menu)))])
+    # The rating triggers keep the aggregates in sync with bulk_create() as well
+    Rating.objects.bulk_create([
+        Rating(user=rng.choice(customers), menuitem_id=rng.choice(menu)[0],
+               rating_value=rng.randint(0, 5)) for _ in range(args.ratings)],
+        ignore_conflicts=True)
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    for i in range(args.bookings):
+        book(customers[i % len(customers)], "Seeded party", rng.randint(2, 6),
+             tomorrow + datetime.timedelta(days=i % 30), rng.choice(slot_times()))
+    Token.objects.bulk_create([Token(user=user, key=Token.generate_key())
+                               for user in User.objects.all()])
+
+
+# >> Request mix
+# A scenario returns a sequence of requests, sent in order. The ones that
+# change a customer's cart or the visitor's tokens get a session so that their
+# requests aren't interleaved with the user's other sequences.
+
+def request(method, path, user=None, body=None, expect=(200,)):
+    return {"method": method, "path": path, "user": user, "body": body, "expect": list(expect)}
+
+
+def future_day(rng):
+    return (datetime.date.today() + datetime.timedelta(days=rng.randint(1, 30))).isoformat()
+
+
+def menu_list(rng, data):
+    params = rng.choice([
+        {"page": rng.randint(1, 20)},
+        {"category": f"Category {rng.randrange(len(data.categories))}"},
+        {"search": f"Item 00{rng.randint(0, 99):02d}"},
+        {"ordering": "-price", "cursor": ""},
+        {"to_price": rng.randint(5, 50), "ordering": "price,title"},
+    ])
+    return [request("GET", f"/api/menu-items/?{urlencode({**params, 'perpage': 10})}",
+                    data.customer(rng))]
+
+
+def menu_item_body(rng, data, item):
+    _, title, category_id = item
+    return {"title": title, "price": f"{rng.randint(200, 5000) / 100:.2f}",
+            "stock": 30000, "category_id": category_id}
+
+
+def menu_item_create(rng, data):
+    body = {"title": f"New item {rng.randint(0, 10 ** 9)}", "price": "9.50", "stock": 100,
+            "category_id": rng.choice(data.categories)}
+    return [request("POST", "/api/menu-items/", "manager", body, (201,))]
+
+
+def menu_item_update(rng, data):
+    item = data.item(rng)
+    method = rng.choice(["PUT", "PATCH"])
+    return [request(method, f"/api/menu-items/{item[0]}", "manager", menu_item_body(rng, data, item))]
+
+
+def menu_item_delete(rng, data):
+    if not data.disposable:
+        return menu_item_update(rng, data)
+    return [request("DELETE", f"/api/menu-items/{data.disposable.pop()}", "manager")]
+
+
+def menu_items_import(rng, data):
+    rows = [menu_item_body(rng, data, data.item(rng)) for _ in range(20)]
+    return [request("POST", "/api/menu-items/import", "manager", rows)]
+
+
+def checkout(rng, data):
+    customer = data.customer(rng)
+    menuitem_id = data.item(rng)[0]
+    return [
+        request("POST", "/api/cart/menu-items/", customer,
+                {"menuitem_id": menuitem_id, "menuitem": menuitem_id, "quantity": 2}, (201,)),
+        request("GET", "/api/cart/menu-items/", customer),
+        request("POST", "/api/orders", customer, expect=(201,)),
+    ]
+
+
+def cart_bulk(rng, data):
+    customer = data.customer(rng)
+    lines = [{"menuitem_id": data.item(rng)[0], "quantity": rng.randint(0, 3)} for _ in range(5)]
+    return [request("POST", "/api/cart/menu-items/bulk", customer, lines),
+            request("DELETE", "/api/cart/menu-items/", customer)]
+
+
+def order_reads(rng, data):
+    customer = data.customer(rng)
+    return [request("GET", "/api/orders?perpage=10", rng.choice([customer, "manager", "crew"])),
+            request("GET", f"/api/orders/{rng.choice(data.orders[customer])}", customer)]
+
+
+def ratings(rng, data):
+    return [request("GET", f"/api/ratings?page={rng.randint(1, 50)}"),
+            request("GET", f"/api/ratings/summary?page={rng.randint(1, 20)}")]
+
+
+def rate(rng, data):
+    body = {"menuitem": data.item(rng)[0], "rating_value": rng.randint(0, 5)}
+    return [request("POST", "/api/ratings", data.customer(rng), body, (201,))]
+
+
+def bookings(rng, data):
+    customer = data.customer(rng)
+    body = {"name": "Benchmark party", "no_of_guests": rng.randint(2, 6), "date": future_day(rng),
+            "time": f"{rng.randint(12, 20)}:{rng.choice(['00', '30'])}"}
+    return [request("GET", f"/api/booking/availability?date={future_day(rng)}&guests=2"),
+            request("POST", "/api/booking/", customer, body, (201, 409)),
+            request("GET", "/api/booking/", rng.choice([customer, "manager"]))]
+
+
+def categories(rng, data):
+    return [request("GET", f"/api/category/{rng.choice(data.categories)}", data.customer(rng))]
+
+
+def pages(rng, data):
+    return [request("GET", "/"),
+            request("GET", "/api/secret/", data.customer(rng)),
+            request("GET", "/api/manager-view/", "manager"),
+            # The view sets its own throttles, the benchmark settings can't turn them off
+            request("GET", "/api/throttle-check", expect=(200, 429))]
+
+
+def admin_pages(rng, data):
+    return [request("POST", "/api/groups/manager/users", "admin", {"username": "promoted"}),
+            request("GET", "/api/cache-stats", "admin"),
+            request("GET", "/api/db-stats", "admin"),
+            request("GET", "/api/request-stats", "manager")]
+
+
+def exports(rng, data):
+    return [request("GET", "/api/export/menu-items", "admin"),
+            request("GET", "/api/export/orders?format=ndjson", "admin")]
+
+
+def users(rng, data):
+    customer = data.customer(rng)
+    return [request("GET", "/auth/"),
+            request("GET", "/auth/users/", customer),
+            request("GET", "/auth/users/me/", customer),
+            request("PATCH", "/auth/users/me/", customer, {"email": f"{customer}@example.com"}),
+            request("GET", f"/auth/users/{customer}/", customer)]
+
+
+def signup(rng, data):
+    body = {"username": f"signup-{rng.randint(0, 10 ** 9)}", "password": PASSWORD,
+            "email": "signup@example.com"}
+    return [request("POST", "/auth/users/", body=body, expect=(201,))]
+
+
+def account_emails(rng, data):
+    # The confirmations get invalid uids and tokens so that nothing changes,
+    # they still validate their input. SEND_ACTIVATION_EMAIL is off, hence 400
+    # on resend_activation. The resets are for an unknown address: the reset
+    # emails need DJOSER["PASSWORD_RESET_CONFIRM_URL"], which isn't set.
+    email = {"email": "nobody@example.com"}
+    confirmation = {"uid": "MQ", "token": "invalid"}
+    return [request("POST", "/auth/users/activation/", body=confirmation, expect=(400, 403)),
+            request("POST", "/auth/users/resend_activation/", body=email, expect=(400,)),
+            request("POST", "/auth/users/reset_password/", body=email, expect=(204,)),
+            request("POST", "/auth/users/reset_password_confirm/",
+                    body={**confirmation, "new_password": PASSWORD}, expect=(400,)),
+            request("POST", "/auth/users/reset_username/", body=email, expect=(204,)),
+            request("POST", "/auth/users/reset_username_confirm/",
+                    body={**confirmation, "new_username": "visitor"}, expect=(400,))]
+
+
+def login(rng, data):
+    # The logins hash the password, by design the slowest requests of the API
+    credentials = {"username": "visitor", "password": PASSWORD}
+    return [request("POST", "/auth/token/login/", body=credentials),
+            request("POST", "/auth/users/set_password/", "visitor",
+                    {"current_password": PASSWORD, "new_password": PASSWORD}, (204,)),
+            request("POST", "/auth/users/set_username/", "visitor",
+                    {"current_password": PASSWORD, "new_username": "visitor"}, (400,)),
+            request("POST", "/auth/token/logout/", "visitor", expect=(204,)),
+            request("POST", "/api/api-token-auth", body=credentials)]
+
+
+# (weight, scenario, whether its requests are a session of their user)
+SCENARIOS = [
+    (30, menu_list, False),
+    (15, lambda rng, data: [request("GET", f"/api/menu-items/{data.item(rng)[0]}",
+                                    data.customer(rng))], False),
+    (6, categories, False),
+    (1, menu_item_create, False),
+    (1, menu_item_update, False),
+    (1, menu_item_delete, False),
+    (0.2, menu_items_import, False),
+    (5, checkout, True),
+    (2, cart_bulk, True),
+    (6, order_reads, True),
+    (4, ratings, False),
+    (2, rate, False),
+    (2, bookings, False),
+    (2, pages, False),
+    (0.5, admin_pages, False),
+    (0.1, exports, False),
+    (2, users, False),
+    (0.1, signup, False),
+    (0.2, account_emails, False),
+    (0.1, login, True),
+]
+
+
+def generate_mix(data, count, seed):
+    """Every scenario once, then weighted picks until there are ``count`` requests."""
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in SCENARIOS]
+    mix, picks = [], list(range(len(SCENARIOS)))
+    while len(mix) < count:
+        index = picks.pop(0) if picks else rng.choices(range(len(SCENARIOS)), weights)[0]
+        _, scenario, session = SCENARIOS[index]
+        sequence = scenario(rng, data)
+        for entry in sequence:
+            entry["session"] = (entry["user"] or "visitor") if session else None
+        mix.extend(sequence)
+    return mix
+
+
+def read_mix(path):
+    with open(path) as mix:
+        return [json.loads(line) for line in mix if line.strip()]
+
+
+def route_label(method, path):
+    from django.urls import Resolver404, resolve
+    try:
+        return f"{method} /{resolve(urlsplit(path).path).route}"
+    except Resolver404:
+        return f"{method} (no route)"
+
+
+def uncovered_routes(mix):
+    """The routes of the API, djoser and the home page that no request of ``mix`` hits."""
+    from django.urls import get_resolver
+
+    def walk(patterns, prefix=""):
+        for pattern in patterns:
+            # Joined the way ResolverMatch.route joins them
+            route = prefix + str(pattern.pattern).removeprefix("^")
+            if hasattr(pattern, "url_patterns"):
+                yield from walk(pattern.url_patterns, route)
+            elif "(?P<format>" not in route:
+                yield route
+
+    covered = {route_label(entry["method"], entry["path"]).partition(" /")[2] for entry in mix}
+    return sorted(route for route in walk(get_resolver().url_patterns)
+                  if route.startswith(("api/", "auth/")) or route == ""
+                  if route not in covered)
+
+
+# >> Replay
+
+def test_client_sender():
+    from django.test import Client
+
+    # A view that raises counts as a 500, like behind a server
+    client = Client(raise_request_exception=False)
+
+    def send(method, path, token, body):
+        extra = {"HTTP_AUTHORIZATION": f"Token {token}"} if token else {}
+        response = client.generic(method, path, json.dumps(body) if body is not None else "",
+                                  content_type="application/json", **extra)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, response.get("Server-Timing", ""), content
+    return send
+
+
+def http_sender(port):
+    # A connection per request: runserver writes the headers and the body of a
+    # response separately, so on a kept-alive connection every response waits
+    # for the client's delayed ACK (40 ms). gunicorn's sync workers close the
+    # connection after each response as well.
+    def send(method, path, token, body):
+        headers = {"Content-Type": "application/json", "Connection": "close"}
+        if token:
+            headers["Authorization"] = f"Token {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        try:
+            connection.request(method, path, data, headers)
+            response = connection.getresponse()
+            return response.status, response.getheader("Server-Timing", ""), response.read()
+        finally:
+            connection.close()
+    return send
+
+
+def replay(send, entries, tokens, results):
+    for entry, label in entries:
+        token = tokens.get(entry["user"]) if entry.get("user") else None
+        started = time.perf_counter()
+        status, timing, content = send(entry["method"], entry["path"], token, entry.get("body"))
+        elapsed = (time.perf_counter() - started) * 1000
+        queries = QUERIES.search(timing)
+        expect = entry.get("expect")
+        results.append((label, status, elapsed, int(queries.group(1)) if queries else None,
+                        status in expect if expect else status < 500))
+        body = entry.get("body")
+        if status == 200 and isinstance(body, dict) and "password" in body and "username" in body:
+            # A login, its token replaces the one the user had (a logout deletes it)
+            response = json.loads(content)
+            tokens[body["username"]] = response.get("auth_token") or response.get("token")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command):
+    port = free_port()
+    server = subprocess.Popen(shlex.split(command.format(port=port)), cwd=BASE_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with {server.returncode}: {command}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"The server didn't listen on port {port}: {command}")
+
+
+def split_by_session(entries, threads):
+    """One list per client thread, the requests of a session all in the same one."""
+    lists = [[] for _ in range(threads)]
+    sessions = {}
+    for i, (entry, label) in enumerate(entries):
+        session = entry.get("session")
+        if session is None:
+            lists[i % threads].append((entry, label))
+        else:
+            index = sessions.setdefault(session, len(sessions) % threads)
+            lists[index].append((entry, label))
+    return lists
+
+
+def summarize(results, elapsed):
+    routes = {}
+    by_route = defaultdict(list)
+    for result in results:
+        by_route[result[0]].append(result)
+    for label, rows in sorted(by_route.items()):
+        timings = [ms for _, _, ms, _, _ in rows]
+        queries = [count for _, _, _, count, _ in rows if count is not None]
+        routes[label] = {
+            "count": len(rows),
+            "errors": sum(1 for *_, ok in rows if not ok),
+            "statuses": dict(sorted(Counter(str(status) for _, status, *_ in rows).items())),
+            "p50": round(percentile(timings, 50), 3),
+            "p95": round(percentile(timings, 95), 3),
+            "p99": round(percentile(timings, 99), 3),
+            "queries": round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    return {"requests": len(results), "seconds": round(elapsed, 3),
+            "throughput": round(len(results) / elapsed, 1),
+            "errors": sum(route["errors"] for route in routes.values()), "routes": routes}
+
+
+def run(args):
+    # Queries per request are read from the Server-Timing header
+    os.environ["LITTLELEMON_PROFILING"] = "1"
+    setup_django()
+    from django.db import connection
+    from rest_framework.authtoken.models import Token
+
+    print(f"[{args.target}] seeding...", file=sys.stderr)
+    disposable = max(10, args.requests // 50)
+    seed_dataset(args, disposable)
+    mix = read_mix(args.mix) if args.mix else generate_mix(Dataset(disposable), args.requests, args.seed)
+    if args.record and args.target == args.targets[0]:
+        with open(args.record, "w") as record:
+            record.writelines(json.dumps(entry) + "\n" for entry in mix)
+    entries = [(entry, route_label(entry["method"], entry["path"])) for entry in mix]
+    tokens = dict(Token.objects.values_list("user__username", "key"))
+    warmup = [(entry, label) for entry, label in entries
+              if entry["method"] == "GET" and "export" not in label][:args.warmup]
+    results = []
+
+    print(f"[{args.target}] {len(mix)} requests...", file=sys.stderr)
+    if args.target == "client":
+        send = test_client_sender()
+        replay(send, warmup, tokens, [])
+        started = time.perf_counter()
+        replay(send, entries, tokens, results)
+        elapsed = time.perf_counter() - started
+    else:
+        connection.close()
+        server, port = start_server(args.server_command)
+        try:
+            replay(http_sender(port), warmup, tokens, [])
+            threads = [threading.Thread(target=replay, args=(http_sender(port), part, tokens, results))
+                       for part in split_by_session(entries, args.threads)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps({**summarize(results, elapsed), "uncovered": uncovered_routes(mix)}))
+
+
+# >> Report and baseline
+
+def print_target(target, result):
+    print(f"\n{target}: {result['requests']} requests in {result['seconds']:.1f}s, "
+          f"{result['throughput']:,.1f} requests/s, {result['errors']} unexpected statuses")
+    print(f"  {'route':<52} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'queries':>8}")
+    for label, route in result["routes"].items():
+        queries = "-" if route["queries"] is None else f"{route['queries']:.2f}"
+        print(f"  {label:<52} {route['count']:>6} {route['errors']:>6} {route['p50']:>9.2f} "
+              f"{route['p95']:>9.2f} {route['p99']:>9.2f} {queries:>8}")
+        if route["errors"]:
+            print(f"  {'':<52} statuses {route['statuses']}")
+    if result["uncovered"]:
+        print(f"  routes without requests: {', '.join(result['uncovered'])}")
+
+
+def compare(baseline, results, tolerance, min_delta):
+    """The regressions of ``results`` against ``baseline``, as messages."""
+    regressions = []
+    for target, result in results.items():
+        base = baseline["targets"].get(target)
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{target}: {result['throughput']:,.1f} requests/s, "
+                               f"baseline {base['throughput']:,.1f}")
+        for label, route in result["routes"].items():
+            old = base["routes"].get(label)
+            if old is None:
+                continue
+            if route["queries"] is not None and old["queries"] is not None \
+                    and route["queries"] > old["queries"] + 0.5:
+                regressions.append(f"{target} {label}: {route['queries']:.2f} queries/request, "
+                                   f"baseline {old['queries']:.2f}")
+            if route["p50"] > old["p50"] * (1 + tolerance) and route["p50"] - old["p50"] > min_delta:
+                regressions.append(f"{target} {label}: p50 {route['p50']:.2f} ms, "
+                                   f"baseline {old['p50']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--items", type=int, default=2000, help="menu items")
+    parser.add_argument("--users", type=int, default=200, help="customers")
+    parser.add_argument("--cart-lines", type=int, default=3, help="cart lines per customer")
+    parser.add_argument("--ratings", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=3000, help="size of the generated mix")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", help="NDJSON file of requests to replay instead")
+    parser.add_argument("--record", help="write the replayed mix to this NDJSON file")
+    parser.add_argument("--warmup", type=int, default=50, help="GET requests sent before timing")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument("--threads", type=int, default=8, help="HTTP clients of the wsgi target")
+    parser.add_argument("--server-command", default=SERVER_COMMAND,
+                        help="WSGI server command, {port} is replaced (default: runserver)")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="p50 and throughput change counted as a regression")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="ms a p50 must grow by as well, so fast routes don't flap")
+    parser.add_argument("--target", choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.target:
+        return run(args)
+
+    config = {key: value for key, value in vars(args).items() if key in (
+        "categories", "items", "users", "cart_lines", "ratings", "orders", "bookings",
+        "requests", "seed", "mix", "threads", "server_command")}
+    results = {}
+    for target in args.targets:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_routes", "--target", target, *sys.argv[1:]],
+            cwd=BASE_DIR, check=True, stdout=subprocess.PIPE, text=True).stdout
+        results[target] = json.loads(output.strip().splitlines()[-1])
+        print_target(target, results[target])
+
+    failed = any(result["errors"] for result in results.values())
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["config"] != config:
+            print(f"\nThe baseline was run with other options: {baseline['config']}")
+        regressions = compare(baseline, results, args.tolerance, args.min_delta)
+        print(f"\n{len(regressions)} regressions against {args.baseline}")
+        for regression in regressions:
+            print(f"  {regression}")
+        failed = failed or bool(regressions)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({"config": config, "targets": results}, baseline_file, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""MenuItemSerializer vs. FastMenuItemSerializer on menu item lists.
+
+    python -m benchmarks.bench_serializer
+"""
+import argparse
+import time
+
+from benchmarks.common import setup_django, seed_menu
+
+
+def objects_per_second(func, count, min_time=1.0):
+    calls, started = 0, time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return calls * count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from LittleLemonDRF.models import MenuItem
+    from LittleLemonDRF.serializers import MenuItemSerializer, FastMenuItemSerializer
+
+    seed_menu(max(args.sizes))
+    render = JSONRenderer().render
+
+    print(f"{'items':>8} {'DRF objects/s':>16} {'fast objects/s':>16} {'speedup':>8}")
+    for size in args.sizes:
+        queryset = MenuItem.objects.order_by("id")[:size]
+
+        def slow():
+            return MenuItemSerializer(queryset.select_related("category"), many=True).data
+
+        def fast():
+            return FastMenuItemSerializer(FastMenuItemSerializer.values(queryset)).data
+
+        assert render(slow()) == render(fast())
+        before = objects_per_second(slow, size)
+        after = objects_per_second(fast, size)
+        print(f"{size:>8} {before:>16,.0f} {after:>16,.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
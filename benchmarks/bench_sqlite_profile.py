@@ -0,0 +1,107 @@
+"""Mixed menu reads and cart writes, with the default and the production database profile.
+
+Each profile runs in its own process on a fresh database, because the
+profile is read when the settings are loaded (LITTLELEMON_DB_PROFILE).
+Threads send requests through Django's WSGI handler, so the connection
+handling of a real server applies: without CONN_MAX_AGE every request opens
+and closes its connection. A share of the requests are cart writes, the rest
+menu list and menu item reads.
+
+    python -m benchmarks.bench_sqlite_profile --threads 8 --writes 0.2
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from benchmarks.common import (BASE_DIR, get_user, percentile, seed_menu, setup_django,
+                               wsgi_request)
+
+PROFILES = ["development", "production"]
+
+
+def run(args):
+    os.environ["LITTLELEMON_DB_PROFILE"] = args.profile
+    setup_django()
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from rest_framework.authtoken.models import Token
+
+    seed_menu(args.rows)
+    tokens = [Token.objects.create(user=get_user(f"bench-{i}")).key for i in range(args.threads)]
+    connection.close()
+    handler = WSGIHandler()
+
+    results = []
+    deadline = time.perf_counter() + args.duration
+
+    def client(token, seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            if rng.random() < args.writes:
+                # The view reads menuitem_id, CartSerializer validates menuitem
+                menuitem_id = rng.randint(1, args.rows)
+                kind, method, path, body = "cart write", "POST", "/api/cart/menu-items/", {
+                    "menuitem_id": menuitem_id, "menuitem": menuitem_id,
+                    "quantity": rng.randint(1, 5)}
+            elif rng.random() < 0.5:
+                kind, method, path, body = "menu list", "GET", \
+                    f"/api/menu-items/?perpage=10&page={rng.randint(1, 50)}", None
+            else:
+                kind, method, path, body = "menu item", "GET", \
+                    f"/api/menu-items/{rng.randint(1, args.rows)}", None
+            started = time.perf_counter()
+            status = wsgi_request(handler, method, path, token, body)
+            results.append((kind, status, (time.perf_counter() - started) * 1000))
+
+    threads = [threading.Thread(target=client, args=(token, i)) for i, token in enumerate(tokens)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        "total": len(results) / args.duration,
+        "errors": sum(1 for _, status, _ in results if status >= 400),
+        "statuses": Counter(status for _, status, _ in results),
+        "kinds": {
+            kind: [sum(1 for k, _, _ in results if k == kind) / args.duration,
+                   percentile([ms for k, _, ms in results if k == kind], 50),
+                   percentile([ms for k, _, ms in results if k == kind], 99)]
+            for kind in ("menu list", "menu item", "cart write")
+        },
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=float, default=0.2, help="share of cart writes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per profile")
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.profile:
+        return run(args)
+
+    print(f"{args.threads} threads, {args.writes:.0%} cart writes, {args.rows} menu items, "
+          f"{args.duration:.0f}s per profile")
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sqlite_profile", "--profile", profile,
+             *sys.argv[1:]],
+            cwd=BASE_DIR, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile}: {result['total']:,.0f} requests/s, {result['errors']} errors "
+              f"{dict(sorted(result['statuses'].items()))}")
+        for kind, (rate, p50, p99) in result["kinds"].items():
+            print(f"  {kind:<12} {rate:8,.0f}/s   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
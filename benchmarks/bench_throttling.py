@@ -0,0 +1,61 @@
+"""DRF's UserRateThrottle vs. the GCRA throttles at many distinct keys.
+
+    python -m benchmarks.bench_throttling --keys 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import setup_django
+
+
+def checks_per_second(throttle_class, requests, view):
+    started = time.perf_counter()
+    for request in requests:
+        throttle_class().allow_request(request, view)
+    return len(requests) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from rest_framework.settings import api_settings
+    from rest_framework.throttling import UserRateThrottle
+    from LittleLemonDRF import throttling
+
+    # High enough that every key stays below the limit, so both sides do the full work
+    rate = f"{args.requests}/minute"
+    UserRateThrottle.THROTTLE_RATES = {"user": rate}
+    api_settings.DEFAULT_THROTTLE_RATES["user"] = rate
+
+    users = [SimpleNamespace(pk=i, is_authenticated=True) for i in range(args.keys)]
+    requests = [SimpleNamespace(user=users[i % args.keys], META={"REMOTE_ADDR": "127.0.0.1"})
+                for i in range(args.requests)]
+    view = SimpleNamespace()
+
+    results = [("UserRateThrottle (locmem cache)", checks_per_second(UserRateThrottle, requests, view))]
+
+    throttling.reset_store()
+    results.append(("UserThrottle (memory store)",
+                    checks_per_second(throttling.UserThrottle, requests, view)))
+
+    settings.THROTTLE_STORE = "file"
+    settings.THROTTLE_STORE_PATH = os.path.join(tempfile.mkdtemp(), "throttle.sqlite3")
+    throttling.reset_store()
+    results.append(("UserThrottle (file store)",
+                    checks_per_second(throttling.UserThrottle, requests, view)))
+
+    print(f"{args.keys} keys, {args.requests} requests")
+    for label, rate in results:
+        print(f"{label:<35} {rate:12,.0f} checks/s")
+
+
+if __name__ == "__main__":
+    main()
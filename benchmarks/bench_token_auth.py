@@ -0,0 +1,57 @@
+"""Authenticated requests per second with TokenAuthentication vs. CachingTokenAuthentication.
+
+    python -m benchmarks.bench_token_auth --users 100
+"""
+import argparse
+import itertools
+import time
+
+from benchmarks.common import setup_django
+
+
+def requests_per_second(view, requests, min_time=2.0):
+    calls, started = 0, time.perf_counter()
+    for request in itertools.cycle(requests):
+        response = view(request)
+        assert response.status_code == 200, response.status_code
+        calls += 1
+        if calls % 100 == 0 and time.perf_counter() - started >= min_time:
+            return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.decorators import api_view, authentication_classes, permission_classes
+    from rest_framework.permissions import IsAuthenticated
+    from rest_framework.response import Response
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonDRF.authentication import CachingTokenAuthentication
+
+    tokens = [Token.objects.create(user=User.objects.create(username=f"user{i}"))
+              for i in range(args.users)]
+    factory = APIRequestFactory()
+    requests = [factory.get("/api/secret/", HTTP_AUTHORIZATION=f"Token {token.key}")
+                for token in tokens]
+
+    def make_view(auth_class):
+        @api_view()
+        @authentication_classes([auth_class])
+        @permission_classes([IsAuthenticated])
+        def secret(request):
+            return Response({"message": "some secret message"})
+        return secret
+
+    for auth_class in (TokenAuthentication, CachingTokenAuthentication):
+        rps = requests_per_second(make_view(auth_class), requests)
+        print(f"{auth_class.__name__:<30} {rps:10,.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
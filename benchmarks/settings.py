@@ -0,0 +1,23 @@
+"""Settings of the benchmark processes, see ``common.setup_django``.
+
+They are read from environment variables so that servers started by a
+benchmark in a subprocess use the same database and options.
+"""
+import os
+
+from LittleLemonAPIV2.settings import *  # noqa: F401,F403
+from LittleLemonAPIV2.settings import DATABASES, REST_FRAMEWORK
+
+DATABASES["default"]["NAME"] = os.environ["LITTLELEMON_BENCH_DB"]
+DEBUG = False
+QUERY_BUDGET_WARNINGS = os.environ.get("LITTLELEMON_QUERY_BUDGETS") == "1"
+# The replica share in api/db-stats
+QUERY_STATS = True
+ALLOWED_HOSTS = ["testserver", "localhost", "127.0.0.1"]
+if os.environ.get("LITTLELEMON_BENCH_CACHE") != "1":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+REST_FRAMEWORK = {**REST_FRAMEWORK, "DEFAULT_THROTTLE_CLASSES": [],
+                  # As in production, DEBUG is off: no browsable API
+                  "DEFAULT_RENDERER_CLASSES": ["LittleLemonDRF.renderers.FastJSONRenderer"]}
+# djoser's password and username reset emails
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"